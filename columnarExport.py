@@ -0,0 +1,220 @@
+import csv
+import exportManifest
+import hashlib
+import jiraFields
+import os
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+### Constants ###
+
+PARQUET_FORMAT = "parquet"
+CSV_FORMAT = "csv"
+COLUMNAR_FORMATS = [PARQUET_FORMAT, CSV_FORMAT]
+
+# Rows buffered per table before a batch (a parquet row group) is written.
+BATCH_SIZE = 10000
+
+ISSUES_TABLE = "issues"
+EPICS_TABLE = "epics"
+INITIATIVES_TABLE = "initiatives"
+MONTH_ALLOCATIONS_TABLE = "month_allocations"
+
+# Ordered (column, type) of every table.
+TABLE_COLUMNS = {
+    ISSUES_TABLE: [('key', 'string'), ('epic_key', 'string'), ('release', 'string'), ('project_key', 'string'), ('issue_type', 'string'),
+                   ('status', 'string'), ('summary', 'string'), ('estimate', 'float'), ('done', 'bool'), ('subtask_count', 'int')],
+    EPICS_TABLE: [('key', 'string'), ('initiative_key', 'string'), ('project_key', 'string'), ('summary', 'string'), ('status', 'string'),
+                  ('summed_time', 'float'), ('remaining_time', 'float'), ('issue_count', 'int'), ('incomplete_estimated_count', 'int'),
+                  ('incomplete_unestimated_count', 'int'), ('start_date', 'string'), ('due_date', 'string')],
+    INITIATIVES_TABLE: [('key', 'string'), ('project_key', 'string'), ('summary', 'string'), ('status', 'string'), ('summed_time', 'float'),
+                        ('remaining_time', 'float'), ('epic_count', 'int'), ('incomplete_estimated_count', 'int'),
+                        ('incomplete_unestimated_count', 'int'), ('estimation_confidence', 'float'), ('story_point_weight', 'float'),
+                        ('story_point_weight_ceiling', 'float')],
+    MONTH_ALLOCATIONS_TABLE: [('month_key', 'string'), ('year', 'int'), ('month', 'int'), ('initiative_key', 'string'), ('epic_key', 'string'),
+                              ('summed_fraction', 'float'), ('remaining_fraction', 'float'), ('summed_time', 'float'), ('remaining_time', 'float')],
+}
+
+
+### Data Structures ###
+
+class TableWriter:
+    """
+        Writes the rows of a flat table in batches, as a parquet file (one row group per batch) or a CSV file.
+    """
+
+    def __init__(self, root, table_name, columnar_format, batch_size=BATCH_SIZE):
+        self.columns = TABLE_COLUMNS[table_name]
+        self.columnar_format = columnar_format
+        self.batch_size = batch_size
+        self.rows = []
+        self.file_name = "{}.{}".format(table_name, columnar_format)
+        self.path = os.path.join(root, self.file_name)
+
+        if columnar_format == PARQUET_FORMAT:
+            self.schema = pyarrow.schema(
+                [(column, arrow_type(column_type)) for column, column_type in self.columns])
+            self.temp_path = self.path + ".tmp"
+            self.output_file = pyarrow.parquet.ParquetWriter(
+                self.temp_path, self.schema)
+        else:
+            self.output_file = exportManifest.HashingWriter(
+                self.path, newline='')
+            self.csv_writer = csv.writer(self.output_file)
+            self.csv_writer.writerow([column for column, column_type in self.columns])
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.rows) == 0:
+            return
+        if self.columnar_format == PARQUET_FORMAT:
+            self.output_file.write_table(pyarrow.Table.from_pydict(
+                {column: [row[index] for row in self.rows] for index, (column, column_type) in enumerate(self.columns)}, schema=self.schema))
+        else:
+            self.csv_writer.writerows(self.rows)
+        self.rows = []
+
+    def close(self):
+        """
+            Writes the last batch and hands the file to the export manifest; returns whether it changed.
+        """
+        self.flush()
+        if self.columnar_format == PARQUET_FORMAT:
+            self.output_file.close()
+            with open(self.temp_path, 'rb') as read_file:
+                digest = hashlib.sha256(read_file.read()).hexdigest()
+            return exportManifest.open_manifest(os.path.dirname(self.path)).replace(self.file_name, self.temp_path, digest)
+        return self.output_file.close()
+
+
+class ColumnarExport:
+    """
+        Flattens roll-ups into the issues, epics, initiatives and month_allocations tables of an export folder. Tables
+        are created on their first row and rows are written in batches as the roll-ups are added.
+    """
+
+    def __init__(self, root, columnar_format=PARQUET_FORMAT, batch_size=BATCH_SIZE):
+        if columnar_format == PARQUET_FORMAT and pyarrow is None:
+            print("pyarrow is not installed; exporting CSV tables instead.")
+            columnar_format = CSV_FORMAT
+        self.root = root
+        self.columnar_format = columnar_format
+        self.batch_size = batch_size
+        self.writers = {}
+
+    def append(self, table_name, row):
+        if table_name not in self.writers:
+            self.writers[table_name] = TableWriter(
+                self.root, table_name, self.columnar_format, self.batch_size)
+        self.writers[table_name].append(row)
+
+    def add_epics(self, epics_container, initiative_key=None):
+        """
+            Adds the epics and their issues.
+            epics_container - the list of Epic objects.
+            initiative_key - key of the initiative the epics belong to.
+        """
+        for epic in epics_container:
+            self.append(EPICS_TABLE, epic_row(epic, initiative_key))
+            for story in epic.issues:
+                self.append(ISSUES_TABLE, issue_row(story, epic.epic.key))
+
+    def add_initiatives(self, initiatives_container):
+        """
+            Adds the initiatives with their epics and issues.
+            initiatives_container - the list of Initiative objects.
+        """
+        for initiative in initiatives_container:
+            self.append(INITIATIVES_TABLE, initiative_row(initiative))
+            self.add_epics([epic for epic in initiative.epics if epic.epic.key !=
+                            initiative.initiative.key], initiative.initiative.key)
+
+    def add_releases(self, releases_container):
+        """
+            Adds the issues of the releases.
+            releases_container - the list of Release objects.
+        """
+        for release in releases_container:
+            for story in release.issues:
+                self.append(ISSUES_TABLE, issue_row(
+                    story, None, release.release))
+
+    def add_epic_schedules(self, epic_schedules):
+        """
+            Adds the month allocations of the scheduled epics, as used by the capacity calendar.
+            epic_schedules - the list of EpicSchedule objects.
+        """
+        for schedule in epic_schedules:
+            for month_allocation in schedule.month_allocations:
+                year = int(month_allocation.month_distribution_key.split("-")[0])
+                self.append(MONTH_ALLOCATIONS_TABLE, [month_allocation.month_distribution_key, year, month_allocation.month,
+                                                      schedule.initiative.initiative.key, schedule.epic.epic.key,
+                                                      float(month_allocation.summed_fraction), float(
+                                                          month_allocation.remaining_fraction),
+                                                      round(float(schedule.epic.summed_time * month_allocation.summed_fraction), 2),
+                                                      round(float(schedule.epic.remaining_time * month_allocation.remaining_fraction), 2)])
+
+    def close(self):
+        for table_name, writer in self.writers.items():
+            writer.close()
+            print("Wrote {}".format(writer.path))
+
+
+### Methods ###
+
+def arrow_type(column_type):
+    return {'string': pyarrow.string(), 'float': pyarrow.float64(), 'int': pyarrow.int64(), 'bool': pyarrow.bool_()}[column_type]
+
+
+def field_name(fields, field, attribute="name"):
+    value = getattr(fields, field, None)
+    return getattr(value, attribute, None) if value is not None else None
+
+
+def issue_row(story, epic_key, release=None):
+    """
+        Flattens a UserStory into a row of the issues table.
+        story - the UserStory.
+        epic_key - key of the epic of the issue.
+        release - the fixVersion the issue was rolled up for.
+    """
+    fields = story.issue.fields
+    status = field_name(fields, "status")
+    return [story.issue.key, epic_key, release, field_name(fields, "project", "key"), field_name(fields, "issuetype"), status,
+            getattr(fields, "summary", None), float(story.summed_time), status == "Done", len(story.subtasks)]
+
+
+def epic_row(epic, initiative_key=None):
+    """
+        Flattens an Epic into a row of the epics table.
+        epic - the Epic.
+        initiative_key - key of the initiative the epic belongs to.
+    """
+    fields = epic.epic.fields
+    return [epic.epic.key, initiative_key, field_name(fields, "project", "key"), getattr(fields, "summary", None), field_name(fields, "status"),
+            float(epic.summed_time), float(epic.remaining_time), len(
+                epic.issues), int(epic.incomplete_estimated_count), int(epic.incomplete_unestimated_count),
+            getattr(fields, jiraFields.START_DATE_KEY, None), getattr(fields, "duedate", None)]
+
+
+def initiative_row(initiative):
+    """
+        Flattens an Initiative into a row of the initiatives table.
+        initiative - the Initiative.
+    """
+    fields = initiative.initiative.fields
+    return [initiative.initiative.key, field_name(fields, "project", "key"), getattr(fields, "summary", None), field_name(fields, "status"),
+            float(initiative.summed_time), float(initiative.remaining_time), len([epic for epic in initiative.epics if epic.epic.key !=
+                                                                                  initiative.initiative.key]),
+            int(initiative.incomplete_estimated_count), int(initiative.incomplete_unestimated_count), float(
+                initiative.estimation_confidence),
+            float(initiative.story_point_weight), float(initiative.story_point_weight_ceiling)]
@@ -0,0 +1,286 @@
+import argparse
+import columnarExport
+import epicTimeRollup
+import exportManifest
+import initiativeTimeRollup
+import issueStore
+import releaseTimeRollup
+import rollupSnapshots
+from dataclasses import dataclass
+import datetime
+import os
+import sys
+import jiraClient
+
+
+### Data Structures ###
+
+@dataclass
+class RollupPlan:
+    epic_keys: []
+    initiative_issues: []
+    initiative_epic_keys: dict
+    releases: []
+
+    def all_epic_keys(self):
+        """
+            The union of the requested epics and the epics of the initiatives, each once, in request order.
+        """
+        epic_keys = []
+        for key in self.epic_keys + [key for initiative_issue in self.initiative_issues for key in self.initiative_epic_keys.get(initiative_issue.key, [])]:
+            if key not in epic_keys:
+                epic_keys.append(key)
+        return epic_keys
+
+    def dict(self):
+        return {'epics': self.epic_keys, 'initiatives': [initiative_issue.key for initiative_issue in self.initiative_issues],
+                'releases': self.releases, 'fetched_epics': self.all_epic_keys()}
+
+
+@dataclass
+class CombinedRollup:
+    epics: []
+    initiatives: []
+    releases: []
+    epic_schedules: []
+    month_distributions: dict
+
+
+### Methods ###
+
+def plan_rollups(jira, epic_keys, initiative_keys, auto_initiatives, releases):
+    """
+        Resolves the initiatives to their epics, so that every epic needed by any roll-up is fetched once.
+        jira - the jira connection.
+        epic_keys - list of requested epic keys.
+        initiative_keys - list of requested initiative keys.
+        auto_initiatives - whether the initiatives should be discovered instead.
+        releases - list of requested release names.
+    """
+    if auto_initiatives:
+        initiative_issues = initiativeTimeRollup.discover_initiatives(
+            jira, initiativeTimeRollup.AUTO_INITIATIVES_QUERY)
+    else:
+        initiative_issues = (jira.issue(initiative, fields=initiativeTimeRollup.INITIATIVE_FIELDS)
+                             for initiative in initiative_keys)
+
+    plan = RollupPlan(epic_keys, [], {}, releases)
+    for initiative_issue in initiative_issues:
+        if initiative_issue.fields.status.name == 'Done':
+            continue
+        plan.initiative_issues.append(initiative_issue)
+        # Initiatives in initial estimation take their estimate from the initiative itself.
+        if initiative_issue.fields.status.name != 'Initial Estimation':
+            plan.initiative_epic_keys[initiative_issue.key] = initiativeTimeRollup.get_linked_epic_keys(
+                initiative_issue)
+    return plan
+
+
+def rollup_plan(jira, plan, project_configs, story_point_weight, story_point_weight_ceiling, update_ticket_estimates=False, force_toplevel_recalculate=False,
+                import_project_configs=False, import_project_configs_path=None, raw_issues=False, store=None):
+    """
+        Fetches the union of the planned epics once and computes every epic, initiative, release and calendar roll-up
+        from it.
+        jira - the jira connection.
+        plan - the RollupPlan.
+        project_configs - dictionary of jira project configurations; missing projects are generated and added to it.
+        story_point_weight - Weighted value to be used in calculating the confidence interval.
+        story_point_weight_ceiling - The max value to use for weighted story point calculations.
+        update_ticket_estimates - whether story and epic estimates should be written back to jira.
+        force_toplevel_recalculate - whether story level estimates should be recalculated from subtasks.
+        import_project_configs - whether project configurations should be loaded from file.
+        import_project_configs_path - fully qualified path of the folder containing the project configurations.
+        raw_issues - whether child issues should be searched as raw JSON rather than built into jira resources.
+        store - optional IssueStore materializing the roll-ups; their totals are then taken from its SQL aggregates.
+    """
+    all_epics = epicTimeRollup.rollup_epics(jira, plan.all_epic_keys(), project_configs, update_ticket_estimates,
+                                            force_toplevel_recalculate, import_project_configs, import_project_configs_path, raw_issues)
+    if store is not None:
+        store.add_epics(all_epics, project_configs,
+                        force_toplevel_recalculate, update_ticket_estimates)
+        store.apply_epic_rollups(all_epics)
+    if update_ticket_estimates:
+        epicTimeRollup.update_ticket_estimates(all_epics, project_configs)
+    epics_by_key = {epic.epic.key: epic for epic in all_epics}
+
+    initiatives_container = []
+    for initiative_issue in plan.initiative_issues:
+        print("Obtaining roll-up for {}".format(initiative_issue.key))
+        if initiative_issue.key not in plan.initiative_epic_keys:
+            initiative = initiativeTimeRollup.calculate_initial_estimation(
+                initiative_issue, initiativeTimeRollup.INITIAL_TIME_KEY, story_point_weight, story_point_weight_ceiling)
+        else:
+            initiative = initiativeTimeRollup.Initiative(initiative_issue, [epics_by_key[key] for key in plan.initiative_epic_keys[initiative_issue.key] if key in epics_by_key],
+                                                         0.0, 0.0, 0, 0, 0.0, story_point_weight, story_point_weight_ceiling)
+            initiative.calculate_estimate_counts()
+        initiatives_container.append(initiative)
+    if store is not None:
+        store.add_initiatives(initiatives_container)
+        store.apply_initiative_rollups(initiatives_container)
+
+    shared_issues = {story.issue.key: story for epic in all_epics for story in epic.issues}
+    releases_container = []
+    for release in plan.releases:
+        release_obj = releaseTimeRollup.rollup_release(
+            jira, release, project_configs, shared_issues)
+        if release_obj is not None:
+            releases_container.append(release_obj)
+    if store is not None:
+        store.add_releases(releases_container, project_configs)
+        store.apply_release_rollups(releases_container)
+
+    epic_schedules, skipped_epics = initiativeTimeRollup.calculate_epic_schedules(
+        initiatives_container, datetime.datetime.today())
+    month_distributions = initiativeTimeRollup.calculate_capacity_calendar(
+        epic_schedules)
+
+    return CombinedRollup([epics_by_key[key] for key in plan.epic_keys if key in epics_by_key], initiatives_container, releases_container,
+                          epic_schedules, month_distributions)
+
+
+def export_combined_rollup(root, combined, create_calendar_schedule=False):
+    """
+        Exports every roll-up into its own folder of root, in the layout of the separate commands.
+        root - fully qualified path to folder in which to write to.
+        combined - the CombinedRollup.
+        create_calendar_schedule - whether the capacity calendar is exported with the initiatives.
+    """
+    epics_root = os.path.join(root, "epics")
+    initiatives_root = os.path.join(root, "initiatives")
+    releases_root = os.path.join(root, "releases")
+    for folder in [epics_root, initiatives_root, releases_root]:
+        if not os.path.exists(folder):
+            os.mkdir(folder)
+
+    epicTimeRollup.export_epics_json(epics_root, combined.epics)
+
+    initiativeTimeRollup.export_initiatives_json(
+        initiatives_root, combined.initiatives)
+    for initiative in combined.initiatives:
+        # Initiatives in initial estimation roll up no epics, so, as with the initiative command, they get no folder.
+        if [epic.epic.key for epic in initiative.epics] == [initiative.initiative.key]:
+            continue
+        initiative_root = os.path.join(
+            initiatives_root, initiative.initiative.key)
+        if not os.path.exists(initiative_root):
+            os.mkdir(initiative_root)
+        epicTimeRollup.export_epics_json(initiative_root, initiative.epics)
+        exportManifest.remove_stale(initiative_root)
+    if create_calendar_schedule:
+        initiativeTimeRollup.export_capacity_calendar(
+            initiatives_root, combined.month_distributions)
+
+    releaseTimeRollup.export_releases_json(releases_root, combined.releases)
+
+
+def parse_args(args_list):
+    """
+    Parse arguments for combined-rollup.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--api_token", required=True)
+    parser.add_argument("--server", default=jiraClient.DEFAULT_SERVER)
+    parser.add_argument("--epics")
+    parser.add_argument("--initiatives")
+    parser.add_argument("--auto_initiatives", action='store_true')
+    parser.add_argument("--releases")
+    parser.add_argument("--update_ticket_estimates", action='store_true')
+    parser.add_argument("--update_initiative_estimates", action='store_true')
+    parser.add_argument("--force_toplevel_recalculate", action='store_true')
+    parser.add_argument("--create_calendar_schedule", action='store_true')
+    parser.add_argument("--export_estimates", action='store_true')
+    parser.add_argument("--export_estimates_path")
+    parser.add_argument("--import_project_configs", action='store_true')
+    parser.add_argument("--import_project_configs_path")
+    parser.add_argument("--story_point_weight", type=float, default=5)
+    parser.add_argument("--story_point_weight_ceiling",
+                        type=float, default=25)
+    parser.add_argument("--raw_issues", action='store_true')
+    parser.add_argument("--issue_store_path")
+    parser.add_argument("--snapshot_path")
+    parser.add_argument("--snapshot_label")
+    parser.add_argument("--columnar_export_path")
+    parser.add_argument("--columnar_format", choices=columnarExport.COLUMNAR_FORMATS,
+                        default=columnarExport.PARQUET_FORMAT)
+
+    args = parser.parse_args(args=args_list)
+
+    if args.epics is None and args.initiatives is None and not args.auto_initiatives and args.releases is None:
+        argparse.ArgumentError(
+            "User must provide at least one of --epics, --initiatives, --auto_initiatives or --releases.")
+        sys.exit(-2)
+
+    if args.export_estimates == True:
+        if args.export_estimates_path is None:
+            argparse.ArgumentError(
+                "User provided --export_estimates, but no value for --export_estimates_path .")
+            sys.exit(-2)
+
+    if args.create_calendar_schedule == True:
+        if args.export_estimates == False:
+            argparse.ArgumentError(
+                "User provided --create_calendar_schedule option but did not provide --export_estimates")
+            sys.exit(-4)
+
+    if args.import_project_configs == True:
+        if args.import_project_configs_path is None:
+            argparse.ArgumentError(
+                "User provided --import_project_configs, but no value for --import_project_configs_path .")
+            sys.exit(-2)
+
+    return args
+
+
+### Main ###
+
+def execute(args_list, jira=None):
+    args = parse_args(args_list)
+    print("Running combined JIRA Tabulations")
+    owns_client = jira is None
+    if owns_client:
+        jira = jiraClient.connect(args.user, args.api_token, args.server)
+
+    plan = plan_rollups(jira, args.epics.split(",") if args.epics is not None else [],
+                        args.initiatives.split(",") if args.initiatives is not None else [], args.auto_initiatives,
+                        args.releases.split(",") if args.releases is not None else [])
+    print("Planned {} epics for {} requested epics, {} initiatives and {} releases.".format(
+        len(plan.all_epic_keys()), len(plan.epic_keys), len(plan.initiative_issues), len(plan.releases)))
+
+    project_configs = {}
+    store = issueStore.IssueStore(
+        args.issue_store_path) if args.issue_store_path is not None else None
+    try:
+        combined = rollup_plan(jira, plan, project_configs, args.story_point_weight, args.story_point_weight_ceiling, args.update_ticket_estimates,
+                               args.force_toplevel_recalculate, args.import_project_configs, args.import_project_configs_path, args.raw_issues, store)
+    finally:
+        if store is not None:
+            store.close()
+
+    if args.update_initiative_estimates:
+        initiativeTimeRollup.update_initiative_estimates(combined.initiatives)
+
+    if args.export_estimates:
+        export_combined_rollup(
+            args.export_estimates_path, combined, args.create_calendar_schedule)
+
+    if args.snapshot_path is not None:
+        rollupSnapshots.record_snapshot(args.snapshot_path, args.snapshot_label, epics_container=combined.epics,
+                                        initiatives_container=combined.initiatives, month_distributions=combined.month_distributions)
+
+    if args.columnar_export_path is not None:
+        columnar_export = columnarExport.ColumnarExport(
+            args.columnar_export_path, args.columnar_format)
+        columnar_export.add_initiatives(combined.initiatives)
+        initiative_epic_keys = set(
+            epic.epic.key for initiative in combined.initiatives for epic in initiative.epics)
+        columnar_export.add_epics(
+            [epic for epic in combined.epics if epic.epic.key not in initiative_epic_keys])
+        columnar_export.add_releases(combined.releases)
+        columnar_export.add_epic_schedules(combined.epic_schedules)
+        columnar_export.close()
+
+    if owns_client:
+        jira.print_cache_report()
+
+    return combined
@@ -0,0 +1,441 @@
+import argparse
+import exportManifest
+import epicTimeRollup
+import initiativeTimeRollup
+from dataclasses import dataclass, asdict
+import datetime
+import json
+import os
+import sys
+import numpy
+import jiraClient
+import jiraFields
+
+
+### Constants ###
+
+DONE_STATUS = "Done"
+# Statuses in which work on an issue has not started yet.
+TODO_STATUSES = ["To Do", "Backlog", "Open", "Selected for Development"]
+STATUS_FIELD = "status"
+ESTIMATE_FIELD_NAME = "Story point estimate"
+
+SEARCH_PAGE_SIZE = 100
+CHANGELOG_PAGE_SIZE = 100
+# Number of keys per JQL "in" clause.
+KEY_CHUNK_SIZE = 50
+
+# Bumped whenever summarize_changelog changes what it records.
+CYCLE_CACHE_VERSION = 2
+
+JIRA_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+CYCLE_PERCENTILES = [50, 85]
+
+
+### Data Structures ###
+
+@dataclass
+class IssueCycle:
+    key: str
+    updated: str
+    status: str
+    created: str
+    started: str
+    completed: str
+    initial_estimate: float
+    final_estimate: float
+    estimate_changes: int
+
+    def cycle_days(self):
+        if self.started is None or self.completed is None:
+            return None
+        return round((parse_time(self.completed) - parse_time(self.started)).total_seconds() / 86400, 2)
+
+    def estimate_drift(self):
+        return round((self.final_estimate or 0.0) - (self.initial_estimate or 0.0), 2)
+
+    def dict(self):
+        return {'key': self.key, 'status': self.status, 'started': self.started, 'completed': self.completed, 'cycle_days': self.cycle_days(),
+                'initial_estimate': self.initial_estimate, 'final_estimate': self.final_estimate, 'estimate_changes': self.estimate_changes,
+                'estimate_drift': self.estimate_drift()}
+
+
+@dataclass
+class EpicCycle:
+    epic: object
+    issues: []
+
+    def dict(self):
+        cycle_json = cycle_summary(self.issues)
+        cycle_json.update({'key': self.epic.key, 'summary': self.epic.fields.summary,
+                           'issues': [issue.dict() for issue in self.issues]})
+        return cycle_json
+
+
+@dataclass
+class InitiativeCycle:
+    initiative: object
+    epics: []
+
+    def all_issues(self):
+        return [issue for epic in self.epics for issue in epic.issues]
+
+    def dict(self):
+        cycle_json = cycle_summary(self.all_issues())
+        cycle_json.update({'key': self.initiative.key, 'summary': self.initiative.fields.summary,
+                           'epics': [epic.dict() for epic in self.epics]})
+        return cycle_json
+
+
+### Methods ###
+
+def parse_time(value):
+    return datetime.datetime.strptime(value, JIRA_TIME_FORMAT)
+
+
+def parse_estimate(value):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def cycle_summary(issues):
+    """
+        Aggregates the cycle times and estimate changes of a set of issues.
+        issues - the list of IssueCycle objects.
+    """
+    cycle_days = numpy.array([issue.cycle_days() for issue in issues if issue.cycle_days() is not None])
+    started = [issue.started for issue in issues if issue.started is not None]
+    completed = [issue.completed for issue in issues if issue.completed is not None]
+    # The elapsed time of the whole set, from the first start until the last completion once everything is done.
+    all_done = len(issues) > 0 and all(issue.status == DONE_STATUS for issue in issues)
+    first_started = min(started, key=parse_time) if len(started) > 0 else None
+    last_completed = max(completed, key=parse_time) if all_done and len(completed) > 0 else None
+
+    summary = {'issue_count': len(issues), 'completed_count': len([issue for issue in issues if issue.status == DONE_STATUS]),
+               'started': first_started, 'completed': last_completed,
+               'elapsed_days': round((parse_time(last_completed) - parse_time(first_started)).total_seconds() / 86400, 2) if first_started is not None and last_completed is not None else None,
+               'mean_cycle_days': round(float(cycle_days.mean()), 2) if len(cycle_days) > 0 else None,
+               'initial_estimate': round(sum(issue.initial_estimate or 0.0 for issue in issues), 2),
+               'final_estimate': round(sum(issue.final_estimate or 0.0 for issue in issues), 2),
+               'estimate_changes': sum(issue.estimate_changes for issue in issues),
+               'reestimated_count': len([issue for issue in issues if issue.estimate_changes > 0])}
+    summary['estimate_drift'] = round(
+        summary['final_estimate'] - summary['initial_estimate'], 2)
+    for percentile in CYCLE_PERCENTILES:
+        summary['p{}_cycle_days'.format(percentile)] = round(float(numpy.percentile(
+            cycle_days, percentile)), 2) if len(cycle_days) > 0 else None
+    return summary
+
+
+def get_estimation_key(issue_type_id, project_constants):
+    """
+        Gets the estimation key of an issue; tasks have their own key, every other child of an epic uses the story key.
+        issue_type_id - the issue type id of the issue.
+        project_constants - project constants used to determine task type & customs.
+    """
+    if issue_type_id == getattr(project_constants.task, "type_id", None):
+        return getattr(project_constants.task, "estimation_key", None)
+    return getattr(project_constants.story, "estimation_key", None)
+
+
+def cycle_fields(project_constants):
+    """
+        Fields needed to summarize the changelog of an issue.
+        project_constants - project constants used to determine task type & customs.
+    """
+    return jiraFields.fields_param(jiraFields.BASE_FIELDS, jiraFields.estimation_keys(project_constants, "story", "task"), ["created", "updated"])
+
+
+def search_pages(jira, query_string, fields, expand=None):
+    """
+        Iterates over the issues of a paginated search as the pages arrive. Pages are only read once, so they bypass
+        the request memo of the client rather than being held for the rest of the run.
+        jira - the jira connection.
+        query_string - the JQL of the search.
+        fields - the fields to return.
+        expand - the expansions to request, e.g. changelog.
+    """
+    search_issues = jira.jira.search_issues if isinstance(
+        jira, jiraClient.CachingJira) else jira.search_issues
+    start_at = 0
+
+    while True:
+        page = search_issues(query_string, startAt=start_at,
+                             maxResults=SEARCH_PAGE_SIZE, fields=fields, expand=expand)
+        for issue in page:
+            yield issue
+
+        # Jira may cap maxResults below the page size asked for, so only the total marks the last page.
+        start_at += len(page)
+        if len(page) == 0 or start_at >= page.total:
+            break
+
+
+def get_histories(jira, issue):
+    """
+        Iterates over the changelog histories of an issue. Searches only embed the first page of a changelog; the rest
+        is fetched page by page.
+        jira - the jira connection.
+        issue - the jira issue, fetched with the changelog expanded.
+    """
+    changelog = issue.raw.get('changelog', {})
+    histories = changelog.get('histories', [])
+    for history in histories:
+        yield history
+
+    start_at = len(histories)
+    while start_at < changelog.get('total', 0):
+        page = jira._get_json("issue/{}/changelog".format(issue.key), params={
+            'startAt': start_at, 'maxResults': CHANGELOG_PAGE_SIZE})
+        for history in page.get('values', []):
+            yield history
+        if len(page.get('values', [])) == 0 or page.get('isLast', False):
+            break
+        start_at += len(page['values'])
+
+
+def summarize_changelog(jira, issue, project_constants):
+    """
+        Walks the changelog of an issue once, keeping only when work started and completed and how its estimate changed.
+        jira - the jira connection.
+        issue - the jira issue, fetched with the changelog expanded.
+        project_constants - project constants used to determine task type & customs.
+    """
+    estimation_key = get_estimation_key(
+        issue.fields.issuetype.id, project_constants)
+    status = issue.fields.status.name
+    final_estimate = getattr(issue.fields, estimation_key, None) if estimation_key is not None else None
+
+    started = None
+    completed = None
+    initial_estimate = None
+    estimate_changes = 0
+    first_estimate_seen = False
+
+    # Histories are not guaranteed to arrive in order; only the (small) items that matter are kept for sorting.
+    events = []
+    for history in get_histories(jira, issue):
+        for item in history.get('items', []):
+            if item.get('field') == STATUS_FIELD or item.get('fieldId') == estimation_key or item.get('field') == ESTIMATE_FIELD_NAME:
+                events.append((history['created'], item.get('field'), item.get(
+                    'fieldId'), item.get('fromString'), item.get('toString')))
+
+    for created, field_name, field_id, from_string, to_string in sorted(events, key=lambda event: parse_time(event[0])):
+        if field_name == STATUS_FIELD:
+            if started is None and to_string not in TODO_STATUSES:
+                started = created
+            # Reopening an issue discards its earlier completion.
+            completed = created if to_string == DONE_STATUS else None
+        else:
+            if not first_estimate_seen:
+                first_estimate_seen = True
+                # Setting the first estimate on an unestimated issue is not a change of it.
+                if from_string is None or from_string == "":
+                    initial_estimate = parse_estimate(to_string)
+                    continue
+                initial_estimate = parse_estimate(from_string)
+            estimate_changes += 1
+
+    if not first_estimate_seen:
+        initial_estimate = final_estimate
+
+    return IssueCycle(issue.key, issue.fields.updated, status, issue.fields.created, started, completed,
+                      float(initial_estimate) if initial_estimate is not None else None,
+                      float(final_estimate) if final_estimate is not None else None, estimate_changes)
+
+
+def key_chunks(keys):
+    for index in range(0, len(keys), KEY_CHUNK_SIZE):
+        yield keys[index:index + KEY_CHUNK_SIZE]
+
+
+def get_epic_children(jira, epic_issues):
+    """
+        Resolves the children of the epics, with the time they were last updated, using one paginated search per chunk
+        of epics. Returns a dictionary of epic key to the list of (child key, updated) tuples.
+        jira - the jira connection.
+        epic_issues - the list of jira epics.
+    """
+    children = {epic_issue.key: [] for epic_issue in epic_issues}
+    for chunk in key_chunks(list(children)):
+        for issue in search_pages(jira, "parent in ({}) ORDER BY key ASC".format(",".join(chunk)), "parent,updated"):
+            children[issue.fields.parent.key].append(
+                (issue.key, issue.fields.updated))
+    return children
+
+
+def load_cycle_cache(path):
+    """
+        Loads the per issue changelog summaries of previous runs.
+        path - fully qualified path of the cache file; nothing is loaded when None or missing.
+    """
+    if path is None or not os.path.exists(path):
+        return {}
+    with open(path, 'r') as read_file:
+        cache = json.loads(read_file.read())
+    # Summaries of an older version of summarize_changelog are summarized again.
+    if cache.get('version') != CYCLE_CACHE_VERSION:
+        return {}
+    return {key: IssueCycle(**entry) for key, entry in cache['issues'].items()}
+
+
+def save_cycle_cache(path, cycle_cache):
+    with open(path, "w") as output_file:
+        output_file.writelines(json.dumps({'version': CYCLE_CACHE_VERSION, 'issues': {
+            key: asdict(issue_cycle) for key, issue_cycle in cycle_cache.items()}}, separators=(",", ":")))
+
+
+def rollup_cycle_times(jira, epic_issues, project_configs, cycle_cache):
+    """
+        Summarizes the changelogs of the children of the epics. Only issues updated since they were cached are fetched
+        again, with their changelogs, by paginated searches whose pages are processed and dropped as they arrive.
+        Returns the list of EpicCycle objects.
+        jira - the jira connection.
+        epic_issues - the list of jira epics; their project configurations must be in project_configs.
+        project_configs - dictionary of jira project configurations.
+        cycle_cache - dictionary of issue key to IssueCycle, updated in place.
+    """
+    children = get_epic_children(jira, epic_issues)
+    stale_keys = {}
+    for epic_issue in epic_issues:
+        for child_key, updated in children[epic_issue.key]:
+            if child_key not in cycle_cache or cycle_cache[child_key].updated != updated:
+                stale_keys.setdefault(
+                    epic_issue.fields.project.id, []).append(child_key)
+
+    for project_id, keys in stale_keys.items():
+        print("Fetching changelogs of {} issues.".format(len(keys)))
+        fields = cycle_fields(project_configs[project_id])
+        for chunk in key_chunks(keys):
+            for issue in search_pages(jira, "key in ({})".format(",".join(chunk)), fields, expand="changelog"):
+                cycle_cache[issue.key] = summarize_changelog(
+                    jira, issue, project_configs[project_id])
+
+    return [EpicCycle(epic_issue, [cycle_cache[child_key] for child_key, updated in children[epic_issue.key] if child_key in cycle_cache])
+            for epic_issue in epic_issues]
+
+
+def export_cycle_times_json(root, epic_cycles, initiative_cycles):
+    """
+        Exports the cycle times to json.
+        root - the root folder in which to place the output file.
+        epic_cycles - the list of EpicCycle objects.
+        initiative_cycles - the list of InitiativeCycle objects.
+    """
+    out_file_path = os.path.join(root, "Cycle_times.json")
+
+    print("Writing file {}".format(out_file_path))
+    exportManifest.write_json(out_file_path, {'epics': [epic_cycle.dict() for epic_cycle in epic_cycles], 'initiatives': [
+        initiative_cycle.dict() for initiative_cycle in initiative_cycles]})
+
+    print("Finished writing to file.")
+
+
+def parse_args(args_list):
+    """
+    Parse arguments for cycle-time-rollup.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--api_token", required=True)
+    parser.add_argument("--server", default=jiraClient.DEFAULT_SERVER)
+    parser.add_argument("--epics")
+    parser.add_argument("--initiatives")
+    parser.add_argument("--auto_initiatives", action='store_true')
+    parser.add_argument("--changelog_cache_path")
+    parser.add_argument("--export_estimates", action='store_true')
+    parser.add_argument("--export_estimates_path")
+    parser.add_argument("--import_project_configs", action='store_true')
+    parser.add_argument("--import_project_configs_path")
+
+    args = parser.parse_args(args=args_list)
+
+    if args.epics is None and args.initiatives is None and not args.auto_initiatives:
+        argparse.ArgumentError(
+            "User must provide --epics, --initiatives or --auto_initiatives.")
+        sys.exit(-2)
+
+    if args.export_estimates == True:
+        if args.export_estimates_path is None:
+            argparse.ArgumentError(
+                "User provided --export_estimates, but no value for --export_estimates_path .")
+            sys.exit(-2)
+
+    if args.import_project_configs == True:
+        if args.import_project_configs_path is None:
+            argparse.ArgumentError(
+                "User provided --import_project_configs, but no value for --import_project_configs_path .")
+            sys.exit(-2)
+
+    return args
+
+
+### Main ###
+
+def execute(args_list, jira=None):
+    args = parse_args(args_list)
+    print("Running JIRA Cycle Times")
+    owns_client = jira is None
+    if owns_client:
+        jira = jiraClient.connect(args.user, args.api_token, args.server)
+
+    # Resolve the hierarchy: initiatives to their epics, then every epic (and its project configuration) once.
+    initiative_epic_keys = []
+    if args.initiatives is not None:
+        initiative_issues = (jira.issue(initiative, fields=initiativeTimeRollup.INITIATIVE_FIELDS)
+                             for initiative in args.initiatives.split(","))
+    elif args.auto_initiatives:
+        initiative_issues = initiativeTimeRollup.discover_initiatives(
+            jira, initiativeTimeRollup.AUTO_INITIATIVES_QUERY)
+    else:
+        initiative_issues = []
+    for initiative_issue in initiative_issues:
+        initiative_epic_keys.append(
+            (initiative_issue, initiativeTimeRollup.get_linked_epic_keys(initiative_issue)))
+
+    epic_keys = args.epics.split(",") if args.epics is not None else []
+    for initiative_issue, keys in initiative_epic_keys:
+        epic_keys.extend(key for key in keys if key not in epic_keys)
+
+    project_configs = {}
+    epic_issues = {}
+    for epic in epic_keys:
+        try:
+            epic_issues[epic] = epicTimeRollup.fetch_epic(
+                jira, epic, project_configs, args.import_project_configs, args.import_project_configs_path)
+        except Exception as e:
+            print("Unable to access epic {}".format(epic))
+            print(e)
+
+    cycle_cache = load_cycle_cache(args.changelog_cache_path)
+    print("{} issue changelogs cached from previous runs.".format(len(cycle_cache)))
+    epic_cycles = rollup_cycle_times(
+        jira, list(epic_issues.values()), project_configs, cycle_cache)
+    if args.changelog_cache_path is not None:
+        save_cycle_cache(args.changelog_cache_path, cycle_cache)
+
+    epic_cycles_by_key = {
+        epic_cycle.epic.key: epic_cycle for epic_cycle in epic_cycles}
+    initiative_cycles = [InitiativeCycle(initiative_issue, [epic_cycles_by_key[key] for key in keys if key in epic_cycles_by_key])
+                         for initiative_issue, keys in initiative_epic_keys]
+
+    print("{:<12} {:>8} {:>10} {:>10} {:>10} {:>10}".format(
+        "key", "issues", "p50 days", "p85 days", "changes", "drift"))
+    for key, issues in [(initiative_cycle.initiative.key, initiative_cycle.all_issues()) for initiative_cycle in initiative_cycles] + \
+            [(epic_cycle.epic.key, epic_cycle.issues) for epic_cycle in epic_cycles]:
+        cycle_json = cycle_summary(issues)
+        print("{:<12} {:>8} {:>10} {:>10} {:>10} {:>10}".format(key, cycle_json['issue_count'], str(cycle_json['p50_cycle_days']), str(
+            cycle_json['p85_cycle_days']), cycle_json['estimate_changes'], cycle_json['estimate_drift']))
+
+    if args.export_estimates:
+        export_cycle_times_json(args.export_estimates_path,
+                                epic_cycles, initiative_cycles)
+
+    if owns_client:
+        jira.print_cache_report()
+
+    return epic_cycles, initiative_cycles
@@ -0,0 +1,147 @@
+import datetime
+import exportManifest
+import json
+import os
+import numpy
+
+
+### Constants ###
+
+# Spread of the multiplicative noise on remaining estimates at 0% and at 100% estimation confidence.
+MAX_ESTIMATE_SIGMA = 1.0
+MIN_ESTIMATE_SIGMA = 0.1
+
+
+### Methods ###
+
+def sample_remaining_time(epic_schedules, scenarios, story_point_weight, random_state):
+    """
+        Samples the remaining time of every scheduled epic. Returns the (scenarios, epics) array of samples and the expected
+        remaining time of every epic. Remaining estimates are perturbed by log-normal noise which narrows with the estimation
+        confidence of the initiative. The incomplete unestimated issues of an epic are sampled together from a gamma
+        distribution, shaped by their count and scaled by the epic's average estimated size. The placeholder epic of an
+        initiative in initial estimation is its whole estimate, and has no unestimated issues.
+        epic_schedules - the list of EpicSchedule objects.
+        scenarios - the number of scenarios to sample.
+        story_point_weight - average issue size assumed for epics without any estimated issue.
+        random_state - the numpy RandomState to sample with.
+    """
+    remaining_times = numpy.array(
+        [float(schedule.epic.remaining_time) for schedule in epic_schedules])
+    estimated_counts = numpy.array(
+        [schedule.epic.incomplete_estimated_count for schedule in epic_schedules], dtype=float)
+    unestimated_counts = numpy.array(
+        [0 if schedule.epic.epic.key == schedule.initiative.initiative.key else schedule.epic.incomplete_unestimated_count
+         for schedule in epic_schedules], dtype=float)
+    confidences = numpy.array(
+        [schedule.initiative.estimation_confidence / 100 for schedule in epic_schedules])
+
+    sigmas = MAX_ESTIMATE_SIGMA - \
+        (MAX_ESTIMATE_SIGMA - MIN_ESTIMATE_SIGMA) * confidences
+    noise = numpy.exp(random_state.standard_normal(
+        (scenarios, len(epic_schedules))) * sigmas)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        average_sizes = numpy.where(
+            estimated_counts > 0, remaining_times / estimated_counts, story_point_weight)
+    # The sum of k issue sizes drawn from an exponential distribution is gamma distributed; a shape of 0 samples 0.
+    unestimated_times = random_state.gamma(numpy.maximum(unestimated_counts, 0), numpy.maximum(
+        average_sizes, 1e-9), (scenarios, len(epic_schedules)))
+
+    return remaining_times * noise + unestimated_times, remaining_times + unestimated_counts * average_sizes
+
+
+def forecast_delivery(epic_schedules, scenarios, percentiles, story_point_weight, today, seed=None):
+    """
+        Monte Carlo forecast on top of the capacity calendar. Every scenario spreads each epic's sampled remaining time
+        over the same months as the calendar, and burns it at the rate planned between today and the epic's due date to
+        get a completion date. Returns the per month demand and per initiative completion date percentiles.
+        epic_schedules - the list of EpicSchedule objects.
+        scenarios - the number of scenarios to sample.
+        percentiles - the list of percentiles to report, e.g. [50, 85].
+        story_point_weight - average issue size assumed for epics without any estimated issue.
+        today - the date from which time is considered remaining.
+        seed - optional seed for reproducible forecasts.
+    """
+    random_state = numpy.random.RandomState(seed)
+    forecast = {'scenarios': scenarios, 'months': {}, 'initiatives': {}}
+    if len(epic_schedules) == 0:
+        return forecast
+
+    samples, expected_times = sample_remaining_time(
+        epic_schedules, scenarios, story_point_weight, random_state)
+
+    # (epics, months) matrix of the fraction of each epic's remaining time that falls in each month.
+    month_keys = []
+    month_index = {}
+    for schedule in epic_schedules:
+        for month_allocation in schedule.month_allocations:
+            if month_allocation.month_distribution_key not in month_index:
+                month_index[month_allocation.month_distribution_key] = len(
+                    month_keys)
+                month_keys.append(month_allocation.month_distribution_key)
+    fractions = numpy.zeros((len(epic_schedules), len(month_keys)))
+    for row, schedule in enumerate(epic_schedules):
+        for month_allocation in schedule.month_allocations:
+            fractions[row, month_index[month_allocation.month_distribution_key]
+                      ] += month_allocation.remaining_fraction
+
+    month_demand = samples @ fractions
+    month_percentiles = numpy.percentile(month_demand, percentiles, axis=0)
+    for column, month_key in enumerate(month_keys):
+        forecast['months'][month_key] = {'mean': round(float(month_demand[:, column].mean()), 2), 'point_estimate': round(float(sum(
+            schedule.epic.remaining_time * fractions[row, column] for row, schedule in enumerate(epic_schedules))), 2)}
+        for index, percentile in enumerate(percentiles):
+            forecast['months'][month_key]['p{:g}'.format(percentile)] = round(
+                float(month_percentiles[index, column]), 2)
+
+    # Days needed per scenario at the planned burn rate of each epic.
+    window_days = numpy.array([max((schedule.end_date - schedule.remaining_start_date).days + 1, 1)
+                               for schedule in epic_schedules], dtype=float)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        days_needed = numpy.where(
+            expected_times > 0, samples * (window_days / expected_times), 0.0)
+    start_offsets = numpy.array(
+        [(schedule.remaining_start_date - today).days for schedule in epic_schedules], dtype=float)
+    completion_offsets = start_offsets + days_needed
+
+    initiative_columns = {}
+    for column, schedule in enumerate(epic_schedules):
+        initiative_columns.setdefault(
+            schedule.initiative.initiative.key, []).append(column)
+
+    for initiative_key, columns in initiative_columns.items():
+        initiative = epic_schedules[columns[0]].initiative
+        initiative_completion = completion_offsets[:, columns].max(axis=1)
+        initiative_remaining = samples[:, columns].sum(axis=1)
+        completion_percentiles = numpy.percentile(
+            initiative_completion, percentiles)
+        remaining_percentiles = numpy.percentile(
+            initiative_remaining, percentiles)
+
+        forecast['initiatives'][initiative_key] = {'summary': initiative.initiative.fields.summary, 'remaining_time': initiative.remaining_time,
+                                                   'estimation_confidence': initiative.estimation_confidence, 'completion_dates': {}, 'remaining_times': {}}
+        for index, percentile in enumerate(percentiles):
+            completion_date = today + \
+                datetime.timedelta(
+                    days=int(numpy.ceil(completion_percentiles[index])))
+            forecast['initiatives'][initiative_key]['completion_dates']['p{:g}'.format(
+                percentile)] = completion_date.strftime("%Y-%m-%d")
+            forecast['initiatives'][initiative_key]['remaining_times']['p{:g}'.format(
+                percentile)] = round(float(remaining_percentiles[index]), 2)
+
+    return forecast
+
+
+def export_delivery_forecast(root, forecast):
+    """
+        Exports the delivery forecast to json.
+        root - the root folder in which to place the output file.
+        forecast - the forecast returned by forecast_delivery.
+    """
+    out_file_path = os.path.join(root, "Forecast_estimates.json")
+
+    print("Writing file {}".format(out_file_path))
+    exportManifest.write_json(out_file_path, forecast)
+
+    print("Finished writing to file.")
@@ -1,9 +1,18 @@
 from jira import JIRA
-from dataclasses import dataclass, asdict
+from jira.resources import Issue
+import jiraClient
+import jiraFields
+from dataclasses import dataclass, asdict, field
 import argparse
+import columnarExport
+import exportManifest
+import issueStore
+import rollupSnapshots
 import json
+import queue
 import sys
 import os
+import threading
 
 ### Constants ###
 
@@ -15,6 +24,19 @@ BUG_NAME = "Bug"
 
 issue_types = None
 project_strtype_id_map = None
+project_strtype_id_lock = threading.Lock()
+# Compiled IssueEstimator of every ProjectConstants object, keyed by its id.
+issue_estimators = {}
+
+# Number of epics a stage of the streamed roll-up may run ahead of the next one.
+STREAM_QUEUE_SIZE = 8
+STREAM_END = None
+# Seconds between checks that the export stage is still running while its queue is full.
+STREAM_PUT_TIMEOUT = 1
+JSON_INDENT = "    "
+
+# Maximum number of issues of a single raw search request.
+RAW_SEARCH_PAGE_SIZE = 100
 
 ### Data Structures ###
 @dataclass
@@ -22,6 +44,7 @@ class UserStory:
     issue: JIRA.issue
     subtasks: []
     summed_time: float
+    subtask_estimates: dict = field(default_factory=dict)
 
     def dict(self):
         return {'key': self.issue.key, 'summary': self.issue.fields.summary, 'status': self.issue.fields.status.name, 'time': self.summed_time}
@@ -44,20 +67,30 @@ class Epic:
             extract_issue_estimate(
                 jira, issue, project_configs[self.epic.fields.project.id], update_ticket_estimates, force_toplevel_recalculate)
 
-            self.summed_time += issue.summed_time
-            if issue.issue.fields.status.name != "Done":
-                self.remaining_time += issue.summed_time
-                if issue.summed_time <= 0.0:
-                    self.incomplete_unestimated_count += 1
-                else:
-                    self.incomplete_estimated_count += 1
+            self.apply_contribution(issue_contribution(issue), 1)
         self.issues.extend(new_issues)
 
+    def remove_issue(self, issue):
+        """
+            Removes an issue from the epic, subtracting its contribution from the epic totals.
+        """
+        self.issues = [i for i in self.issues if i is not issue]
+        self.apply_contribution(issue_contribution(issue), -1)
+
+    def apply_contribution(self, contribution, sign):
+        """
+            Adds (sign 1) or subtracts (sign -1) the contribution of a single issue to the epic totals.
+        """
+        summed_time, remaining_time, incomplete_estimated_count, incomplete_unestimated_count = contribution
+        self.summed_time += sign * summed_time
+        self.remaining_time += sign * remaining_time
+        self.incomplete_estimated_count += sign * incomplete_estimated_count
+        self.incomplete_unestimated_count += sign * incomplete_unestimated_count
+
     def dict(self):
         issues_json = []
 
         for issue in self.issues:
-            di = issue.dict()
             issues_json.append(issue.dict())
 
         return {'key': self.epic.key, 'summary': self.epic.fields.summary, 'time': self.summed_time, 'remaining_time': self.remaining_time, 'subticket_count': len(self.issues), 'incomplete_estimated_count': self.incomplete_estimated_count, 'incomplete_unestimated_count': self.incomplete_unestimated_count, 'issues': issues_json}
@@ -84,8 +117,103 @@ class ProjectConstants:
     def dict(self):
         return {'key': self.key, EPIC_NAME: self.epic.dict(), STORY_NAME: self.story.dict(), TASK_NAME: self.task.dict(), SUBTASK_NAME: self.subtask.dict(), BUG_NAME: self.bug.dict()}
 
+class RawFields:
+    """
+        Attribute view over the raw JSON fields of an issue, for the code which reads issue.fields.x. Nested objects are
+        only wrapped when they are read.
+    """
+    __slots__ = ("raw",)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __getattr__(self, name):
+        try:
+            value = self.raw[name]
+        except KeyError:
+            raise AttributeError(name)
+        if isinstance(value, dict):
+            return RawFields(value)
+        if isinstance(value, list):
+            return [RawFields(item) if isinstance(item, dict) else item for item in value]
+        return value
+
+
+class RawIssue:
+    """
+        Issue of a raw JSON search result, standing in for a jira Issue resource without building one.
+    """
+    __slots__ = ("raw", "key", "id", "fields", "jira")
+
+    def __init__(self, raw, jira):
+        self.raw = raw
+        self.key = raw['key']
+        self.id = raw.get('id')
+        self.fields = RawFields(raw['fields'])
+        self.jira = jira
+
+    def update(self, fields=None):
+        # Writes need a jira resource; it is only built for the issues which are written.
+        Issue(self.jira._options, self.jira._session,
+              raw=self.raw).update(fields=fields)
+
+
+class IssueEstimator:
+    """
+        Estimate lookup of a project compiled from its ProjectConstants, which reads the raw fields of an issue directly.
+    """
+
+    def __init__(self, project_constants):
+        self.task_type_id = getattr(project_constants.task, "type_id", None)
+        self.story_type_id = getattr(project_constants.story, "type_id", None)
+        self.task_key = getattr(project_constants.task, "estimation_key", None)
+        self.story_key = getattr(
+            project_constants.story, "estimation_key", None)
+
+    def task_estimate(self, raw_fields):
+        return raw_fields.get(self.task_key) if self.task_key is not None else None
+
+    def story_estimate(self, raw_fields):
+        # Subtasks are estimated with the story estimation key as well.
+        return raw_fields.get(self.story_key) if self.story_key is not None else None
+
+
+class JsonArrayWriter:
+    """
+        Writes a JSON array one element at a time, producing the same output as dumping the whole list at once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.output_file = exportManifest.HashingWriter(path)
+        self.count = 0
+
+    def append(self, element):
+        self.output_file.write("[\n" if self.count == 0 else ",\n")
+        self.output_file.write(JSON_INDENT + exportManifest.encode_json(
+            element).replace("\n", "\n" + JSON_INDENT))
+        self.count += 1
+
+    def close(self):
+        self.output_file.write("[]" if self.count == 0 else "\n]")
+        return self.output_file.close()
+
+
 ### Methods ###
 
+def issue_contribution(issue):
+    """
+        Gets the contribution of an estimated issue to the totals of its epic as a
+        (summed_time, remaining_time, incomplete_estimated_count, incomplete_unestimated_count) tuple.
+        issue - the UserStory object.
+    """
+    if issue.issue.fields.status.name == "Done":
+        return (issue.summed_time, 0.0, 0, 0)
+    if issue.summed_time <= 0.0:
+        return (issue.summed_time, issue.summed_time, 0, 1)
+    return (issue.summed_time, issue.summed_time, 1, 0)
+
+
 def parse_args(args_list):
     """
     Parse arguments for epic-time-rollup.
@@ -93,6 +221,7 @@ def parse_args(args_list):
     parser = argparse.ArgumentParser()
     parser.add_argument("--user", required=True)
     parser.add_argument("--api_token", required=True)
+    parser.add_argument("--server", default=jiraClient.DEFAULT_SERVER)
     parser.add_argument("--epics", required=True)
     parser.add_argument("--update_ticket_estimates", action='store_true')
     parser.add_argument("--force_toplevel_recalculate", action='store_true')
@@ -102,6 +231,19 @@ def parse_args(args_list):
     parser.add_argument("--export_project_config_path")
     parser.add_argument("--import_project_configs", action='store_true')
     parser.add_argument("--import_project_configs_path")
+    parser.add_argument("--issue_store_path")
+    parser.add_argument("--snapshot_path")
+    parser.add_argument("--snapshot_label")
+    parser.add_argument("--columnar_export_path",
+                        help="Folder in which to write flat issue and roll-up tables.")
+    parser.add_argument("--columnar_format", choices=columnarExport.COLUMNAR_FORMATS,
+                        default=columnarExport.PARQUET_FORMAT)
+    parser.add_argument("--raw_issues", action='store_true',
+                        help="Search child issues as raw JSON instead of building jira issue objects.")
+    parser.add_argument("--stream", action='store_true',
+                        help="Write every epic out as soon as it is rolled up instead of after all epics are fetched.")
+    parser.add_argument("--stream_queue_size", type=int,
+                        default=STREAM_QUEUE_SIZE)
 
     args, passthrough = parser.parse_known_args(args=args_list)
 
@@ -136,7 +278,6 @@ def generate_project_constants(jira, project, load_from_file=False, configuratio
     """
     global project_strtype_id_map
 
-    project_id = project.id
     full_project = jira.project(project.id)
 
     if load_from_file == True:
@@ -167,13 +308,16 @@ def generate_project_constants(jira, project, load_from_file=False, configuratio
                 return project_constants
 
     # Dynamically create project infomation by naming convention
-    if project_strtype_id_map is None:
-        project_strtype_id_map = {}
-
-    if project.id not in project_strtype_id_map:
-        project_strtype_id_map[project.id] = {}
+    with project_strtype_id_lock:
+        if project_strtype_id_map is None:
+            project_strtype_id_map = {}
+
+    # Project ids are only unique within a site.
+    project_id = (getattr(jira, "server_url", None), project.id)
+    if project_id not in project_strtype_id_map:
+        issue_type_map = {}
         for issue_type in full_project.issueTypes:
-            project_strtype_id_map[project.id][issue_type.name] = {
+            issue_type_map[issue_type.name] = {
                 "id": issue_type.id}
 
             # process custom field associated with 'Story point estimate'
@@ -184,12 +328,14 @@ def generate_project_constants(jira, project, load_from_file=False, configuratio
                 issue_expanded_data = meta['projects'][0]['issuetypes'][0]
                 for field_key in issue_expanded_data['fields']:
                     if issue_expanded_data['fields'][field_key]['name'] == 'Story point estimate':
-                        project_strtype_id_map[project.id][issue_type.name]['estimate_field'] = field_key
+                        issue_type_map[issue_type.name]['estimate_field'] = field_key
             except Exception as e:
                 print("Failed to extract metadata needed for estimates for project {} for issue data {}".format(project.key, issue_expanded_data))
                 print(e)
                 sys.exit(-1)
 
+        project_strtype_id_map[project_id] = issue_type_map
+
     try:
         # test for existence of issue types.
         projectConstants = ProjectConstants()
@@ -222,6 +368,17 @@ def generate_project_constants(jira, project, load_from_file=False, configuratio
     return projectConstants
 
 
+def get_subtask_estimate(subtask_issue, project_constants):
+    """
+        Gets the estimate of a subtask, or None if it is unestimated.
+        subtask_issue - the jira subtask.
+        project_constants - project constants used to determine task type & customs.
+    """
+    if hasattr(subtask_issue.fields, project_constants.story.estimation_key) and getattr(subtask_issue.fields, project_constants.story.estimation_key) is not None:
+        return float(getattr(subtask_issue.fields, project_constants.story.estimation_key))
+    return None
+
+
 def extract_issue_estimate(jira, epic_sub_issue, project_constants, update_ticket_estimates=False, force_toplevel_recalculate=False):
     """
         Extracts the issue estimate.
@@ -229,9 +386,10 @@ def extract_issue_estimate(jira, epic_sub_issue, project_constants, update_ticke
         epic_sub_issue - the jira item to estimate.
         project_constants - project constants used to determine task type & customs.
     """
-    print("Extracting time for issue: {}".format(epic_sub_issue.issue.key))
+    if isinstance(epic_sub_issue.issue, RawIssue):
+        return extract_raw_issue_estimate(jira, epic_sub_issue, project_constants, update_ticket_estimates, force_toplevel_recalculate)
 
-    unestimated_subtasks = []
+    print("Extracting time for issue: {}".format(epic_sub_issue.issue.key))
 
     # If it's a task, there is no further roll-up
     if epic_sub_issue.issue.fields.issuetype.id == project_constants.task.type_id:
@@ -244,38 +402,92 @@ def extract_issue_estimate(jira, epic_sub_issue, project_constants, update_ticke
     # 2) There is no roll-up/estimate at the user-story level
     elif epic_sub_issue.issue.fields.issuetype.id == project_constants.story.type_id:
         if (force_toplevel_recalculate and len(epic_sub_issue.subtasks) > 0) or getattr(epic_sub_issue.issue.fields, project_constants.story.estimation_key) is None:
-            for subtask in epic_sub_issue.subtasks:
-                fetched = jira.issue(
-                    subtask.key,
-                    fields="{}, subtasks, issuetype".format(
-                        project_constants.story.estimation_key),
-                )
-
-                if (
-                    hasattr(fetched.fields,
-                            project_constants.story.estimation_key)
-                    and getattr(fetched.fields, project_constants.story.estimation_key) is not None
-                ):
-                    epic_sub_issue.summed_time += float(
-                        getattr(fetched.fields, project_constants.story.estimation_key))
-                else:
-                    unestimated_subtasks.append(fetched.key)
-
-            if update_ticket_estimates:
-                # We want to make sure that we aren't flattening 'user story level estimates' with sub-task roll-up if that is not
-                # how teams are estimating. So if summed_time is 0.0, just yield to what's there already.
-                val = getattr(epic_sub_issue.issue.fields,
-                              project_constants.story.estimation_key)
-                              #TODO - inspect whether this should be remaining
-                max_value = val if epic_sub_issue.summed_time == 0 else epic_sub_issue.summed_time
-                epic_sub_issue.summed_time = max_value if max_value is not None else 0.0
-                epic_sub_issue.issue.update(
-                    fields={project_constants.story.estimation_key: max_value})
+            rollup_subtask_estimates(
+                jira, epic_sub_issue, project_constants, update_ticket_estimates)
         else:
             epic_sub_issue.summed_time += float(
                 getattr(epic_sub_issue.issue.fields, project_constants.story.estimation_key))
 
 
+def get_issue_estimator(project_constants):
+    """
+        Gets the compiled estimator of a project, built once per ProjectConstants object.
+        project_constants - project constants used to determine task type & customs.
+    """
+    # ProjectConstants are not hashable; the constants are kept alongside so that their id is not reused.
+    cached = issue_estimators.get(id(project_constants))
+    if cached is None or cached[0] is not project_constants:
+        cached = (project_constants, IssueEstimator(project_constants))
+        issue_estimators[id(project_constants)] = cached
+    return cached[1]
+
+
+def extract_raw_issue_estimate(jira, epic_sub_issue, project_constants, update_ticket_estimates=False, force_toplevel_recalculate=False):
+    """
+        Extracts the estimate of an issue fetched as raw JSON; the same roll-up as extract_issue_estimate, reading the
+        fields through the compiled estimator of the project.
+        jira - the jira connection.
+        epic_sub_issue - the jira item to estimate.
+        project_constants - project constants used to determine task type & customs.
+    """
+    print("Extracting time for issue: {}".format(epic_sub_issue.issue.key))
+
+    estimator = get_issue_estimator(project_constants)
+    raw_fields = epic_sub_issue.issue.raw['fields']
+    issue_type_id = raw_fields['issuetype']['id']
+
+    if issue_type_id == estimator.task_type_id:
+        estimate = estimator.task_estimate(raw_fields)
+        print("Debug: task {}, has an estimate of {}".format(
+            epic_sub_issue.issue.key, estimate))
+        if estimate is not None:
+            epic_sub_issue.summed_time += float(estimate)
+    elif issue_type_id == estimator.story_type_id:
+        estimate = estimator.story_estimate(raw_fields)
+        if (force_toplevel_recalculate and len(epic_sub_issue.subtasks) > 0) or estimate is None:
+            rollup_subtask_estimates(
+                jira, epic_sub_issue, project_constants, update_ticket_estimates)
+        else:
+            epic_sub_issue.summed_time += float(estimate)
+
+
+def rollup_subtask_estimates(jira, epic_sub_issue, project_constants, update_ticket_estimates=False):
+    """
+        Rolls the estimates of the subtasks of a story up into the story.
+        jira - the jira connection.
+        epic_sub_issue - the story to estimate.
+        project_constants - project constants used to determine task type & customs.
+        update_ticket_estimates - whether the roll-up should be written back to the story.
+    """
+    unestimated_subtasks = []
+
+    for subtask in epic_sub_issue.subtasks:
+        # Subtask estimates are kept on the story so that it can be re-estimated without refetching them.
+        if subtask.key not in epic_sub_issue.subtask_estimates:
+            fetched = jira.issue(
+                subtask.key,
+                fields=jiraFields.subtask_fields(project_constants),
+            )
+            epic_sub_issue.subtask_estimates[subtask.key] = get_subtask_estimate(
+                fetched, project_constants)
+
+        if epic_sub_issue.subtask_estimates[subtask.key] is not None:
+            epic_sub_issue.summed_time += epic_sub_issue.subtask_estimates[subtask.key]
+        else:
+            unestimated_subtasks.append(subtask.key)
+
+    if update_ticket_estimates:
+        # We want to make sure that we aren't flattening 'user story level estimates' with sub-task roll-up if that is not
+        # how teams are estimating. So if summed_time is 0.0, just yield to what's there already.
+        val = getattr(epic_sub_issue.issue.fields,
+                      project_constants.story.estimation_key)
+                      #TODO - inspect whether this should be remaining
+        max_value = val if epic_sub_issue.summed_time == 0 else epic_sub_issue.summed_time
+        epic_sub_issue.summed_time = max_value if max_value is not None else 0.0
+        epic_sub_issue.issue.update(
+            fields={project_constants.story.estimation_key: max_value})
+
+
 def update_ticket_estimates(epic_containers, project_configs):
     """
         Updates the actual jira issues to reflect the new estimates.
@@ -307,13 +519,9 @@ def export_epics_json(root, epics_container):
         projects_json[epic_container.epic.fields.project.key].append(
             epic_container.dict())
 
-    for project_key in projects_json:
-        out_file_path = os.path.join(
-            root, "{}_estimates.json".format(project_key))
-
-        with open(out_file_path, "w") as output_file:
-            output_file.writelines(json.dumps(
-                projects_json[project_key], indent=4, separators=(",", ": ")))
+    # Each project's payload is built once above; the files are encoded concurrently.
+    exportManifest.write_json_files([(os.path.join(root, "{}_estimates.json".format(
+        project_key)), projects_json[project_key]) for project_key in projects_json])
 
     print("Finished writing to file.")
 
@@ -328,33 +536,100 @@ def export_project_configs_json(root, project_configs_container):
         out_file_path = os.path.join(
             root, "{}_config.json".format(project_configs_container[project].key))
 
-        with open(out_file_path, "w") as output_file:
-            dictthing = project_configs_container[project].dict()
-            output_file.writelines(json.dumps(
-                project_configs_container[project].dict(), indent=4, separators=(",", ": ")))
+        exportManifest.write_json(
+            out_file_path, project_configs_container[project].dict())
 
-### Main ###
+def fetch_epic(jira, epic, project_configs, import_project_configs=False, import_project_configs_path=None):
+    """
+        Fetches an epic, generating the configuration of its project if it was not seen before.
+        jira - the jira connection.
+        epic - the epic key.
+        project_configs - dictionary of jira project configurations; missing projects are generated and added to it.
+        import_project_configs - whether project configurations should be loaded from file.
+        import_project_configs_path - fully qualified path of the folder containing the project configurations.
+    """
+    # The project is read from the epic itself; the estimate is fetched with the estimation keys of the projects seen so far.
+    fetched_keys = [key for project_constants in project_configs.values()
+                    for key in jiraFields.estimation_keys(project_constants, "epic")]
+    issue = jira.issue(epic, fields=jiraFields.fields_param(
+        jiraFields.BASE_FIELDS, fetched_keys, [jiraFields.START_DATE_KEY, "duedate"]))
+    project_id = issue.fields.project.id
 
-def execute(args_list):
-    args = parse_args(args_list)
-    print("Running JIRA Tabulations for Epics")
-    jira_options = {"server": "https://battlefy.atlassian.net"}
-    jira = JIRA(
-        options=jira_options,
-        basic_auth=(args.user, args.api_token),
-    )
-    epics = args.epics.split(",")
+    if project_id not in project_configs:
+        project_configs[project_id] = generate_project_constants(
+            jira, issue.fields.project, load_from_file=import_project_configs, configuration_folder_root=import_project_configs_path)
+        # Only an epic of a new project estimating with a key not fetched yet is fetched again.
+        if any(key not in fetched_keys for key in jiraFields.estimation_keys(project_configs[project_id], "epic")):
+            issue = jira.issue(
+                epic, fields=jiraFields.epic_fields(project_configs[project_id]))
+
+    return issue
 
+
+def search_raw_issues(jira, query_string, fields, max_results):
+    """
+        Searches issues as raw JSON, page by page, wrapping them as RawIssue objects instead of jira resources.
+        jira - the jira connection.
+        query_string - the JQL of the search.
+        fields - the fields to return.
+        max_results - the maximum number of issues to return.
+    """
+    raw_issues = []
+    while len(raw_issues) < max_results:
+        page = jira.search_issues(query_string, startAt=len(raw_issues), maxResults=min(
+            RAW_SEARCH_PAGE_SIZE, max_results - len(raw_issues)), fields=fields, json_result=True)
+        raw_issues.extend(RawIssue(raw, jira) for raw in page['issues'])
+        if len(page['issues']) == 0 or len(raw_issues) >= page['total']:
+            break
+    return raw_issues
+
+
+def fetch_epic_issues(jira, epic_issue, project_configs, raw_issues=False):
+    """
+        Fetches the child issues of an epic as UserStory objects.
+        jira - the jira connection.
+        epic_issue - the jira epic.
+        project_configs - dictionary of jira project configurations.
+        raw_issues - whether the issues should be searched as raw JSON rather than built into jira resources.
+    """
+    query_string = "parent={}".format(epic_issue.key)
+
+    if raw_issues:
+        return [UserStory(e, e.fields.subtasks if hasattr(e.fields, "subtasks") else [], 0.0)
+                for e in search_raw_issues(jira, query_string, jiraFields.child_fields(project_configs[epic_issue.fields.project.id]), 1000)]
+
+    return [
+        UserStory(
+            e, e.fields.subtasks if hasattr(
+                e.fields, "subtasks") else [], 0.0
+        )
+        for e in jira.search_issues(
+            query_string,
+            maxResults=1000,
+            fields=jiraFields.child_fields(
+                project_configs[epic_issue.fields.project.id])
+        )
+    ]
+
+
+def rollup_epics(jira, epics, project_configs, update_ticket_estimates=False, force_toplevel_recalculate=False, import_project_configs=False, import_project_configs_path=None, raw_issues=False):
+    """
+        Fetches the epics and their child issues and calculates the estimate roll-up for each epic.
+        jira - the jira connection.
+        epics - the list of epic keys to calculate the rollup for.
+        project_configs - dictionary of jira project configurations; missing projects are generated and added to it.
+        update_ticket_estimates - whether story level estimates should be written back to jira.
+        force_toplevel_recalculate - whether story level estimates should be recalculated from subtasks.
+        import_project_configs - whether project configurations should be loaded from file.
+        import_project_configs_path - fully qualified path of the folder containing the project configurations.
+        raw_issues - whether child issues should be searched as raw JSON rather than built into jira resources.
+    """
     epics_container = []
-    project_configs = {}
 
     for epic in epics:
         try:
-            issue = jira.issue(epic)
-
-            if issue.fields.project.key not in project_configs:
-                project_configs[issue.fields.project.id] = generate_project_constants(
-                    jira, issue.fields.project, load_from_file=args.import_project_configs, configuration_folder_root=args.import_project_configs_path)
+            issue = fetch_epic(jira, epic, project_configs,
+                               import_project_configs, import_project_configs_path)
 
             epic_container = Epic(issue, [], 0.0, 0.0, 0.0, 0.0)
             epics_container.append(epic_container)
@@ -365,29 +640,253 @@ def execute(args_list):
 
     for epic_container in epics_container:
         try:
-            query_string = "parent={}".format(epic_container.epic.key)
-            cust_keys = list(set([project_configs[epic_container.epic.fields.project.id].story.estimation_key,
-                                  project_configs[epic_container.epic.fields.project.id].task.estimation_key]))
-            cust_key_str = ",".join(cust_keys)
-
-            epic_issues = [
-                UserStory(
-                    e, e.fields.subtasks if hasattr(
-                        e.fields, "subtasks") else [], 0.0
-                )
-                for e in jira.search_issues(
-                    query_string,
-                    maxResults=1000,
-                    fields="{}, subtasks, status, summary, issuetype".format(
-                        cust_key_str
-                    )
-                )
-            ]
+            epic_issues = fetch_epic_issues(
+                jira, epic_container.epic, project_configs, raw_issues)
             epic_container.add_issues(
-                jira, project_configs, args.update_ticket_estimates, args.force_toplevel_recalculate, epic_issues)
+                jira, project_configs, update_ticket_estimates, force_toplevel_recalculate, epic_issues)
 
         except Exception as e:
-            print("Issue extracting child objects.")
+            print("Issue extracting child objects of {}.".format(
+                epic_container.epic.key))
+            print(e)
+
+    return epics_container
+
+
+def fetch_stage(jira, epics, project_configs, fetched_queue, import_project_configs=False, import_project_configs_path=None, raw_issues=False):
+    """
+        First stage of the streamed roll-up: fetches every epic and its children, in order, onto fetched_queue.
+        jira - the jira connection.
+        epics - the list of epic keys to calculate the rollup for.
+        project_configs - dictionary of jira project configurations; missing projects are generated and added to it.
+        fetched_queue - bounded queue receiving (epic issue, list of UserStory) tuples, closed with STREAM_END.
+        import_project_configs - whether project configurations should be loaded from file.
+        import_project_configs_path - fully qualified path of the folder containing the project configurations.
+        raw_issues - whether child issues should be searched as raw JSON rather than built into jira resources.
+    """
+    try:
+        for epic in epics:
+            try:
+                issue = fetch_epic(jira, epic, project_configs,
+                                   import_project_configs, import_project_configs_path)
+            except Exception as e:
+                print("Unable to access epic {}".format(epic))
+                print(e)
+                continue
+
+            try:
+                epic_issues = fetch_epic_issues(
+                    jira, issue, project_configs, raw_issues)
+            except Exception as e:
+                print("Issue extracting child objects of {}.".format(issue.key))
+                print(e)
+                epic_issues = []
+
+            fetched_queue.put((issue, epic_issues))
+    finally:
+        fetched_queue.put(STREAM_END)
+
+
+def export_stage(root, exported_queue, export_errors):
+    """
+        Last stage of the streamed roll-up: encodes every epic and appends it to the export of its project.
+        root - fully qualified path to folder in which to write to.
+        exported_queue - bounded queue of (project key, epic dictionary) tuples, closed with STREAM_END.
+        export_errors - list receiving the error the stage stopped on, to be raised by the producer.
+    """
+    writers = {}
+    try:
+        while True:
+            exported = exported_queue.get()
+            if exported is STREAM_END:
+                break
+
+            project_key, epic_json = exported
+            if project_key not in writers:
+                writers[project_key] = JsonArrayWriter(os.path.join(
+                    root, "{}_estimates.json".format(project_key)))
+            writers[project_key].append(epic_json)
+    except Exception as e:
+        export_errors.append(e)
+        return
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    print("Finished writing to file.")
+
+
+def put_export(exported_queue, exporter, export_errors, exported):
+    """
+        Puts onto the queue of the export stage, raising the error of the stage rather than waiting on a queue nobody
+        reads once it stopped.
+        exported_queue - bounded queue of the export stage.
+        exporter - the thread running the export stage.
+        export_errors - list receiving the error the export stage stopped on.
+        exported - the item to put.
+    """
+    while True:
+        if len(export_errors) > 0:
+            raise export_errors[0]
+        try:
+            exported_queue.put(exported, timeout=STREAM_PUT_TIMEOUT)
+            return
+        except queue.Full:
+            if not exporter.is_alive():
+                raise export_errors[0] if len(export_errors) > 0 else RuntimeError(
+                    "The export stage stopped.")
+
+
+def stream_epics(jira, epics, project_configs, export_estimates_path=None, queue_size=STREAM_QUEUE_SIZE, update_ticket_estimates_flag=False,
+                 force_toplevel_recalculate=False, import_project_configs=False, import_project_configs_path=None, on_epic=None, raw_issues=False):
+    """
+        Rolls up the epics as a pipeline of fetch -> estimate extraction and aggregation -> export, connected by bounded
+        queues. Every epic is written out as soon as its roll-up is complete and is not kept afterwards, so memory is
+        bounded by the queue sizes rather than by the number of epics. Returns the number of epics rolled up.
+        jira - the jira connection.
+        epics - the list of epic keys to calculate the rollup for.
+        project_configs - dictionary of jira project configurations; missing projects are generated and added to it.
+        export_estimates_path - fully qualified path to folder in which to write to; nothing is exported when None.
+        queue_size - the number of epics each stage may run ahead of the next one.
+        update_ticket_estimates_flag - whether estimates should be written back to jira.
+        force_toplevel_recalculate - whether story level estimates should be recalculated from subtasks.
+        import_project_configs - whether project configurations should be loaded from file.
+        import_project_configs_path - fully qualified path of the folder containing the project configurations.
+        on_epic - optional callback receiving every completed Epic before it is written back or exported, e.g. to
+        materialize it.
+        raw_issues - whether child issues should be searched as raw JSON rather than built into jira resources.
+    """
+    fetched_queue = queue.Queue(maxsize=queue_size)
+    exported_queue = queue.Queue(maxsize=queue_size)
+    export_errors = []
+
+    # The streamed issues are fetched without memoization, which would otherwise keep every epic of the run.
+    if isinstance(jira, jiraClient.CachingJira):
+        jira = jira.jira
+
+    # Daemon threads, so that a failing stage does not leave the process waiting on a full queue.
+    fetcher = threading.Thread(target=fetch_stage, args=(
+        jira, epics, project_configs, fetched_queue, import_project_configs, import_project_configs_path, raw_issues), daemon=True)
+    fetcher.start()
+    exporter = None
+    if export_estimates_path is not None:
+        exporter = threading.Thread(target=export_stage, args=(
+            export_estimates_path, exported_queue, export_errors), daemon=True)
+        exporter.start()
+
+    epic_count = 0
+    try:
+        while True:
+            fetched = fetched_queue.get()
+            if fetched is STREAM_END:
+                break
+
+            issue, epic_issues = fetched
+            epic_container = Epic(issue, [], 0.0, 0.0, 0.0, 0.0)
+            try:
+                epic_container.add_issues(
+                    jira, project_configs, update_ticket_estimates_flag, force_toplevel_recalculate, epic_issues)
+            except Exception as e:
+                # A partial roll-up is not passed on as if it were complete.
+                print("Issue extracting child objects of {}.".format(issue.key))
+                print(e)
+                continue
+
+            if on_epic is not None:
+                on_epic(epic_container)
+
+            if update_ticket_estimates_flag:
+                update_ticket_estimates([epic_container], project_configs)
+
+            if exporter is not None:
+                print("Processing to JSON structure of {}".format(
+                    epic_container.epic.key))
+                put_export(exported_queue, exporter, export_errors,
+                           (epic_container.epic.fields.project.key, epic_container.dict()))
+            epic_count += 1
+    finally:
+        if exporter is not None and exporter.is_alive():
+            put_export(exported_queue, exporter, export_errors, STREAM_END)
+            exporter.join()
+
+    if len(export_errors) > 0:
+        raise export_errors[0]
+    return epic_count
+
+def stream_rollup(jira, args, epics, project_configs):
+    """
+        Runs the epic roll-up command as a stream; the issue store and snapshot are fed one epic at a time.
+        jira - the jira connection.
+        args - the parsed arguments of the command.
+        epics - the list of epic keys to calculate the rollup for.
+        project_configs - dictionary of jira project configurations.
+    """
+    store = issueStore.IssueStore(
+        args.issue_store_path) if args.issue_store_path is not None else None
+    snapshot_values = {}
+    columnar_export = columnarExport.ColumnarExport(
+        args.columnar_export_path, args.columnar_format) if args.columnar_export_path is not None else None
+
+    def on_epic(epic_container):
+        if store is not None:
+            store.add_epics([epic_container], project_configs,
+                            args.force_toplevel_recalculate, args.update_ticket_estimates)
+            store.apply_epic_rollups([epic_container])
+        if columnar_export is not None:
+            columnar_export.add_epics([epic_container])
+        if args.snapshot_path is not None:
+            snapshot_values.update(
+                rollupSnapshots.snapshot_values(epics_container=[epic_container]))
+
+    try:
+        epic_count = stream_epics(jira, epics, project_configs, args.export_estimates_path if args.export_estimates else None,
+                                  args.stream_queue_size, args.update_ticket_estimates, args.force_toplevel_recalculate,
+                                  args.import_project_configs, args.import_project_configs_path, on_epic, args.raw_issues)
+    finally:
+        if store is not None:
+            store.close()
+        if columnar_export is not None:
+            columnar_export.close()
+    print("Streamed {} epics.".format(epic_count))
+
+    if args.export_project_configs:
+        export_project_configs_json(
+            args.export_project_config_path, project_configs)
+
+    if args.snapshot_path is not None:
+        rollupSnapshots.SnapshotStore(args.snapshot_path).append(
+            snapshot_values, args.snapshot_label)
+
+
+### Main ###
+
+def execute(args_list, jira=None):
+    args = parse_args(args_list)
+    print("Running JIRA Tabulations for Epics")
+    # Roll-ups driven by another command share its connection (and request memo).
+    owns_client = jira is None
+    if owns_client:
+        jira = jiraClient.connect(args.user, args.api_token, args.server)
+    epics = args.epics.split(",")
+
+    project_configs = {}
+    if args.stream:
+        stream_rollup(jira, args, epics, project_configs)
+        if owns_client:
+            jira.print_cache_report()
+        # Streamed epics are not kept once written out.
+        return []
+
+    epics_container = rollup_epics(
+        jira, epics, project_configs, args.update_ticket_estimates, args.force_toplevel_recalculate, args.import_project_configs, args.import_project_configs_path, args.raw_issues)
+
+    if args.issue_store_path is not None:
+        # The totals written back and exported are the SQL aggregates of the store.
+        store = issueStore.IssueStore(args.issue_store_path)
+        store.add_epics(epics_container, project_configs,
+                        args.force_toplevel_recalculate, args.update_ticket_estimates)
+        store.apply_epic_rollups(epics_container)
+        store.close()
 
     if args.update_ticket_estimates:
         update_ticket_estimates(epics_container, project_configs)
@@ -399,4 +898,17 @@ def execute(args_list):
         export_project_configs_json(
             args.export_project_config_path, project_configs)
 
+    if args.snapshot_path is not None:
+        rollupSnapshots.record_snapshot(
+            args.snapshot_path, args.snapshot_label, epics_container=epics_container)
+
+    if args.columnar_export_path is not None:
+        columnar_export = columnarExport.ColumnarExport(
+            args.columnar_export_path, args.columnar_format)
+        columnar_export.add_epics(epics_container)
+        columnar_export.close()
+
+    if owns_client:
+        jira.print_cache_report()
+
     return epics_container
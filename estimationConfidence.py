@@ -0,0 +1,34 @@
+### Methods ###
+
+def estimation_confidence(incomplete_estimated_count, incomplete_unestimated_count, remaining_time, story_point_weight, story_point_weight_ceiling):
+    """
+        Calculates the estimation confidence of a roll-up from its summed counts.
+        incomplete_estimated_count - number of incomplete issues with an estimate.
+        incomplete_unestimated_count - number of incomplete issues without an estimate.
+        remaining_time - the summed estimate of the incomplete issues.
+        story_point_weight - Weighted value to be used in calculating the confidence interval.
+        story_point_weight_ceiling - The max value to use for weighted story point calculations.
+    """
+    confidence = 0 if incomplete_estimated_count == 0 and incomplete_unestimated_count == 0 else (
+        incomplete_estimated_count / (incomplete_estimated_count + incomplete_unestimated_count))
+    confidence = confidence * 100
+
+    story_point_average = 0 if incomplete_estimated_count == 0 else remaining_time / \
+        incomplete_estimated_count
+
+    if confidence != 0:
+        # weight in the distribution of story points
+        # if the average story points per ticket is <=story_point_weight (default 5)
+        # retain our weighting; if not, reduce confidence rating
+        # by at most story_point_weight_ceiling (default 80%)
+        if story_point_average < story_point_weight:
+            story_point_average = story_point_weight
+        elif story_point_average > story_point_weight_ceiling:
+            story_point_average = story_point_weight_ceiling
+
+        confidence *= (story_point_weight / story_point_average)
+
+    if confidence > 95:
+        confidence = 95
+
+    return round(confidence, 2)
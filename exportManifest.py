@@ -0,0 +1,343 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import codecs
+import datetime
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+### Constants ###
+
+MANIFEST_NAME = ".export_manifest.json"
+
+# Manifests opened by the run, keyed by export folder.
+manifests = {}
+manifests_lock = threading.Lock()
+
+# Processes encoding json exports; the number of cpus when None. Exports of a single file are encoded in-process.
+EXPORT_WORKERS = None
+# Workers are started from a clean server process rather than forked from the threads of the run.
+EXPORT_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+export_pool = None
+export_pool_lock = threading.Lock()
+
+
+### Data Structures ###
+
+class ExportManifest:
+    """
+        Content hashes of the files exported to a folder. A file is only rewritten when its content hash changed, so
+        unchanged exports keep their modification time; the manifest records which files the last run changed.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self.files = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as read_file:
+                self.files = json.loads(read_file.read()).get('files', {})
+        self.changed = []
+        self.unchanged = []
+        self.removed = []
+
+    def is_current(self, file_name, digest):
+        """
+            Whether the file on disk already has the given content hash. Files exported before the manifest existed are
+            hashed once.
+            file_name - name of the file in the export folder.
+            digest - the sha256 hex digest of the new content.
+        """
+        out_file_path = os.path.join(self.root, file_name)
+        if not os.path.exists(out_file_path):
+            return False
+        if file_name not in self.files:
+            with open(out_file_path, 'rb') as read_file:
+                self.files[file_name] = hashlib.sha256(
+                    read_file.read()).hexdigest()
+        return self.files[file_name] == digest
+
+    def write(self, file_name, content):
+        """
+            Writes the content to a file of the export folder unless it is already current. Returns whether it changed.
+            file_name - name of the file in the export folder.
+            content - the text to export.
+        """
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        out_file_path = os.path.join(self.root, file_name)
+
+        with self.lock:
+            if self.is_current(file_name, digest):
+                self.unchanged.append(file_name)
+                return False
+
+            temp_path = out_file_path + ".tmp"
+            with open(temp_path, 'wb') as output_file:
+                output_file.write(data)
+            os.replace(temp_path, out_file_path)
+            return self.record(file_name, digest)
+
+    def replace(self, file_name, temp_path, digest):
+        """
+            Moves a file written (and hashed) incrementally into place unless the exported file is already current.
+            Returns whether it changed.
+            file_name - name of the file in the export folder.
+            temp_path - fully qualified path of the written file.
+            digest - the sha256 hex digest of its content.
+        """
+        with self.lock:
+            if self.is_current(file_name, digest):
+                os.remove(temp_path)
+                self.unchanged.append(file_name)
+                return False
+
+            os.replace(temp_path, os.path.join(self.root, file_name))
+            return self.record(file_name, digest)
+
+    def record(self, file_name, digest):
+        self.files[file_name] = digest
+        self.changed.append(file_name)
+        self.save()
+        return True
+
+    def remove_stale(self):
+        """
+            Deletes the exported files of the folder which were not written since the manifest was opened.
+        """
+        if not os.path.exists(self.root):
+            return
+        with self.lock:
+            written = set(self.changed + self.unchanged)
+            for file_name in [file_name for file_name in self.files if file_name not in written]:
+                out_file_path = os.path.join(self.root, file_name)
+                if os.path.exists(out_file_path):
+                    os.remove(out_file_path)
+                del self.files[file_name]
+                self.removed.append(file_name)
+            self.save()
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as output_file:
+            output_file.writelines(json.dumps(self.dict(), indent=4, separators=(",", ": ")))
+        os.replace(temp_path, self.path)
+
+    def dict(self):
+        return {'updated': datetime.datetime.now().isoformat(), 'files': self.files, 'changed': self.changed, 'removed': self.removed}
+
+
+class HashingWriter:
+    """
+        Text file writer that hashes what it writes into a temporary file, then hands the file to the manifest of its
+        folder on close, so that streamed exports are only replaced when their content changed.
+        path - fully qualified path of the export file.
+        newline - newline translation of the file, as for open; csv writers need '' to keep their line terminators.
+    """
+
+    def __init__(self, path, newline=None):
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.output_file = open(self.temp_path, "w", newline=newline)
+        self.hash = hashlib.sha256()
+
+    def write(self, text):
+        self.hash.update(text.encode("utf-8"))
+        self.output_file.write(text)
+
+    def close(self):
+        self.output_file.close()
+        return open_manifest(os.path.dirname(self.path)).replace(os.path.basename(self.path), self.temp_path, self.hash.hexdigest())
+
+
+### Methods ###
+
+def open_manifest(root):
+    """
+        Gets the manifest of an export folder, shared by every export of the run into that folder.
+        root - fully qualified path of the export folder.
+    """
+    root = os.path.abspath(root)
+    with manifests_lock:
+        if root not in manifests:
+            manifests[root] = ExportManifest(root)
+        return manifests[root]
+
+
+def write_export(out_file_path, content):
+    """
+        Writes an export file only if its content changed. Returns whether it changed.
+        out_file_path - fully qualified path of the export file.
+        content - the text to export.
+    """
+    return open_manifest(os.path.dirname(out_file_path)).write(os.path.basename(out_file_path), content)
+
+
+def json_escape_errors(error):
+    """
+        Codec error handler escaping non-ascii characters as json does, using surrogate pairs beyond the BMP.
+    """
+    escaped = []
+    for char in error.object[error.start:error.end]:
+        code = ord(char)
+        if code > 0xFFFF:
+            code -= 0x10000
+            escaped.append("\\u{:04x}\\u{:04x}".format(
+                0xD800 | (code >> 10), 0xDC00 | (code & 0x3FF)))
+        else:
+            escaped.append("\\u{:04x}".format(code))
+    return "".join(escaped), error.end
+
+
+codecs.register_error("json_escape", json_escape_errors)
+
+
+def encode_json(payload):
+    """
+        Encodes a payload in the format of every export: json.dumps with an indent of 4. orjson is used when it is
+        installed; its output is re-indented and ascii escaped to match, and payloads holding floats orjson writes
+        differently are encoded with json instead.
+        payload - the json serializable payload.
+    """
+    if orjson is not None and not has_reformatted_float(payload):
+        try:
+            encoded = orjson.dumps(
+                payload, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # e.g. float subclasses, which json encodes and orjson does not.
+            encoded = None
+        if encoded is not None:
+            # Tabs are always escaped inside json strings, so they can stand in for each indent level.
+            encoded = encoded.replace(b"\n  ", b"\n\t")
+            while b"\t  " in encoded:
+                encoded = encoded.replace(b"\t  ", b"\t\t")
+            content = encoded.replace(b"\t", b"    ").decode("utf-8")
+            if not content.isascii():
+                content = content.encode(
+                    "ascii", "json_escape").decode("ascii")
+            # DEL is ascii, but json escapes it along with the control characters.
+            if "\x7f" in content:
+                content = content.replace("\x7f", "\\u007f")
+            return content
+    return json.dumps(payload, indent=4, separators=(",", ": "))
+
+
+def has_reformatted_float(payload):
+    """
+        Whether a payload holds a float, as a value or a key, which orjson writes differently from json: NaN and
+        infinities, which orjson writes as null, and floats below 1e-4 or from 1e16, which json writes in exponent
+        notation (1e-05, 1e+16) and orjson does not (0.00001, 1e16).
+        payload - the json serializable payload.
+    """
+    pending = [payload]
+    while len(pending) > 0:
+        value = pending.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value) or (value != 0 and not 1e-4 <= abs(value) < 1e16):
+                return True
+        elif isinstance(value, dict):
+            pending.extend(value.keys())
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            pending.extend(value)
+    return False
+
+
+def write_json(out_file_path, payload):
+    """
+        Exports a payload as json, in the format of every other export, only if its content changed.
+        out_file_path - fully qualified path of the export file.
+        payload - the json serializable payload.
+    """
+    return write_export(out_file_path, encode_json(payload))
+
+
+def get_export_pool():
+    """
+        Gets the process pool encoding exports, started on first use and shared by every export of the run. Returns
+        None when a single worker is configured.
+    """
+    global export_pool
+    workers = EXPORT_WORKERS or os.cpu_count() or 1
+    if workers <= 1:
+        return None
+    with export_pool_lock:
+        if export_pool is None:
+            export_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context(EXPORT_START_METHOD))
+        return export_pool
+
+
+def shutdown_export_pool():
+    """
+        Stops the export worker processes, if they were started. A later export starts them again.
+    """
+    global export_pool
+    with export_pool_lock:
+        pool = export_pool
+        export_pool = None
+    if pool is not None:
+        pool.shutdown()
+
+
+def write_json_files(json_files):
+    """
+        Exports several payloads as json, encoding them concurrently across the export worker processes. Files are
+        written (when their content changed) in the order given. Returns the paths which changed.
+        json_files - list of (out_file_path, payload) tuples; each payload is built once by the caller.
+    """
+    global export_pool
+    contents = None
+    pool = get_export_pool() if len(json_files) > 1 else None
+    if pool is not None:
+        try:
+            contents = list(pool.map(
+                encode_json, [payload for out_file_path, payload in json_files]))
+        except (BrokenProcessPool, OSError) as e:
+            print("Unable to encode exports in parallel; encoding them serially.")
+            print(e)
+            with export_pool_lock:
+                export_pool = None
+    if contents is None:
+        contents = [encode_json(payload)
+                    for out_file_path, payload in json_files]
+
+    changed = []
+    for (out_file_path, payload), content in zip(json_files, contents):
+        print("Writing file {}".format(out_file_path))
+        if write_export(out_file_path, content):
+            changed.append(out_file_path)
+    return changed
+
+
+def remove_stale(root):
+    """
+        Deletes the files of an export folder which the run did not export again.
+        root - fully qualified path of the export folder.
+    """
+    open_manifest(root).remove_stale()
+
+
+def print_export_report():
+    """
+        Prints which exported files changed, per export folder.
+    """
+    with manifests_lock:
+        export_manifests = list(manifests.values())
+    for manifest in export_manifests:
+        print("Export {}: {} changed, {} unchanged, {} removed.".format(
+            manifest.root, len(manifest.changed), len(manifest.unchanged), len(manifest.removed)))
+        for file_name in manifest.changed:
+            print("    changed: {}".format(file_name))
+        for file_name in manifest.removed:
+            print("    removed: {}".format(file_name))
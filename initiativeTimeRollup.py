@@ -1,26 +1,42 @@
 import argparse
+import columnarExport
+import exportManifest
 import epicTimeRollup
+import estimationConfidence
+import issueStore
+import rollupSnapshots
+import deliveryForecast
 from dataclasses import dataclass, asdict
 import os
 import sys
 import datetime
 import math
 import calendar
-import shutil
 import json
+import numpy
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from jira import JIRA
+import jiraClient
+import jiraFields
 from subprocess import Popen
 
 
 ### Constants ###
 
-INITIAL_TIME_KEY = "customfield_11609"
+INITIAL_TIME_KEY = jiraFields.INITIAL_TIME_KEY
 REMAINING_TIME_KEY = "customfield_11639"
 CONFIDENCE_INTERVAL_KEY = "customfield_11641"
 INCOMPLETE_ISSUE_COUNT_KEY = "customfield_11642"
-START_DATE_KEY = "customfield_11600"
+START_DATE_KEY = jiraFields.START_DATE_KEY
+
+# FRONT-15 is the ops epic. Done initiatives are filtered by the search itself.
+AUTO_INITIATIVES_QUERY = "project=FRONT and type=Epic and id!=Front-15 and status!=Done ORDER BY key ASC"
+SEARCH_PAGE_SIZE = 100
+
+# Fields needed of an initiative: its linked epics, schedule and initial estimate.
+INITIATIVE_FIELDS = jiraFields.fields_param(jiraFields.BASE_FIELDS, [
+                                            "issuelinks", START_DATE_KEY, "duedate", INITIAL_TIME_KEY])
 
 
 ### Data Structures ###
@@ -62,6 +78,24 @@ class MonthWorkload:
         return {'summed_time_summary': summed_time_summary, 'remaining_time_summary': remaining_time_summary, 'summed_time': summed_time_json, 'remaining_time': remaining_time_json, 'epics': epics_json}
 
 
+@dataclass
+class EpicSchedule:
+    initiative: object
+    epic: object
+    start_date: datetime.datetime
+    end_date: datetime.datetime
+    remaining_start_date: datetime.datetime
+    month_allocations: []
+
+
+@dataclass
+class MonthAllocation:
+    month_distribution_key: str
+    month: int
+    summed_fraction: float
+    remaining_fraction: float
+
+
 @dataclass
 class Initiative:
     initiative: JIRA.issue
@@ -89,34 +123,30 @@ class Initiative:
             self.incomplete_estimated_count += epic.incomplete_estimated_count
             self.incomplete_unestimated_count += epic.incomplete_unestimated_count
 
-        self.estimation_confidence = 0 if self.incomplete_estimated_count == 0 and self.incomplete_unestimated_count == 0 else (
-            self.incomplete_estimated_count / (self.incomplete_estimated_count + self.incomplete_unestimated_count))
-        self.estimation_confidence = self.estimation_confidence * 100
+        self.calculate_estimation_confidence()
 
-        story_point_average = 0 if self.incomplete_estimated_count == 0 else self.remaining_time / \
-            self.incomplete_estimated_count
-
-        if self.estimation_confidence != 0:
-            # weight in the distribution of story points
-            # if the average story points per ticket is <=story_point_weight (default 5)
-            # retain our weighting; if not, reduce confidence rating
-            # by at most story_point_weight_ceiling (default 80%)
-            if story_point_average < self.story_point_weight:
-                story_point_average = self.story_point_weight
-            elif story_point_average > self.story_point_weight_ceiling:
-                story_point_average = self.story_point_weight_ceiling
-
-            self.estimation_confidence *= (self.story_point_weight /
-                                           story_point_average)
+    def apply_contribution(self, contribution, sign):
+        """
+            Adds (sign 1) or subtracts (sign -1) the contribution of a single issue of one of the epics, without
+            walking the other epics.
+        """
+        summed_time, remaining_time, incomplete_estimated_count, incomplete_unestimated_count = contribution
+        self.summed_time += sign * summed_time
+        self.remaining_time += sign * remaining_time
+        self.incomplete_estimated_count += sign * incomplete_estimated_count
+        self.incomplete_unestimated_count += sign * incomplete_unestimated_count
 
-        if self.estimation_confidence > 95:
-            self.estimation_confidence = 95
+        self.calculate_estimation_confidence()
 
-        self.estimation_confidence = round(self.estimation_confidence, 2)
+    def calculate_estimation_confidence(self):
+        """
+            Used to recalculate the estimation confidence from the summed counts.
+        """
+        self.estimation_confidence = estimationConfidence.estimation_confidence(self.incomplete_estimated_count, self.incomplete_unestimated_count,
+                                                                                self.remaining_time, self.story_point_weight, self.story_point_weight_ceiling)
 
     def dict(self):
-        self.calculate_estimate_counts()
-
+        # The aggregates are kept up to date by calculate_estimate_counts and apply_contribution.
         epic_json = []
         for epic in self.epics:
             epic_json.append(epic.dict())
@@ -168,6 +198,128 @@ def get_current_month_end_date(current_date, end_bound_date):
         return datetime.datetime(current_date.year, current_date.month, calendar.monthrange(current_date.year, current_date.month)[1])
 
 
+def calculate_epic_schedule(initiative, epic, today):
+    """
+        Works out the start and end date of an epic and how its time is spread over the months between them. Returns
+        None when the epic cannot be scheduled.
+        initiative - the initiative the epic belongs to.
+        epic - the epic to schedule.
+        today - the date from which time is considered remaining.
+    """
+    initiative_start_date_object = None
+    start_date_object = None
+    end_date_object = None
+
+    # Confirm we have an initiative start date; if we don't have that all bets are off anyways
+    # check start date of epic; if we don't have that, we yield to the start date of the initiative
+    # if we do have it, we still need to sanity check that the epic doesn't start before the initiatve; if so assume the start date is the
+    # initiative.
+    # If we don't have that, we set the start date to the same month as the end_date
+    if getattr(initiative.initiative.fields, START_DATE_KEY) is None:
+        return None
+    else:
+        initiative_start_date_object = datetime.datetime.strptime(
+            getattr(initiative.initiative.fields, START_DATE_KEY), "%Y-%m-%d")
+
+    if getattr(epic.epic.fields, START_DATE_KEY) is not None:
+        start_date_object = datetime.datetime.strptime(
+            getattr(epic.epic.fields, START_DATE_KEY), "%Y-%m-%d")
+        if start_date_object < initiative_start_date_object:
+            start_date_object = initiative_start_date_object
+
+    if epic.epic.fields.duedate is not None:
+        end_date_object = datetime.datetime.strptime(
+            epic.epic.fields.duedate, "%Y-%m-%d")
+    elif initiative.initiative.fields.duedate is not None:
+        end_date_object = datetime.datetime.strptime(
+            initiative.initiative.fields.duedate, "%Y-%m-%d")
+    else:
+        return None
+    # TODO - but... whyyyyyyyy ;-;
+    if getattr(epic.epic.fields, START_DATE_KEY) is None:
+        start_date_object = datetime.datetime(
+            end_date_object.year, end_date_object.month, end_date_object.day)
+
+    total_delta_days = (
+        end_date_object - start_date_object).days + 1
+
+    summed_calc_total_delta_days = (end_date_object - today).days + 1 if start_date_object < today and today < end_date_object else total_delta_days
+    delta_months = diff_month(end_date_object, start_date_object)+1
+
+    itr_date = start_date_object
+    month_allocations = []
+
+    for i in range(delta_months):
+        end_date = get_current_month_end_date(
+            itr_date, end_date_object)
+        micro_delta_days = (end_date - itr_date).days + 1
+        month_distribution_key = str(
+            itr_date.year)+"-"+str(itr_date.month)
+        summed_fraction = micro_delta_days / total_delta_days
+
+        # remaining time is only pertinent for the section of time after today()
+        if (itr_date < today):
+            # adjust for the case where we are currently calculating this month, wherein we want to provide some partial
+            # counting; if end_date < today, we are over and all work must be done.
+            if (itr_date.month == today.month) and (itr_date.year == today.year):
+                micro_delta_days = (
+                    end_date - today).days + 1 if (end_date_object - today).days > 0 else summed_calc_total_delta_days
+            else:
+                micro_delta_days = 0
+                # if this is the last loop, and the nested epic is over, we need to just frontload the entire remaining work into next month
+
+        month_allocations.append(MonthAllocation(month_distribution_key, itr_date.month,
+                                                 summed_fraction, micro_delta_days / summed_calc_total_delta_days))
+        itr_date = get_next_month_start_date(itr_date, 1)
+
+    remaining_start_date = start_date_object if start_date_object > today else today
+    return EpicSchedule(initiative, epic, start_date_object, end_date_object, remaining_start_date, month_allocations)
+
+
+def calculate_epic_schedules(initiatives_container, today):
+    """
+        Schedules every epic of the given initiatives. Returns the list of EpicSchedule objects and the list of epics which
+        could not be scheduled.
+        initiatives_container - the list of initiative DataObjects.
+        today - the date from which time is considered remaining.
+    """
+    epic_schedules = []
+    skipped_epics = []
+    for initiative in initiatives_container:
+        for epic in initiative.epics:
+            epic_schedule = calculate_epic_schedule(initiative, epic, today)
+            if epic_schedule is None:
+                skipped_epics.append(epic)
+            else:
+                epic_schedules.append(epic_schedule)
+    return epic_schedules, skipped_epics
+
+
+def calculate_capacity_calendar(epic_schedules):
+    """
+        Spreads the time of every scheduled epic linearly over its months.
+        epic_schedules - the list of EpicSchedule objects.
+    """
+    month_distributions = {}
+    for epic_schedule in epic_schedules:
+        initiative = epic_schedule.initiative
+        epic = epic_schedule.epic
+        for month_allocation in epic_schedule.month_allocations:
+            month_distribution_key = month_allocation.month_distribution_key
+            if month_distribution_key not in month_distributions:
+                month_distributions[month_distribution_key] = MonthWorkload(
+                    month_allocation.month, [], [], [])
+            month_distributions[month_distribution_key].epics.append(
+                epic)
+
+            month_distributions[month_distribution_key].summed_time.append(EpicIntervalCommitment(initiative.initiative.fields.summary, epic.epic.fields.summary, round(float(
+                epic.summed_time * month_allocation.summed_fraction), 2)))
+
+            month_distributions[month_distribution_key].remaining_time.append(EpicIntervalCommitment(initiative.initiative.fields.summary, epic.epic.fields.summary, round(float(
+                epic.remaining_time * month_allocation.remaining_fraction), 2)))
+    return month_distributions
+
+
 def export_capacity_calendar(root, month_distributions):
     """
         Used to generate a capacity calendar.
@@ -181,10 +333,77 @@ def export_capacity_calendar(root, month_distributions):
     out_file_path = os.path.join(
         root, "Calendar_estimates.json")
 
-    with open(out_file_path, "w") as output_file:
-        print("Writing file {}".format(out_file_path))
-        output_file.writelines(json.dumps(
-            months_json, indent=4, separators=(",", ": ")))
+    print("Writing file {}".format(out_file_path))
+    exportManifest.write_json(out_file_path, months_json)
+
+    print("Finished writing to file.")
+
+
+def calculate_estimation_confidences(incomplete_estimated_counts, incomplete_unestimated_counts, remaining_times, story_point_weights, story_point_weight_ceilings):
+    """
+        Vectorized form of Initiative.calculate_estimation_confidence; all arguments are broadcast against each other, so
+        a column of initiative counts and a row of weights/ceilings yields the confidence of every initiative for every pair.
+        incomplete_estimated_counts - array of incomplete estimated issue counts.
+        incomplete_unestimated_counts - array of incomplete unestimated issue counts.
+        remaining_times - array of remaining times.
+        story_point_weights - array of weighted values used in calculating the confidence interval.
+        story_point_weight_ceilings - array of max values used for weighted story point calculations.
+    """
+    estimated = numpy.asarray(incomplete_estimated_counts, dtype=float)
+    unestimated = numpy.asarray(incomplete_unestimated_counts, dtype=float)
+    remaining = numpy.asarray(remaining_times, dtype=float)
+    weights = numpy.asarray(story_point_weights, dtype=float)
+    ceilings = numpy.asarray(story_point_weight_ceilings, dtype=float)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        confidence = numpy.where(estimated + unestimated == 0, 0.0,
+                                 estimated / (estimated + unestimated)) * 100
+        story_point_average = numpy.where(
+            estimated == 0, 0.0, remaining / estimated)
+
+        story_point_average = numpy.where(story_point_average < weights, weights, numpy.where(
+            story_point_average > ceilings, ceilings, story_point_average))
+        confidence = numpy.where(
+            confidence != 0, confidence * (weights / story_point_average), confidence)
+
+    return numpy.round(numpy.minimum(confidence, 95), 2)
+
+
+def sweep_estimation_confidence(initiatives_container, story_point_weights, story_point_weight_ceilings):
+    """
+        Evaluates the estimation confidence of every initiative for every weight/ceiling pair in a single vectorized pass,
+        without refetching anything. Returns the comparison table as a list of rows.
+        initiatives_container - the list of initiative DataObjects.
+        story_point_weights - list of weighted values to evaluate.
+        story_point_weight_ceilings - list of ceilings to evaluate.
+    """
+    grid = [(weight, ceiling)
+            for weight in story_point_weights for ceiling in story_point_weight_ceilings]
+    confidences = calculate_estimation_confidences(
+        [[initiative.incomplete_estimated_count] for initiative in initiatives_container],
+        [[initiative.incomplete_unestimated_count]
+            for initiative in initiatives_container],
+        [[initiative.remaining_time] for initiative in initiatives_container],
+        [[weight for weight, ceiling in grid]],
+        [[ceiling for weight, ceiling in grid]])
+
+    sweep_rows = []
+    for row, initiative in enumerate(initiatives_container):
+        sweep_rows.append({'key': initiative.initiative.key, 'summary': initiative.initiative.fields.summary, 'confidence': [
+            {'story_point_weight': weight, 'story_point_weight_ceiling': ceiling, 'estimation_confidence': float(confidences[row][column])} for column, (weight, ceiling) in enumerate(grid)]})
+    return sweep_rows
+
+
+def export_confidence_sweep(root, sweep_rows):
+    """
+        Exports the confidence sweep comparison table to json.
+        root - the root folder in which to place the output file.
+        sweep_rows - the rows returned by sweep_estimation_confidence.
+    """
+    out_file_path = os.path.join(root, "Confidence_sweep.json")
+
+    print("Writing file {}".format(out_file_path))
+    exportManifest.write_json(out_file_path, sweep_rows)
 
     print("Finished writing to file.")
 
@@ -207,14 +426,8 @@ def export_initiatives_json(root, initiatives_container):
         initaitives_json[initiative_container.initiative.fields.project.key].append(
             initiative_container.dict())
 
-    for project_key in initaitives_json:
-        out_file_path = os.path.join(
-            root, "{}_estimates.json".format(project_key))
-
-        with open(out_file_path, "w") as output_file:
-            print("Writing file {}".format(out_file_path))
-            output_file.writelines(json.dumps(
-                initaitives_json[project_key], indent=4, separators=(",", ": ")))
+    exportManifest.write_json_files([(os.path.join(root, "{}_estimates.json".format(
+        project_key)), initaitives_json[project_key]) for project_key in initaitives_json])
 
     print("Finished writing to file.")
 
@@ -226,6 +439,7 @@ def parse_args(args_list):
     parser = argparse.ArgumentParser()
     parser.add_argument("--user", required=True)
     parser.add_argument("--api_token", required=True)
+    parser.add_argument("--server", default=jiraClient.DEFAULT_SERVER)
     parser.add_argument("--auto_initiatives", action='store_true')
     parser.add_argument("--initiatives")
     parser.add_argument("--update_ticket_estimates", action='store_true')
@@ -236,12 +450,30 @@ def parse_args(args_list):
     parser.add_argument("--export_project_config_path")
     parser.add_argument("--import_project_configs", action='store_true')
     parser.add_argument("--import_project_configs_path")
-    parser.add_argument("--story_point_weight", default=5)
-    parser.add_argument("--story_point_weight_ceiling", default=25)
+    parser.add_argument("--story_point_weight", type=float, default=5)
+    parser.add_argument("--story_point_weight_ceiling",
+                        type=float, default=25)
+    parser.add_argument("--sweep_story_point_weights",
+                        help="Comma separated list of story point weights to evaluate the confidence for.")
+    parser.add_argument("--sweep_story_point_weight_ceilings",
+                        help="Comma separated list of story point weight ceilings to evaluate the confidence for.")
     parser.add_argument("--update_sheets", action='store_true')
     parser.add_argument("--sheets_service_auth_file")
     parser.add_argument("--update_initiative_estimates", action='store_true')
     parser.add_argument("--create_calendar_schedule", action='store_true')
+    parser.add_argument("--forecast_delivery", action='store_true')
+    parser.add_argument("--forecast_scenarios", type=int, default=10000)
+    parser.add_argument("--forecast_percentiles", default="50,85")
+    parser.add_argument("--forecast_seed", type=int)
+    parser.add_argument("--issue_store_path")
+    parser.add_argument("--snapshot_path")
+    parser.add_argument("--snapshot_label")
+    parser.add_argument("--raw_issues", action='store_true',
+                        help="Search child issues as raw JSON instead of building jira issue objects.")
+    parser.add_argument("--columnar_export_path",
+                        help="Folder in which to write flat issue and roll-up tables.")
+    parser.add_argument("--columnar_format", choices=columnarExport.COLUMNAR_FORMATS,
+                        default=columnarExport.PARQUET_FORMAT)
 
     args = parser.parse_args(args=args_list)
 
@@ -254,6 +486,12 @@ def parse_args(args_list):
     else:
         args.initiatives = None
 
+    if args.forecast_delivery == True:
+        if args.export_estimates_path is None:
+            argparse.ArgumentError(
+                "User provided --forecast_delivery option but did not provide --export_estimates_path")
+            sys.exit(-4)
+
     if args.update_sheets == True:
         if args.sheets_service_auth_file is None:
             argparse.ArgumentError(
@@ -275,23 +513,32 @@ def create_epic_rollup_args(source_args, initiative, epics):
 
     if "--initiatives" in epic_rollup_args:
         idx = epic_rollup_args.index('--initiatives')
+        del epic_rollup_args[idx]
+        del epic_rollup_args[idx]
     elif "--auto_initiatives" in epic_rollup_args:
+        # --auto_initiatives is a flag; it has no value to remove.
         idx = epic_rollup_args.index('--auto_initiatives')
+        del epic_rollup_args[idx]
 
     if(idx > -1):
-        del epic_rollup_args[idx]
-        del epic_rollup_args[idx]
         epic_rollup_args.append('--epics')
         epic_rollup_args.append(','.join(epics))
 
+    # Snapshots and columnar tables are written once for the whole initiative roll-up, not per initiative.
+    for run_arg in ["--snapshot_path", "--snapshot_label", "--columnar_export_path", "--columnar_format"]:
+        if run_arg in epic_rollup_args:
+            idx = epic_rollup_args.index(run_arg)
+            del epic_rollup_args[idx]
+            del epic_rollup_args[idx]
+
     idx = epic_rollup_args.index("--export_estimates_path")
 
     if idx > -1:
         idx = idx+1
         epic_rollup_args[idx] = os.path.join(epic_rollup_args[idx], initiative)
-        if os.path.exists(epic_rollup_args[idx]):
-            shutil.rmtree(epic_rollup_args[idx])
-        os.mkdir(epic_rollup_args[idx])
+        # The folder is kept between runs; files of projects the initiative no longer has are removed after the roll-up.
+        if not os.path.exists(epic_rollup_args[idx]):
+            os.mkdir(epic_rollup_args[idx])
 
     return epic_rollup_args
 
@@ -306,19 +553,21 @@ def calculate_initial_estimation(initiative_issue, initial_time_key, story_point
         story_point_weight_ceiling - The max value to use for weighted story point calculations.
     """
     estimate = getattr(initiative_issue.fields, initial_time_key)
+    if estimate is None:
+        estimate = 0.0
     epic = epicTimeRollup.Epic(
         initiative_issue, [], estimate, estimate, 1, 1)
     curr_initiative = Initiative(
         initiative_issue, [epic], 0.0, 0.0, 0, 0, 0.0, story_point_weight, story_point_weight_ceiling)
 
-    curr_initiative.remaining_time = estimate
-    curr_initiative.summed_time = estimate
+    curr_initiative.calculate_estimate_counts()
     return curr_initiative
 
 
-def calculate_estimation(args_list, filtered_keys, initiative_issue, story_point_weight, story_point_weight_ceiling):
+def calculate_estimation(jira, args_list, filtered_keys, initiative_issue, story_point_weight, story_point_weight_ceiling):
     """
         Calculate the estimation for an initiative in 'Active Estimation', 'In Progress' status. This will calculate the complete roll-up for the epics.
+        jira - the jira connection, shared with the epic rollup.
         args_list - Passthrough args to be sent to the epic rollup.
         filtered_keys - The list of epics to perform a rollup against.
         initiative_issue - JIRA issue in which to calculate the estimate for.
@@ -328,7 +577,93 @@ def calculate_estimation(args_list, filtered_keys, initiative_issue, story_point
     new_args = create_epic_rollup_args(
         args_list, initiative_issue.key, filtered_keys)
     epics_container = epicTimeRollup.execute(
-        new_args) if len(filtered_keys) != 0 else []
+        new_args, jira) if len(filtered_keys) != 0 else []
+    if "--export_estimates_path" in new_args:
+        exportManifest.remove_stale(
+            new_args[new_args.index("--export_estimates_path") + 1])
+
+    curr_initiative = Initiative(
+        initiative_issue, epics_container, 0.0, 0.0, 0, 0, 0.0, story_point_weight, story_point_weight_ceiling)
+
+    curr_initiative.calculate_estimate_counts()
+    return curr_initiative
+
+
+def update_initiative_estimates(initiatives_container):
+    """
+        Updates the actual jira initiatives to reflect the new estimates.
+        initiatives_container - list of initiatives which we want to update the estimates of.
+    """
+    for initiative in initiatives_container:
+        print("Updating initiative: {}".format(initiative.initiative.key))
+
+        initiative.initiative.update(fields={
+            INITIAL_TIME_KEY: initiative.summed_time})
+        initiative.initiative.update(fields={
+            REMAINING_TIME_KEY: initiative.remaining_time})
+        # Initiatives in initial estimation have no issues to be confident about; their confidence and incomplete
+        # count are written as 0, as before their counts were calculated.
+        initial_estimation = [epic.epic.key for epic in initiative.epics] == [
+            initiative.initiative.key]
+        initiative.initiative.update(fields={
+            CONFIDENCE_INTERVAL_KEY: 0 if initial_estimation else int(initiative.estimation_confidence)})
+        initiative.initiative.update(fields={
+                                     INCOMPLETE_ISSUE_COUNT_KEY: 0 if initial_estimation else initiative.incomplete_estimated_count+initiative.incomplete_unestimated_count})
+
+
+def discover_initiatives(jira, query_string):
+    """
+        Finds initiatives with a single paginated search which returns every field the roll-up needs, yielding the
+        initiative issues in search order as the pages arrive.
+        jira - the jira connection.
+        query_string - the JQL selecting the initiatives.
+    """
+    seen_keys = set()
+    start_at = 0
+
+    while True:
+        page = jira.search_issues(
+            query_string, startAt=start_at, maxResults=SEARCH_PAGE_SIZE, fields=INITIATIVE_FIELDS)
+
+        for initiative_issue in page:
+            if initiative_issue.key not in seen_keys:
+                seen_keys.add(initiative_issue.key)
+                yield initiative_issue
+
+        # Jira may cap maxResults below the page size asked for, so only the total marks the last page.
+        start_at += len(page)
+        if len(page) == 0 or start_at >= page.total:
+            break
+
+
+def get_linked_epic_keys(initiative_issue):
+    """
+        Gets the keys of the epics linked to an initiative, ignoring links to other initiatives and sales tickets.
+        initiative_issue - JIRA issue of the initiative.
+    """
+    return [
+        x.inwardIssue.key for x in initiative_issue.fields.issuelinks if hasattr(x, 'inwardIssue') and 'FRONT' not in x.inwardIssue.key and 'SALES' not in x.inwardIssue.key]
+
+
+def rollup_initiative(jira, initiative_issue, project_configs, story_point_weight, story_point_weight_ceiling, force_toplevel_recalculate=False, import_project_configs=False, import_project_configs_path=None):
+    """
+        Calculates the estimation for an initiative in-process, reusing the given jira connection and project configurations.
+        jira - the jira connection.
+        initiative_issue - JIRA issue in which to calculate the estimate for.
+        project_configs - dictionary of jira project configurations; missing projects are generated and added to it.
+        story_point_weight - Weighted value to be used in calculating the confidence interval.
+        story_point_weight_ceiling - The max value to use for weighted story point calculations.
+        force_toplevel_recalculate - whether story level estimates should be recalculated from subtasks.
+        import_project_configs - whether project configurations should be loaded from file.
+        import_project_configs_path - fully qualified path of the folder containing the project configurations.
+    """
+    if initiative_issue.fields.status.name == 'Initial Estimation':
+        return calculate_initial_estimation(
+            initiative_issue, INITIAL_TIME_KEY, story_point_weight, story_point_weight_ceiling)
+
+    epics_container = epicTimeRollup.rollup_epics(
+        jira, get_linked_epic_keys(initiative_issue), project_configs, force_toplevel_recalculate=force_toplevel_recalculate,
+        import_project_configs=import_project_configs, import_project_configs_path=import_project_configs_path)
 
     curr_initiative = Initiative(
         initiative_issue, epics_container, 0.0, 0.0, 0, 0, 0.0, story_point_weight, story_point_weight_ceiling)
@@ -339,32 +674,27 @@ def calculate_estimation(args_list, filtered_keys, initiative_issue, story_point
 
 ### Main ###
 
-def execute(args_list):
+def execute(args_list, jira=None):
     args = parse_args(args_list)
 
     print("Running JIRA Tabulations for Initiatives")
-    jira_options = {"server": "https://battlefy.atlassian.net"}
-    jira = JIRA(
-        options=jira_options,
-        basic_auth=(args.user, args.api_token),
-    )
+    owns_client = jira is None
+    if owns_client:
+        jira = jiraClient.connect(args.user, args.api_token, args.server)
 
     if args.initiatives is not None:
-        initiatives = args.initiatives.split(",")
+        initiative_issues = (jira.issue(initiative, fields=INITIATIVE_FIELDS)
+                             for initiative in args.initiatives.split(","))
     elif args.auto_initiatives:
-        # FRONT-15 is the ops epic.
-        query_string = "project=FRONT and type=Epic and id!=Front-15"
-        initiatives = list(
-            set([e.key for e in jira.search_issues(query_string)]))
+        initiative_issues = discover_initiatives(
+            jira, AUTO_INITIATIVES_QUERY)
 
     initiatives_container = []
 
-    for initiative in initiatives:
-        print("Obtaining roll-up for {}".format(initiative))
-        initiative_issue = jira.issue(initiative)
+    for initiative_issue in initiative_issues:
+        print("Obtaining roll-up for {}".format(initiative_issue.key))
 
-        keys = [
-            x.inwardIssue.key for x in initiative_issue.fields.issuelinks if hasattr(x, 'inwardIssue') and 'FRONT' not in x.inwardIssue.key and 'SALES' not in x.inwardIssue.key]
+        keys = get_linked_epic_keys(initiative_issue)
         filtered_keys = []
         curr_initiative = None
 
@@ -377,116 +707,74 @@ def execute(args_list):
         else:
             filtered_keys.extend(keys)
             curr_initiative = calculate_estimation(
-                args_list, filtered_keys, initiative_issue, args.story_point_weight, args.story_point_weight_ceiling)
+                jira, args_list, filtered_keys, initiative_issue, args.story_point_weight, args.story_point_weight_ceiling)
 
         initiatives_container.append(curr_initiative)
 
+    if args.issue_store_path is not None:
+        # The epics of the initiatives are materialized by the epic roll-up, which receives the same argument; the
+        # totals written back and exported are the SQL aggregates of the store.
+        store = issueStore.IssueStore(args.issue_store_path)
+        store.add_initiatives(initiatives_container)
+        store.apply_initiative_rollups(initiatives_container)
+        store.close()
+
     if args.update_initiative_estimates:
-        # update the SP estimate on the initiatives
-        for initiative in initiatives_container:
-            print("Updating initiative: {}".format(initiative.initiative.key))
-
-            initiative.initiative.update(fields={
-                INITIAL_TIME_KEY: initiative.summed_time})
-            initiative.initiative.update(fields={
-                REMAINING_TIME_KEY: initiative.remaining_time})
-            initiative.initiative.update(fields={
-                CONFIDENCE_INTERVAL_KEY: int(initiative.estimation_confidence)})
-            initiative.initiative.update(fields={
-                                         INCOMPLETE_ISSUE_COUNT_KEY: initiative.incomplete_estimated_count+initiative.incomplete_unestimated_count})
+        update_initiative_estimates(initiatives_container)
 
     if args.export_estimates:
         export_initiatives_json(
             args.export_estimates_path, initiatives_container)
 
+    if args.sweep_story_point_weights is not None or args.sweep_story_point_weight_ceilings is not None:
+        sweep_weights = [float(weight) for weight in args.sweep_story_point_weights.split(
+            ",")] if args.sweep_story_point_weights is not None else [args.story_point_weight]
+        sweep_ceilings = [float(ceiling) for ceiling in args.sweep_story_point_weight_ceilings.split(
+            ",")] if args.sweep_story_point_weight_ceilings is not None else [args.story_point_weight_ceiling]
+        sweep_rows = sweep_estimation_confidence(
+            initiatives_container, sweep_weights, sweep_ceilings)
+
+        print("{:<12} ".format("initiative") + " ".join(
+            ["{:>10}".format("{:g}/{:g}".format(weight, ceiling)) for weight in sweep_weights for ceiling in sweep_ceilings]))
+        for sweep_row in sweep_rows:
+            print("{:<12} ".format(sweep_row['key']) + " ".join(
+                ["{:>10}".format(entry['estimation_confidence']) for entry in sweep_row['confidence']]))
+
+        if args.export_estimates:
+            export_confidence_sweep(args.export_estimates_path, sweep_rows)
+
     month_distributions = {}
 
-    if args.create_calendar_schedule:
-        skipped_epics = []
+    if args.create_calendar_schedule or args.forecast_delivery or args.columnar_export_path is not None:
         print("Calculating calendar rooted capacity demand...")
-        for initiative in initiatives_container:
-            for epic in initiative.epics:
-                initiative_start_date_object = None
-                initiative_end_date_object = None
-                start_date_object = None
-                end_date_object = None
-
-                # Confirm we have an initiative start date; if we don't have that all bets are off anyways
-                # check start date of epic; if we don't have that, we yield to the start date of the initiative
-                # if we do have it, we still need to sanity check that the epic doesn't start before the initiatve; if so assume the start date is the
-                # initiative.
-                # If we don't have that, we set the start date to the same month as the end_date
-                if getattr(initiative.initiative.fields, START_DATE_KEY) is None:
-                    skipped_epics.append(epic)
-                    continue
-                else:
-                    initiative_start_date_object = datetime.datetime.strptime(
-                        getattr(initiative.initiative.fields, START_DATE_KEY), "%Y-%m-%d")
-
-                if getattr(epic.epic.fields, START_DATE_KEY) is not None:
-                    start_date_object = datetime.datetime.strptime(
-                        getattr(epic.epic.fields, START_DATE_KEY), "%Y-%m-%d")
-                    if start_date_object < initiative_start_date_object:
-                        start_date_object = initiative_start_date_object
-
-                if epic.epic.fields.duedate is not None:
-                    end_date_object = datetime.datetime.strptime(
-                        epic.epic.fields.duedate, "%Y-%m-%d")
-                elif initiative.initiative.fields.duedate is not None:
-                    end_date_object = datetime.datetime.strptime(
-                        initiative.initiative.fields.duedate, "%Y-%m-%d")
-                else:
-                    skipped_epics.append(epic)
-                    continue
-                # TODO - but... whyyyyyyyy ;-;
-                if getattr(epic.epic.fields, START_DATE_KEY) is None:
-                    start_date_object = datetime.datetime(
-                        end_date_object.year, end_date_object.month, end_date_object.day)
-
-                total_delta_days = (
-                    end_date_object - start_date_object).days + 1
-
-                summed_calc_total_delta_days = (end_date_object - datetime.datetime.today()).days + 1 if start_date_object < datetime.datetime.today(
-                ) and datetime.datetime.today() < end_date_object else total_delta_days
-                delta_months = diff_month(end_date_object, start_date_object)+1
-
-                itr_date = start_date_object
-
-                for i in range(delta_months):
-                    end_date = get_current_month_end_date(
-                        itr_date, end_date_object)
-                    micro_delta_days = (end_date - itr_date).days + 1
-                    month_distribution_key = str(
-                        itr_date.year)+"-"+str(itr_date.month)
-                    if month_distribution_key not in month_distributions:
-                        month_distributions[month_distribution_key] = MonthWorkload(
-                            itr_date.month, [], [], [])
-                    month_distributions[month_distribution_key].epics.append(
-                        epic)
-
-                    month_distributions[month_distribution_key].summed_time.append(EpicIntervalCommitment(initiative.initiative.fields.summary, epic.epic.fields.summary, round(float(
-                        epic.summed_time * (micro_delta_days / total_delta_days)), 2)))
-
-                    # remaining time is only pertinent for the section of time after today()
-                    if (itr_date < datetime.datetime.today()):
-                        # adjust for the case where we are currently calculating this month, wherein we want to provide some partial
-                        # counting; if end_date < today, we are over and all work must be done.
-                        if (itr_date.month == datetime.datetime.today().month) and (itr_date.year == datetime.datetime.today().year):
-                            micro_delta_days = (
-                                end_date - datetime.datetime.today()).days + 1 if (end_date_object - datetime.datetime.today()).days > 0 else summed_calc_total_delta_days
-                        else:
-                            micro_delta_days = 0
-                            # if this is the last loop, and the nested epic is over, we need to just frontload the entire remaining work into next month
-
-                    month_distributions[month_distribution_key].remaining_time.append(EpicIntervalCommitment(initiative.initiative.fields.summary, epic.epic.fields.summary, round(float(
-                        epic.remaining_time * (micro_delta_days / summed_calc_total_delta_days)), 2)))
-                    itr_date = get_next_month_start_date(itr_date, 1)
+        epic_schedules, skipped_epics = calculate_epic_schedules(
+            initiatives_container, datetime.datetime.today())
+
+    if args.create_calendar_schedule:
+        month_distributions = calculate_capacity_calendar(epic_schedules)
 
         # serialize calendar plan
         export_capacity_calendar(
             args.export_estimates_path, month_distributions)
         print("Calendar render complete.")
 
+    if args.forecast_delivery:
+        forecast = deliveryForecast.forecast_delivery(epic_schedules, args.forecast_scenarios, [float(percentile) for percentile in args.forecast_percentiles.split(
+            ",")], args.story_point_weight, datetime.datetime.today(), args.forecast_seed)
+        deliveryForecast.export_delivery_forecast(
+            args.export_estimates_path, forecast)
+
+    if args.snapshot_path is not None:
+        rollupSnapshots.record_snapshot(args.snapshot_path, args.snapshot_label,
+                                        initiatives_container=initiatives_container, month_distributions=month_distributions)
+
+    if args.columnar_export_path is not None:
+        columnar_export = columnarExport.ColumnarExport(
+            args.columnar_export_path, args.columnar_format)
+        columnar_export.add_initiatives(initiatives_container)
+        columnar_export.add_epic_schedules(epic_schedules)
+        columnar_export.close()
+
     if args.update_sheets:
         print("Updating the google sheet...")
         scope = ['https://spreadsheets.google.com/feeds',
@@ -519,3 +807,8 @@ def execute(args_list):
                 counter += 1
         alloc.update_acell('G49', 'Updated On: {}'.format(
             datetime.datetime.today()))
+
+    if owns_client:
+        jira.print_cache_report()
+
+    return initiatives_container
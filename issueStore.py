@@ -0,0 +1,440 @@
+import argparse
+import estimationConfidence
+import exportManifest
+import jiraFields
+import json
+import os
+import sqlite3
+import sys
+
+
+### Constants ###
+
+INITIATIVE_KIND = "initiative"
+EPIC_KIND = "epic"
+STORY_KIND = "story"
+SUBTASK_KIND = "subtask"
+
+# Estimate types of the issues rolled up into an epic or release; see epicTimeRollup.extract_issue_estimate.
+TASK_ESTIMATE = "task"
+STORY_ESTIMATE = "story"
+# Initiatives in initial estimation are estimated on the initiative itself.
+INITIAL_ESTIMATE = "initial"
+
+# Bumped whenever the tables change; stores of an older version are rebuilt.
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    key TEXT PRIMARY KEY,
+    parent_key TEXT,
+    kind TEXT NOT NULL,
+    issue_type TEXT,
+    status TEXT,
+    project_key TEXT,
+    summary TEXT,
+    estimate_type TEXT,
+    raw_estimate REAL,
+    recalculate INTEGER NOT NULL DEFAULT 0,
+    write_back INTEGER NOT NULL DEFAULT 0,
+    start_date TEXT,
+    due_date TEXT
+);
+CREATE TABLE IF NOT EXISTS issue_links (
+    issue_key TEXT NOT NULL,
+    linked_key TEXT NOT NULL,
+    PRIMARY KEY (issue_key, linked_key)
+);
+CREATE TABLE IF NOT EXISTS issue_fix_versions (
+    issue_key TEXT NOT NULL,
+    fix_version TEXT NOT NULL,
+    PRIMARY KEY (issue_key, fix_version)
+);
+CREATE INDEX IF NOT EXISTS issues_parent_key ON issues (parent_key);
+CREATE INDEX IF NOT EXISTS issues_project_key ON issues (project_key);
+CREATE INDEX IF NOT EXISTS issue_links_linked_key ON issue_links (linked_key);
+CREATE INDEX IF NOT EXISTS issue_fix_versions_fix_version ON issue_fix_versions (fix_version);
+
+-- Mirrors epicTimeRollup.extract_issue_estimate: tasks keep their own estimate, stories theirs unless it is unset (or
+-- recalculated), in which case the estimates of their subtasks are summed. A story written back with no subtask
+-- estimates keeps its own estimate, as rollup_subtask_estimates does.
+CREATE VIEW IF NOT EXISTS story_estimates AS
+SELECT
+    s.key AS key,
+    s.parent_key AS parent_key,
+    s.status AS status,
+    s.project_key AS project_key,
+    CASE
+        WHEN s.estimate_type = 'task' THEN COALESCE(s.raw_estimate, 0.0)
+        WHEN s.estimate_type = 'story' AND s.raw_estimate IS NOT NULL AND s.recalculate = 0 THEN s.raw_estimate
+        WHEN s.estimate_type = 'story' THEN (
+            SELECT CASE WHEN COALESCE(SUM(t.raw_estimate), 0.0) = 0.0 AND s.write_back = 1 THEN COALESCE(s.raw_estimate, 0.0)
+                        ELSE COALESCE(SUM(t.raw_estimate), 0.0) END
+            FROM issues t WHERE t.parent_key = s.key AND t.kind = 'subtask')
+        ELSE 0.0
+    END AS estimate
+FROM issues s
+WHERE s.kind = 'story';
+"""
+
+DROP_SCHEMA = """
+DROP VIEW IF EXISTS story_estimates;
+DROP TABLE IF EXISTS issues;
+DROP TABLE IF EXISTS issue_links;
+DROP TABLE IF EXISTS issue_fix_versions;
+"""
+
+# Mirrors epicTimeRollup.issue_contribution, aggregated over the children of an epic. The placeholder takes further
+# conditions on the epics.
+EPIC_ROLLUP_TEMPLATE = """
+SELECT
+    e.key AS key,
+    e.summary AS summary,
+    COALESCE(SUM(c.estimate), 0.0) AS time,
+    COALESCE(SUM(CASE WHEN c.status != 'Done' THEN c.estimate ELSE 0.0 END), 0.0) AS remaining_time,
+    COUNT(c.key) AS subticket_count,
+    COALESCE(SUM(CASE WHEN c.status != 'Done' AND c.estimate > 0.0 THEN 1 ELSE 0 END), 0) AS incomplete_estimated_count,
+    COALESCE(SUM(CASE WHEN c.status != 'Done' AND c.estimate <= 0.0 THEN 1 ELSE 0 END), 0) AS incomplete_unestimated_count
+FROM issues e
+LEFT JOIN story_estimates c ON c.parent_key = e.key
+WHERE e.kind = 'epic'{}
+GROUP BY e.key
+"""
+EPIC_ROLLUP_QUERY = EPIC_ROLLUP_TEMPLATE.format("")
+
+# Initiatives in initial estimation count as one estimated and one unestimated issue, as in
+# initiativeTimeRollup.calculate_initial_estimation.
+INITIATIVE_ROLLUP_QUERY = """
+SELECT
+    i.key AS key,
+    i.summary AS summary,
+    CASE WHEN i.estimate_type = 'initial' THEN COALESCE(i.raw_estimate, 0.0)
+         ELSE COALESCE(SUM(r.time), 0.0) END AS summed_time,
+    CASE WHEN i.estimate_type = 'initial' THEN COALESCE(i.raw_estimate, 0.0)
+         ELSE COALESCE(SUM(r.remaining_time), 0.0) END AS remaining_time,
+    CASE WHEN i.estimate_type = 'initial' THEN 1
+         ELSE COALESCE(SUM(r.incomplete_estimated_count), 0) END AS incomplete_estimated_count,
+    CASE WHEN i.estimate_type = 'initial' THEN 1
+         ELSE COALESCE(SUM(r.incomplete_unestimated_count), 0) END AS incomplete_unestimated_count,
+    COUNT(r.key) AS epic_count
+FROM issues i
+LEFT JOIN issue_links l ON l.issue_key = i.key
+LEFT JOIN ({}) r ON r.key = l.linked_key
+WHERE i.kind = 'initiative'
+GROUP BY i.key
+""".format(EPIC_ROLLUP_QUERY)
+
+RELEASE_ROLLUP_QUERY = """
+SELECT
+    f.fix_version AS key,
+    COALESCE(SUM(c.estimate), 0.0) AS time,
+    COUNT(c.key) AS subticket_count,
+    COALESCE(SUM(CASE WHEN c.estimate > 0.0 THEN 1 ELSE 0 END), 0) AS subticket_estimate_count
+FROM issue_fix_versions f
+JOIN story_estimates c ON c.key = f.issue_key
+GROUP BY f.fix_version
+"""
+
+# Keys per IN clause, below the default limit of SQLite host parameters.
+KEY_CHUNK_SIZE = 500
+
+NAMED_QUERIES = {
+    'epic_rollups': EPIC_ROLLUP_QUERY,
+    'initiative_rollups': INITIATIVE_ROLLUP_QUERY,
+    'release_rollups': RELEASE_ROLLUP_QUERY,
+    'unestimated_incomplete_stories_by_project': """
+        SELECT project_key, COUNT(*) AS story_count
+        FROM story_estimates
+        WHERE status != 'Done' AND estimate <= 0.0
+        GROUP BY project_key
+        ORDER BY story_count DESC
+    """,
+    'remaining_time_by_project': """
+        SELECT project_key, SUM(estimate) AS remaining_time, COUNT(*) AS story_count
+        FROM story_estimates
+        WHERE status != 'Done'
+        GROUP BY project_key
+        ORDER BY remaining_time DESC
+    """,
+}
+
+
+### Data Structures ###
+
+class IssueStore:
+    """
+        Local SQLite materialization of fetched issues and their raw estimates. Story, epic, initiative and release
+        roll-ups are computed as SQL aggregates over it instead of walking jira issue objects; the roll-up commands
+        given a store take their totals from it.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.connection.executescript(DROP_SCHEMA)
+            self.connection.execute(
+                "PRAGMA user_version = {}".format(SCHEMA_VERSION))
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def add_epics(self, epics_container, project_configs, force_toplevel_recalculate=False, update_ticket_estimates=False):
+        """
+            Materializes the issues of epics; every story (and its subtasks) replaces what was stored for the epic before.
+            epics_container - the list of Epic objects.
+            project_configs - dictionary of jira project configurations.
+            force_toplevel_recalculate - whether story level estimates were recalculated from subtasks.
+            update_ticket_estimates - whether story level estimates were written back to jira.
+        """
+        for epic in epics_container:
+            self.connection.execute("DELETE FROM issues WHERE kind = ? AND parent_key IN (SELECT key FROM issues WHERE parent_key = ? AND kind = ?)",
+                                    (SUBTASK_KIND, epic.epic.key, STORY_KIND))
+            self.connection.execute(
+                "DELETE FROM issues WHERE parent_key = ? AND kind = ?", (epic.epic.key, STORY_KIND))
+            project_constants = project_configs.get(
+                epic.epic.fields.project.id)
+            rows = [issue_row(epic.epic, None, EPIC_KIND)]
+            for story in epic.issues:
+                rows.extend(self.story_rows(story, epic.epic.key, project_constants,
+                                            force_toplevel_recalculate, update_ticket_estimates))
+            self.insert_issues(rows)
+        self.connection.commit()
+
+    def add_initiatives(self, initiatives_container):
+        """
+            Materializes initiatives and their links to epics. The epics themselves are stored by add_epics.
+            initiatives_container - the list of Initiative objects.
+        """
+        for initiative in initiatives_container:
+            initial_estimation = [epic.epic.key for epic in initiative.epics] == [
+                initiative.initiative.key]
+            self.insert_issues([issue_row(initiative.initiative, None, INITIATIVE_KIND, INITIAL_ESTIMATE if initial_estimation else None,
+                                          getattr(initiative.initiative.fields, jiraFields.INITIAL_TIME_KEY, None) if initial_estimation else None)])
+            self.connection.execute(
+                "DELETE FROM issue_links WHERE issue_key = ?", (initiative.initiative.key,))
+            self.connection.executemany("INSERT OR REPLACE INTO issue_links (issue_key, linked_key) VALUES (?, ?)", [
+                (initiative.initiative.key, epic.epic.key) for epic in initiative.epics if epic.epic.key != initiative.initiative.key])
+        self.connection.commit()
+
+    def add_releases(self, releases_container, project_configs):
+        """
+            Materializes the issues of releases and their fixVersion.
+            releases_container - the list of Release objects.
+            project_configs - dictionary of jira project configurations.
+        """
+        for release in releases_container:
+            self.connection.execute(
+                "DELETE FROM issue_fix_versions WHERE fix_version = ?", (release.release,))
+            rows = []
+            for story in release.issues:
+                # Keep the parent of issues already stored from an epic roll-up.
+                existing = self.connection.execute(
+                    "SELECT parent_key FROM issues WHERE key = ?", (story.issue.key,)).fetchone()
+                rows.extend(self.story_rows(story, existing['parent_key'] if existing is not None else None,
+                                            project_configs.get(story.issue.fields.project.id)))
+            self.insert_issues(rows)
+            self.connection.executemany("INSERT OR REPLACE INTO issue_fix_versions (issue_key, fix_version) VALUES (?, ?)", [
+                (story.issue.key, release.release) for story in release.issues])
+        self.connection.commit()
+
+    def story_rows(self, story, parent_key, project_constants, force_toplevel_recalculate=False, update_ticket_estimates=False):
+        """
+            Gets the rows of a story and its subtasks, replacing the subtasks stored for it before.
+            story - the UserStory object.
+            parent_key - key of the epic the story rolls up into.
+            project_constants - project constants used to determine task type & customs.
+            force_toplevel_recalculate - whether the story level estimate was recalculated from subtasks.
+            update_ticket_estimates - whether the story level estimate was written back to jira.
+        """
+        self.connection.execute(
+            "DELETE FROM issues WHERE parent_key = ? AND kind = ?", (story.issue.key, SUBTASK_KIND))
+        estimate_type, estimation_key = None, None
+        if project_constants is not None:
+            issue_type_id = story.issue.fields.issuetype.id
+            if issue_type_id == project_constants.task.type_id:
+                estimate_type, estimation_key = TASK_ESTIMATE, project_constants.task.estimation_key
+            elif issue_type_id == project_constants.story.type_id:
+                estimate_type, estimation_key = STORY_ESTIMATE, project_constants.story.estimation_key
+        recalculate = force_toplevel_recalculate and len(story.subtasks) > 0
+        rows = [issue_row(story.issue, parent_key, STORY_KIND, estimate_type,
+                          getattr(story.issue.fields, estimation_key, None) if estimation_key is not None else None, recalculate,
+                          update_ticket_estimates and estimate_type == STORY_ESTIMATE)]
+        for subtask_key, subtask_estimate in story.subtask_estimates.items():
+            rows.append((subtask_key, story.issue.key, SUBTASK_KIND, None, None, rows[0][5], None, None,
+                         subtask_estimate, 0, 0, None, None))
+        return rows
+
+    def insert_issues(self, rows):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO issues (key, parent_key, kind, issue_type, status, project_key, summary, estimate_type, raw_estimate, recalculate, write_back, start_date, due_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def query(self, sql, parameters=()):
+        """
+            Runs a query against the store, returning the rows as dictionaries.
+            sql - the SQL (or name of one of the NAMED_QUERIES) to run.
+            parameters - the query parameters.
+        """
+        sql = NAMED_QUERIES.get(sql, sql)
+        return [dict(row) for row in self.connection.execute(sql, parameters)]
+
+    def epic_rollups(self):
+        return self.query(EPIC_ROLLUP_QUERY)
+
+    def release_rollups(self):
+        return self.query(RELEASE_ROLLUP_QUERY)
+
+    def apply_epic_rollups(self, epics_container):
+        """
+            Takes the totals of epic roll-ups from the SQL aggregates over their stored issues.
+            epics_container - the list of Epic objects, materialized by add_epics.
+        """
+        keys = [epic.epic.key for epic in epics_container]
+        rollups = {}
+        for index in range(0, len(keys), KEY_CHUNK_SIZE):
+            chunk = keys[index:index + KEY_CHUNK_SIZE]
+            rollups.update((row['key'], row) for row in self.query(EPIC_ROLLUP_TEMPLATE.format(
+                " AND e.key IN ({})".format(", ".join("?" * len(chunk)))), chunk))
+        for epic in epics_container:
+            rollup = rollups[epic.epic.key]
+            epic.summed_time = rollup_value(epic.summed_time, rollup['time'])
+            epic.remaining_time = rollup_value(
+                epic.remaining_time, rollup['remaining_time'])
+            epic.incomplete_estimated_count = rollup_value(
+                epic.incomplete_estimated_count, rollup['incomplete_estimated_count'])
+            epic.incomplete_unestimated_count = rollup_value(
+                epic.incomplete_unestimated_count, rollup['incomplete_unestimated_count'])
+
+    def apply_initiative_rollups(self, initiatives_container):
+        """
+            Takes the totals of initiative roll-ups from the SQL aggregates over their stored epics, and recalculates
+            their confidence from them.
+            initiatives_container - the list of Initiative objects, materialized by add_initiatives.
+        """
+        rollups = {row['key']: row for row in self.query(
+            INITIATIVE_ROLLUP_QUERY)}
+        for initiative in initiatives_container:
+            rollup = rollups[initiative.initiative.key]
+            initiative.summed_time = rollup_value(
+                initiative.summed_time, rollup['summed_time'])
+            initiative.remaining_time = rollup_value(
+                initiative.remaining_time, rollup['remaining_time'])
+            initiative.incomplete_estimated_count = rollup_value(
+                initiative.incomplete_estimated_count, rollup['incomplete_estimated_count'])
+            initiative.incomplete_unestimated_count = rollup_value(
+                initiative.incomplete_unestimated_count, rollup['incomplete_unestimated_count'])
+            initiative.calculate_estimation_confidence()
+
+    def apply_release_rollups(self, releases_container):
+        """
+            Takes the totals of release roll-ups from the SQL aggregates over their stored issues.
+            releases_container - the list of Release objects, materialized by add_releases.
+        """
+        rollups = {row['key']: row for row in self.query(RELEASE_ROLLUP_QUERY)}
+        for release in releases_container:
+            if release.release in rollups:
+                release.summed_time = rollup_value(
+                    release.summed_time, rollups[release.release]['time'])
+
+    def initiative_rollups(self, story_point_weight, story_point_weight_ceiling):
+        """
+            Gets the initiative roll-ups; the confidence is calculated from the aggregated counts.
+            story_point_weight - Weighted value to be used in calculating the confidence interval.
+            story_point_weight_ceiling - The max value to use for weighted story point calculations.
+        """
+        rows = self.query(INITIATIVE_ROLLUP_QUERY)
+        for row in rows:
+            row['estimation_confidence'] = estimationConfidence.estimation_confidence(row['incomplete_estimated_count'], row['incomplete_unestimated_count'],
+                                                                                      row['remaining_time'], story_point_weight, story_point_weight_ceiling)
+        return rows
+
+
+### Methods ###
+
+def rollup_value(current, value):
+    """
+        Converts an aggregate to the type of the value it replaces, so that exports read the same as without the store.
+        current - the value calculated by the python roll-up.
+        value - the SQL aggregate.
+    """
+    return type(current)(value)
+
+
+def issue_row(issue, parent_key, kind, estimate_type=None, raw_estimate=None, recalculate=False, write_back=False):
+    """
+        Flattens a jira issue into a row of the issues table.
+        issue - the jira issue.
+        parent_key - key of the issue this one rolls up into.
+        kind - the role of the issue in the roll-up hierarchy.
+        estimate_type - how the estimate of the issue is rolled up, one of the *_ESTIMATE constants.
+        raw_estimate - the estimate set on the issue itself.
+        recalculate - whether the estimate is recalculated from the subtasks regardless of the raw estimate.
+        write_back - whether the estimate recalculated from the subtasks was written back to the issue.
+    """
+    fields = issue.fields
+    issue_type = fields.issuetype.name if hasattr(
+        fields, "issuetype") and hasattr(fields.issuetype, "name") else None
+    status = fields.status.name if hasattr(fields, "status") else None
+    project_key = fields.project.key if hasattr(
+        fields, "project") else issue.key.split("-")[0]
+    return (issue.key, parent_key, kind, issue_type, status, project_key, getattr(fields, "summary", None), estimate_type,
+            float(raw_estimate) if raw_estimate is not None else None, 1 if recalculate else 0, 1 if write_back else 0,
+            getattr(fields, jiraFields.START_DATE_KEY, None), getattr(fields, "duedate", None))
+
+
+def parse_args(args_list):
+    """
+    Parse arguments for issue-store.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--issue_store_path", required=True)
+    parser.add_argument("--query", default="epic_rollups",
+                        help="One of [{}] or an SQL statement.".format(", ".join(NAMED_QUERIES)))
+    parser.add_argument("--story_point_weight", type=float, default=5)
+    parser.add_argument("--story_point_weight_ceiling",
+                        type=float, default=25)
+    parser.add_argument("--export_estimates", action='store_true')
+    parser.add_argument("--export_estimates_path")
+
+    args = parser.parse_args(args=args_list)
+
+    if args.export_estimates == True:
+        if args.export_estimates_path is None:
+            argparse.ArgumentError(
+                "User provided --export_estimates, but no value for --export_estimates_path .")
+            sys.exit(-2)
+
+    if not os.path.exists(args.issue_store_path):
+        print("Issue store {} does not exist.".format(args.issue_store_path))
+        sys.exit(-2)
+
+    return args
+
+
+### Main ###
+
+def execute(args_list):
+    args = parse_args(args_list)
+    print("Running Issue Store Query")
+    store = IssueStore(args.issue_store_path)
+
+    if args.query == 'initiative_rollups':
+        rows = store.initiative_rollups(
+            args.story_point_weight, args.story_point_weight_ceiling)
+    else:
+        rows = store.query(args.query)
+    store.close()
+
+    output = json.dumps(rows, indent=4, separators=(",", ": "))
+    if args.export_estimates:
+        query_name = args.query if args.query in NAMED_QUERIES else "query"
+        out_file_path = os.path.join(
+            args.export_estimates_path, "{}.json".format(query_name))
+        print("Writing file {}".format(out_file_path))
+        exportManifest.write_export(out_file_path, output)
+    else:
+        print(output)
+
+    return rows
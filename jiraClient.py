@@ -0,0 +1,179 @@
+from concurrent.futures import Future
+from jira import JIRA
+from requests.adapters import HTTPAdapter
+import threading
+import time
+
+
+### Constants ###
+
+DEFAULT_SERVER = "https://battlefy.atlassian.net"
+
+# Read-only JIRA methods whose responses are memoized for the duration of a run.
+MEMOIZED_METHODS = ["project", "issue", "search_issues", "createmeta"]
+
+
+### Data Structures ###
+
+class CachingJira:
+    """
+        Wraps a JIRA connection, memoizing the responses of its read-only methods for the duration of a run and collapsing
+        concurrent identical in-flight requests into a single request. Everything else is delegated to the connection.
+    """
+
+    def __init__(self, jira):
+        self.jira = jira
+        self.lock = threading.Lock()
+        self.responses = {}
+        self.in_flight = {}
+        self.stats = {method: {'hits': 0, 'misses': 0, 'coalesced': 0}
+                      for method in MEMOIZED_METHODS}
+
+    def __getattr__(self, name):
+        return getattr(self.jira, name)
+
+    def project(self, *args, **kwargs):
+        return self.memoized("project", args, kwargs)
+
+    def issue(self, *args, **kwargs):
+        return self.memoized("issue", args, kwargs)
+
+    def search_issues(self, *args, **kwargs):
+        return self.memoized("search_issues", args, kwargs)
+
+    def createmeta(self, *args, **kwargs):
+        return self.memoized("createmeta", args, kwargs)
+
+    def memoized(self, method, args, kwargs):
+        """
+            Gets the response of a JIRA method call from the memo, waiting on an identical in-flight request, or issuing
+            the request.
+            method - name of the JIRA method.
+            args - positional arguments of the call.
+            kwargs - keyword arguments of the call.
+        """
+        key = (method, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return getattr(self.jira, method)(*args, **kwargs)
+
+        with self.lock:
+            if key in self.responses:
+                self.stats[method]['hits'] += 1
+                return self.responses[key]
+            if key in self.in_flight:
+                self.stats[method]['coalesced'] += 1
+                future = self.in_flight[key]
+                owner = False
+            else:
+                self.stats[method]['misses'] += 1
+                future = Future()
+                self.in_flight[key] = future
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            response = getattr(self.jira, method)(*args, **kwargs)
+        except Exception as e:
+            with self.lock:
+                del self.in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            self.responses[key] = response
+            del self.in_flight[key]
+        future.set_result(response)
+        return response
+
+    def clear_cache(self):
+        """
+            Forgets the memoized responses, e.g. when starting a new refresh in a long-running process.
+        """
+        with self.lock:
+            self.responses = {}
+
+    def dict(self):
+        methods = {}
+        for method in MEMOIZED_METHODS:
+            stats = self.stats[method]
+            requests = stats['hits'] + stats['misses'] + stats['coalesced']
+            methods[method] = {'requests': requests, 'hits': stats['hits'], 'coalesced': stats['coalesced'], 'fetched': stats['misses'],
+                               'hit_rate': round((stats['hits'] + stats['coalesced']) / requests, 4) if requests != 0 else 0.0}
+        return methods
+
+    def print_cache_report(self):
+        """
+            Prints the memo hit rates of the run.
+        """
+        print("Jira request cache report:")
+        for method, stats in self.dict().items():
+            print("    {}: {} requests, {} fetched, {} memo hits, {} coalesced ({:.1%} saved)".format(
+                method, stats['requests'], stats['fetched'], stats['hits'], stats['coalesced'], stats['hit_rate']))
+
+
+class RateLimiter:
+    """
+        Spaces requests out to at most requests_per_second, across all threads sharing the limiter.
+    """
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second
+        self.lock = threading.Lock()
+        self.next_request = time.monotonic()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_request - now
+            self.next_request = max(self.next_request, now) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+        Transport adapter of a jira session which holds requests back according to the rate limiter of its site.
+    """
+
+    def __init__(self, rate_limiter=None, **kwargs):
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        return super().send(request, **kwargs)
+
+
+### Methods ###
+
+def connect(user, api_token, server=DEFAULT_SERVER, max_connections=None, requests_per_second=None):
+    """
+        Creates a memoizing jira connection.
+        user - the jira user.
+        api_token - the api token of the user.
+        server - the jira server url.
+        max_connections - size of the connection pool of the session; the requests default when None.
+        requests_per_second - the request budget of the connection; unlimited when None.
+    """
+    jira_options = {"server": server}
+    jira = JIRA(
+        options=jira_options,
+        basic_auth=(user, api_token),
+    )
+
+    if max_connections is not None or requests_per_second is not None:
+        adapter_options = {}
+        if max_connections is not None:
+            adapter_options = {"pool_connections": max_connections,
+                               "pool_maxsize": max_connections}
+        adapter = RateLimitedAdapter(RateLimiter(
+            requests_per_second) if requests_per_second is not None else None, **adapter_options)
+        jira._session.mount("https://", adapter)
+        jira._session.mount("http://", adapter)
+
+    return CachingJira(jira)
@@ -0,0 +1,62 @@
+### Constants ###
+
+START_DATE_KEY = "customfield_11600"
+# Estimate of an initiative still in initial estimation.
+INITIAL_TIME_KEY = "customfield_11609"
+
+# Fields every roll-up reads from the issues it fetches.
+BASE_FIELDS = ["project", "summary", "status", "issuetype"]
+
+
+### Methods ###
+
+def fields_param(*field_lists):
+    """
+        Joins lists of field keys into the fields parameter of a jira request, dropping duplicates and unset keys.
+        field_lists - the lists of field keys.
+    """
+    fields = []
+    for field_list in field_lists:
+        for field in field_list:
+            if field is not None and field not in fields:
+                fields.append(field)
+    return ",".join(fields)
+
+
+def estimation_keys(project_constants, *issue_kinds):
+    """
+        Gets the estimation keys a project uses for the given issue kinds.
+        project_constants - project constants used to determine task type & customs.
+        issue_kinds - names of the ProjectConstants members, e.g. "story", "task".
+    """
+    keys = []
+    for issue_kind in issue_kinds:
+        issue_bundle = getattr(project_constants, issue_kind, None)
+        # Issue types a project does not have are left as the IssueBundle class itself.
+        if issue_bundle is not None and not isinstance(issue_bundle, type):
+            keys.append(issue_bundle.estimation_key)
+    return keys
+
+
+def epic_fields(project_constants):
+    """
+        Fields needed of an epic: its estimate (for write-backs) and its schedule.
+        project_constants - project constants used to determine task type & customs.
+    """
+    return fields_param(BASE_FIELDS, estimation_keys(project_constants, "epic"), [START_DATE_KEY, "duedate"])
+
+
+def child_fields(project_constants):
+    """
+        Fields needed of the issues of an epic or release.
+        project_constants - project constants used to determine task type & customs.
+    """
+    return fields_param(BASE_FIELDS, estimation_keys(project_constants, "story", "task"), ["subtasks"])
+
+
+def subtask_fields(project_constants):
+    """
+        Fields needed of a subtask; subtasks are estimated with the story estimation key.
+        project_constants - project constants used to determine task type & customs.
+    """
+    return fields_param(estimation_keys(project_constants, "story"), ["issuetype"])
@@ -1,13 +1,21 @@
 import argparse
+import exportManifest
 import initiativeTimeRollup
 import epicTimeRollup
 import releaseTimeRollup
+import rollupServer
+import issueStore
+import rollupSnapshots
+import multiSiteRollup
+import cycleTimeRollup
+import combinedRollup
+import sprintRollup
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        "--command", help="The command to issue [epicTimeRollup, initiativeTimeRollup]. All trailing commands will be passed through to the underlaying command.", required=True)
+        "--command", help="The command to issue [epicTimeRollup, initiativeTimeRollup, releaseTimeRollup, rollupServer, issueStore, rollupSnapshots, multiSiteRollup, cycleTimeRollup, combinedRollup, sprintRollup]. All trailing commands will be passed through to the underlaying command.", required=True)
 
     args, passthrough = parser.parse_known_args()
     return args, passthrough
@@ -24,8 +32,34 @@ def main():
     elif args.command == "releaseTimeRollup":
         print("Executing {}".format(args.command))
         releaseTimeRollup.execute(passthrough)
+    elif args.command == "rollupServer":
+        print("Executing {}".format(args.command))
+        rollupServer.execute(passthrough)
+    elif args.command == "issueStore":
+        print("Executing {}".format(args.command))
+        issueStore.execute(passthrough)
+    elif args.command == "rollupSnapshots":
+        print("Executing {}".format(args.command))
+        rollupSnapshots.execute(passthrough)
+    elif args.command == "multiSiteRollup":
+        print("Executing {}".format(args.command))
+        multiSiteRollup.execute(passthrough)
+    elif args.command == "cycleTimeRollup":
+        print("Executing {}".format(args.command))
+        cycleTimeRollup.execute(passthrough)
+    elif args.command == "combinedRollup":
+        print("Executing {}".format(args.command))
+        combinedRollup.execute(passthrough)
+    elif args.command == "sprintRollup":
+        print("Executing {}".format(args.command))
+        sprintRollup.execute(passthrough)
     else:
         print("Unknown command {}".format(args.command))
 
+    exportManifest.print_export_report()
+    exportManifest.shutdown_export_pool()
+
 
-main()
+# Export encoding runs in worker processes, which must not run the command again when they import this module.
+if __name__ == "__main__":
+    main()
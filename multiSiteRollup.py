@@ -0,0 +1,214 @@
+import argparse
+import exportManifest
+import epicTimeRollup
+import initiativeTimeRollup
+import releaseTimeRollup
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import json
+import os
+import sys
+import jiraClient
+
+
+### Constants ###
+
+ROLLUP_COMMANDS = {
+    "epicTimeRollup": epicTimeRollup,
+    "initiativeTimeRollup": initiativeTimeRollup,
+    "releaseTimeRollup": releaseTimeRollup,
+}
+
+
+### Data Structures ###
+
+@dataclass
+class SiteConfig:
+    name: str
+    server: str
+    user: str
+    api_token: str
+    max_connections: int = None
+    requests_per_second: float = None
+    args: list = field(default_factory=list)
+
+    def dict(self):
+        # The api token is deliberately left out of reports.
+        return {'name': self.name, 'server': self.server, 'user': self.user, 'max_connections': self.max_connections,
+                'requests_per_second': self.requests_per_second, 'args': self.args}
+
+
+@dataclass
+class SiteResult:
+    site: SiteConfig
+    rollups: list
+    error: str = None
+
+    def dict(self):
+        rollups_json = [rollup.dict() for rollup in self.rollups]
+        return {'name': self.site.name, 'server': self.site.server, 'status': 'failed' if self.error is not None else 'ok', 'error': self.error,
+                'summed_time': round(sum(getattr(rollup, "summed_time", 0.0) for rollup in self.rollups), 2),
+                'remaining_time': round(sum(getattr(rollup, "remaining_time", 0.0) for rollup in self.rollups), 2),
+                'rollups': rollups_json}
+
+
+### Methods ###
+
+def load_sites(path):
+    """
+        Loads the site configurations. The file holds a list of objects with name, server, user and api_token (or
+        api_token_env, the name of an environment variable holding it), and optionally max_connections,
+        requests_per_second and args, a list of arguments only passed to the roll-up of that site.
+        path - fully qualified path of the sites configuration file.
+    """
+    with open(path, 'r') as read_file:
+        sites_json = json.loads(read_file.read())
+
+    sites = []
+    for site_json in sites_json:
+        api_token = site_json.get('api_token')
+        if api_token is None and site_json.get('api_token_env') is not None:
+            api_token = os.environ.get(site_json['api_token_env'])
+        sites.append(SiteConfig(site_json['name'], site_json.get('server', jiraClient.DEFAULT_SERVER), site_json['user'], api_token,
+                                site_json.get('max_connections'), site_json.get('requests_per_second'), site_json.get('args', [])))
+    return sites
+
+
+def site_args(site, passthrough, export_estimates_path=None):
+    """
+        Builds the arguments of the roll-up command of a site.
+        site - the SiteConfig.
+        passthrough - arguments shared by every site.
+        export_estimates_path - root export folder; every site exports into a sub folder of its name.
+    """
+    args_list = ["--user", site.user, "--api_token", site.api_token,
+                 "--server", site.server] + site.args + passthrough
+    if export_estimates_path is not None:
+        site_path = os.path.join(export_estimates_path, site.name)
+        if not os.path.exists(site_path):
+            os.mkdir(site_path)
+        args_list += ["--export_estimates",
+                      "--export_estimates_path", site_path]
+    return args_list
+
+
+def rollup_site(command, site, passthrough, export_estimates_path=None):
+    """
+        Runs a roll-up command against a single site with its own client, connection pool and rate limit.
+        command - the roll-up module, one of ROLLUP_COMMANDS.
+        site - the SiteConfig.
+        passthrough - arguments shared by every site.
+        export_estimates_path - root export folder; every site exports into a sub folder of its name.
+    """
+    print("Rolling up site {} ({})".format(site.name, site.server))
+    try:
+        jira = jiraClient.connect(site.user, site.api_token, site.server,
+                                  site.max_connections, site.requests_per_second)
+        rollups = command.execute(site_args(
+            site, passthrough, export_estimates_path), jira)
+        jira.print_cache_report()
+    except (Exception, SystemExit) as e:
+        print("Roll-up of site {} failed.".format(site.name))
+        print(e)
+        return SiteResult(site, [], str(e))
+
+    if not isinstance(rollups, list):
+        return SiteResult(site, [], "Roll-up of site {} returned {}".format(site.name, rollups))
+
+    print("Finished site {}".format(site.name))
+    return SiteResult(site, rollups)
+
+
+def rollup_sites(command, sites, passthrough, export_estimates_path=None, max_sites=None):
+    """
+        Rolls up every site concurrently. Returns the SiteResult of every site, in the order of sites.
+        command - the roll-up module, one of ROLLUP_COMMANDS.
+        sites - the list of SiteConfig.
+        passthrough - arguments shared by every site.
+        export_estimates_path - root export folder; every site exports into a sub folder of its name.
+        max_sites - the number of sites rolled up at once; all of them when None.
+    """
+    if len(sites) == 0:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max_sites or len(sites)) as executor:
+        futures = [executor.submit(rollup_site, command, site, passthrough,
+                                   export_estimates_path) for site in sites]
+        return [future.result() for future in futures]
+
+
+def combined_report(command_name, site_results):
+    """
+        Merges the results of every site into a single report.
+        command_name - the name of the roll-up command.
+        site_results - the list of SiteResult.
+    """
+    sites_json = [site_result.dict() for site_result in site_results]
+    return {'command': command_name,
+            'summed_time': round(sum(site_json['summed_time'] for site_json in sites_json), 2),
+            'remaining_time': round(sum(site_json['remaining_time'] for site_json in sites_json), 2),
+            'failed_sites': [site_json['name'] for site_json in sites_json if site_json['status'] == 'failed'],
+            'sites': sites_json}
+
+
+def export_combined_json(root, report):
+    """
+        Exports the combined report to json.
+        root - the root folder in which to place the output file.
+        report - the report returned by combined_report.
+    """
+    out_file_path = os.path.join(root, "Combined_estimates.json")
+
+    print("Writing file {}".format(out_file_path))
+    exportManifest.write_json(out_file_path, report)
+
+    print("Finished writing to file.")
+
+
+def parse_args(args_list):
+    """
+    Parse arguments for multi-site-rollup.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sites_config", required=True)
+    parser.add_argument("--rollup", required=True,
+                        help="The roll-up to run on every site [{}].".format(", ".join(ROLLUP_COMMANDS)))
+    parser.add_argument("--max_sites", type=int)
+    parser.add_argument("--export_estimates", action='store_true')
+    parser.add_argument("--export_estimates_path")
+
+    args, passthrough = parser.parse_known_args(args=args_list)
+
+    if args.rollup not in ROLLUP_COMMANDS:
+        argparse.ArgumentError(
+            "Unknown --rollup {}.".format(args.rollup))
+        sys.exit(-2)
+
+    if args.export_estimates == True:
+        if args.export_estimates_path is None:
+            argparse.ArgumentError(
+                "User provided --export_estimates, but no value for --export_estimates_path .")
+            sys.exit(-2)
+
+    return args, passthrough
+
+
+### Main ###
+
+def execute(args_list):
+    args, passthrough = parse_args(args_list)
+    print("Running JIRA Tabulations across sites")
+
+    sites = load_sites(args.sites_config)
+    site_results = rollup_sites(ROLLUP_COMMANDS[args.rollup], sites, passthrough,
+                                args.export_estimates_path if args.export_estimates else None, args.max_sites)
+
+    report = combined_report(args.rollup, site_results)
+    for site_json in report['sites']:
+        print("{:<20} {:<8} {:>12} {:>12}".format(
+            site_json['name'], site_json['status'], site_json['summed_time'], site_json['remaining_time']))
+
+    if args.export_estimates:
+        export_combined_json(args.export_estimates_path, report)
+
+    return report
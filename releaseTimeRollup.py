@@ -1,13 +1,22 @@
 import argparse
+import columnarExport
+import exportManifest
 import epicTimeRollup
+import issueStore
 from dataclasses import dataclass, asdict
 import os
 import shutil
 from jira import JIRA
+import jiraClient
+import jiraFields
 import json
 from subprocess import Popen
 
 
+# Number of release issues fetched per "key in" search when the issues are shared with other roll-ups.
+SHARED_FETCH_CHUNK_SIZE = 50
+
+
 @dataclass
 class Release:
     release: str
@@ -19,7 +28,6 @@ class Release:
         est_count = 0
 
         for issue in self.issues:
-            di = issue.dict()
             issues_json.append(issue.dict())
             if issue.summed_time > 0.0:
                 est_count += 1
@@ -42,13 +50,8 @@ def export_releases_json(root, releases_container):
         releases_json[release_container.release].append(
             release_container.dict())
 
-    for release_key in releases_json:
-        out_file_path = os.path.join(
-            root, "{}_estimates.json".format(release_key.replace(" ", "_")))
-
-        with open(out_file_path, "w") as output_file:
-            output_file.writelines(json.dumps(
-                releases_json[release_key], indent=4, separators=(",", ": ")))
+    exportManifest.write_json_files([(os.path.join(root, "{}_estimates.json".format(
+        release_key.replace(" ", "_"))), releases_json[release_key]) for release_key in releases_json])
 
     print("Finished writing to file.")
 
@@ -60,6 +63,7 @@ def parse_args(args_list):
     parser = argparse.ArgumentParser()
     parser.add_argument("--user", required=True)
     parser.add_argument("--api_token", required=True)
+    parser.add_argument("--server", default=jiraClient.DEFAULT_SERVER)
     parser.add_argument("--releases", required=True)
     parser.add_argument("--export_estimates", action='store_true')
     parser.add_argument("--export_estimates_path")
@@ -67,61 +71,131 @@ def parse_args(args_list):
     parser.add_argument("--export_project_config_path")
     parser.add_argument("--import_project_configs", action='store_true')
     parser.add_argument("--import_project_configs_path")
+    parser.add_argument("--issue_store_path")
+    parser.add_argument("--columnar_export_path",
+                        help="Folder in which to write flat issue and roll-up tables.")
+    parser.add_argument("--columnar_format", choices=columnarExport.COLUMNAR_FORMATS,
+                        default=columnarExport.PARQUET_FORMAT)
 
     args = parser.parse_args(args=args_list)
 
     return args
 
 
-def execute(args_list):
+def rollup_release(jira, release, project_configs, shared_issues=None):
+    """
+        Fetches the issues of a release and calculates the estimate roll-up for it.
+        jira - the jira connection.
+        release - the name of the fixVersion to calculate the rollup for.
+        project_configs - dictionary of jira project configurations; missing projects are generated and added to it.
+        shared_issues - optional dictionary of issue key to the UserStory objects already fetched by other roll-ups of
+        the run; only the release issues missing from it are fetched.
+    """
+    release_obj = Release(release, [], 0.0)
+    query_string = "fixVersion={}".format(release)
+    # get a list of the issues first, just by summary and comprehend the
+    # projects
+    # maxResults=False pages through every issue; the default stops at 50.
+    project_issues = jira.search_issues(
+        query_string, maxResults=False, fields="project")
+    issue_projects = list(
+        set([e.fields.project.id for e in project_issues]))
+
+    if len(issue_projects) != 1:
+        print("Multiple projects in release; unable to assert size.")
+        return None
+    root_project_id = issue_projects[0]
+
+    if root_project_id not in project_configs:
+        project_configs[root_project_id] = epicTimeRollup.generate_project_constants(
+            jira, jira.project(root_project_id))
+
+    if shared_issues is None:
+        release_obj.issues = [epicTimeRollup.UserStory(
+            e, e.fields.subtasks if hasattr(
+                e.fields, "subtasks") else [], 0.0
+        )
+            for e in jira.search_issues(
+            query_string, maxResults=False, fields=jiraFields.child_fields(project_configs[root_project_id]))
+        ]
+    else:
+        release_obj.issues = get_shared_release_issues(
+            jira, [e.key for e in project_issues], project_configs[root_project_id], shared_issues)
+
+    for issue in release_obj.issues:
+        epicTimeRollup.extract_issue_estimate(
+            jira, issue, project_configs[root_project_id])
+        release_obj.summed_time += issue.summed_time
+
+    return release_obj
+
+
+def get_shared_release_issues(jira, issue_keys, project_constants, shared_issues):
+    """
+        Gets the issues of a release as new UserStory objects, reusing the issues (and subtask estimates) other roll-ups
+        of the run already fetched and fetching the rest in batches.
+        jira - the jira connection.
+        issue_keys - the keys of the release issues, in order.
+        project_constants - project constants of the release project.
+        shared_issues - dictionary of issue key to the UserStory objects already fetched.
+    """
+    missing_keys = [key for key in issue_keys if key not in shared_issues]
+    fetched = {}
+    for index in range(0, len(missing_keys), SHARED_FETCH_CHUNK_SIZE):
+        chunk = missing_keys[index:index + SHARED_FETCH_CHUNK_SIZE]
+        for e in jira.search_issues("key in ({})".format(",".join(chunk)), maxResults=len(chunk), fields=jiraFields.child_fields(project_constants)):
+            fetched[e.key] = epicTimeRollup.UserStory(
+                e, e.fields.subtasks if hasattr(e.fields, "subtasks") else [], 0.0)
+
+    release_issues = []
+    for key in issue_keys:
+        if key in shared_issues:
+            # Release estimates are extracted without the epic roll-up options, so the issue is estimated afresh.
+            shared = shared_issues[key]
+            release_issues.append(epicTimeRollup.UserStory(
+                shared.issue, shared.subtasks, 0.0, dict(shared.subtask_estimates)))
+        elif key in fetched:
+            release_issues.append(fetched[key])
+    return release_issues
+
+
+def execute(args_list, jira=None):
     args = parse_args(args_list)
     print("Running JIRA Tabulations for Releases")
-    jira_options = {"server": "https://battlefy.atlassian.net"}
-    jira = JIRA(
-        options=jira_options,
-        basic_auth=(args.user, args.api_token),
-    )
+    owns_client = jira is None
+    if owns_client:
+        jira = jiraClient.connect(args.user, args.api_token, args.server)
 
     releases = args.releases.split(",")
     releases_container = []
     project_configs = {}
 
     for release in releases:
-        release_obj = Release(release, [], 0.0)
-        releases_container.append(release_obj)
-        query_string = "fixVersion={}".format(release)
-        # get a list of the issues first, just by summary and comprehend the
-        # projects
-        issue_projects = list(set([e.fields.project.id for e in jira.search_issues(
-            query_string)]))
-
-        if len(issue_projects) != 1:
-            print("Multiple projects in release; unable to assert size.")
+        release_obj = rollup_release(jira, release, project_configs)
+        if release_obj is None:
+            if owns_client:
+                jira.print_cache_report()
             return -1
-        root_project_id = issue_projects[0]
-
-        if root_project_id not in project_configs:
-            project_configs[root_project_id] = epicTimeRollup.generate_project_constants(
-                jira, jira.project(root_project_id))
-
-        cust_keys = list(set([project_configs[root_project_id].story.estimation_key,
-                              project_configs[root_project_id].task.estimation_key]))
-        cust_key_str = ",".join(cust_keys)
-
-        release_obj.issues = [epicTimeRollup.UserStory(
-            e, e.fields.subtasks if hasattr(
-                e.fields, "subtasks") else [], 0.0
-        )
-            for e in jira.search_issues(
-            query_string, fields="{}, subtasks, summary, issuetype".format(cust_key_str))
-        ]
+        releases_container.append(release_obj)
 
-        for release in releases_container:
-            for issue in release.issues:
-                epicTimeRollup.extract_issue_estimate(
-                    jira, issue, project_configs[root_project_id])
-                release.summed_time += issue.summed_time
+    if args.issue_store_path is not None:
+        # The totals exported are the SQL aggregates of the store.
+        store = issueStore.IssueStore(args.issue_store_path)
+        store.add_releases(releases_container, project_configs)
+        store.apply_release_rollups(releases_container)
+        store.close()
 
     if args.export_estimates:
         export_releases_json(
             args.export_estimates_path, releases_container)
+
+    if args.columnar_export_path is not None:
+        columnar_export = columnarExport.ColumnarExport(
+            args.columnar_export_path, args.columnar_format)
+        columnar_export.add_releases(releases_container)
+        columnar_export.close()
+
+    if owns_client:
+        jira.print_cache_report()
+
+    return releases_container
@@ -0,0 +1,411 @@
+import argparse
+import epicTimeRollup
+import initiativeTimeRollup
+import releaseTimeRollup
+import rollupWebhook
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+import datetime
+import json
+import threading
+import time
+import jiraClient
+
+
+### Constants ###
+
+EPIC_KIND = "epic"
+INITIATIVE_KIND = "initiative"
+RELEASE_KIND = "release"
+
+
+### Data Structures ###
+
+@dataclass
+class RollupEntry:
+    kind: str
+    key: str
+    rollup: object
+    member_keys: set
+    computed_at: datetime.datetime
+    payload: bytes
+
+    def dict(self):
+        return {'kind': self.kind, 'key': self.key, 'computed_at': self.computed_at.isoformat(), 'member_count': len(self.member_keys)}
+
+
+class RollupCache:
+    """
+        Keeps the jira connection, project configurations and computed roll-ups warm in memory. Roll-ups are computed on first
+        request and afterwards only recomputed when one of the issues they are built from changes in jira.
+    """
+
+    def __init__(self, jira, story_point_weight, story_point_weight_ceiling, force_toplevel_recalculate=False, import_project_configs=False, import_project_configs_path=None, update_ticket_estimates=False):
+        self.jira = jira
+        self.project_configs = {}
+        self.rollup_index = rollupWebhook.RollupIndex(
+            self.project_configs, jira, update_ticket_estimates, force_toplevel_recalculate)
+        self.entries = {}
+        self.lock = threading.RLock()
+        self.story_point_weight = story_point_weight
+        self.story_point_weight_ceiling = story_point_weight_ceiling
+        self.force_toplevel_recalculate = force_toplevel_recalculate
+        self.import_project_configs = import_project_configs
+        self.import_project_configs_path = import_project_configs_path
+        self.last_refresh = datetime.datetime.now()
+
+    def get(self, kind, key):
+        """
+            Gets the cached roll-up for the given kind and key, computing it if it has not been requested before.
+            kind - one of epic, initiative or release.
+            key - the issue key (or release name) of the roll-up.
+        """
+        entry = self.entries.get((kind, key))
+        if entry is not None:
+            return entry
+
+        # Computed outside the lock, so that requests for cached roll-ups are not held up by it.
+        return self.store(self.compute(kind, key), replace=False)
+
+    def store(self, entry, replace=True):
+        """
+            Swaps a computed roll-up into the cache and the webhook index. Returns the cached entry.
+            entry - the computed RollupEntry.
+            replace - whether an entry cached in the meantime, e.g. by a concurrent request, is replaced.
+        """
+        with self.lock:
+            cached = self.entries.get((entry.kind, entry.key))
+            if cached is not None and not replace:
+                return cached
+            if entry.kind == EPIC_KIND:
+                self.rollup_index.add_epic(entry.rollup)
+            elif entry.kind == INITIATIVE_KIND:
+                self.rollup_index.add_initiative(entry.rollup)
+            self.entries[(entry.kind, entry.key)] = entry
+            return entry
+
+    def compute(self, kind, key):
+        """
+            Computes a roll-up against jira, reusing the warm connection and project configurations. The roll-up is
+            computed against a copy of the project configurations; new ones are added to the cache once it is done.
+            kind - one of epic, initiative or release.
+            key - the issue key (or release name) of the roll-up.
+        """
+        print("Computing {} roll-up for {}".format(kind, key))
+        # Memoized responses only live for one computation; recomputations must see the current issues and links, and
+        # concurrent identical requests are still coalesced.
+        self.jira.clear_cache()
+        with self.lock:
+            project_configs = dict(self.project_configs)
+
+        if kind == EPIC_KIND:
+            epics_container = epicTimeRollup.rollup_epics(
+                self.jira, [key], project_configs, force_toplevel_recalculate=self.force_toplevel_recalculate,
+                import_project_configs=self.import_project_configs, import_project_configs_path=self.import_project_configs_path)
+            if len(epics_container) == 0:
+                raise LookupError("Unable to access epic {}".format(key))
+            rollup = epics_container[0]
+            member_keys = get_epic_member_keys(rollup)
+        elif kind == INITIATIVE_KIND:
+            initiative_issue = self.jira.issue(
+                key, fields=initiativeTimeRollup.INITIATIVE_FIELDS)
+            if initiative_issue.fields.status.name == 'Initial Estimation':
+                rollup = initiativeTimeRollup.calculate_initial_estimation(
+                    initiative_issue, initiativeTimeRollup.INITIAL_TIME_KEY, self.story_point_weight, self.story_point_weight_ceiling)
+            else:
+                # Epics are shared with the epic roll-ups so that every epic is held (and updated by webhooks) only once.
+                epics_container = []
+                for epic_key in initiativeTimeRollup.get_linked_epic_keys(initiative_issue):
+                    try:
+                        epics_container.append(
+                            self.get(EPIC_KIND, epic_key).rollup)
+                    except LookupError as e:
+                        print(e)
+                rollup = initiativeTimeRollup.Initiative(
+                    initiative_issue, epics_container, 0.0, 0.0, 0, 0, 0.0, self.story_point_weight, self.story_point_weight_ceiling)
+                rollup.calculate_estimate_counts()
+            member_keys = get_initiative_member_keys(rollup)
+        elif kind == RELEASE_KIND:
+            rollup = releaseTimeRollup.rollup_release(
+                self.jira, key, project_configs)
+            if rollup is None:
+                raise LookupError(
+                    "Release {} spans multiple projects; unable to assert size.".format(key))
+            member_keys = get_issue_member_keys(rollup.issues)
+        else:
+            raise LookupError("Unknown roll-up kind {}".format(kind))
+
+        with self.lock:
+            for project_id, project_constants in project_configs.items():
+                self.project_configs.setdefault(project_id, project_constants)
+
+        payload = json.dumps(rollup.dict()).encode("utf-8")
+        return RollupEntry(kind, key, rollup, member_keys, datetime.datetime.now(), payload)
+
+    def refresh(self):
+        """
+            Incrementally refreshes the cache; only the roll-ups containing issues updated since the last refresh are recomputed.
+        """
+        refresh_started = datetime.datetime.now()
+        self.jira.clear_cache()
+        # JQL relative dates avoid any dependency on the timezone of the jira user.
+        minutes = int((refresh_started - self.last_refresh).total_seconds() // 60) + 1
+        updated_issues = self.jira.search_issues(
+            "updated >= -{}m".format(minutes), maxResults=False, fields="parent, fixVersions")
+
+        changed_keys = set()
+        changed_releases = set()
+        for issue in updated_issues:
+            changed_keys.add(issue.key)
+            if hasattr(issue.fields, "parent"):
+                changed_keys.add(issue.fields.parent.key)
+            for fix_version in getattr(issue.fields, "fixVersions", None) or []:
+                changed_releases.add(fix_version.name)
+
+        with self.lock:
+            entries = list(self.entries.values())
+        stale_entries = [entry for entry in entries if not entry.member_keys.isdisjoint(changed_keys) or (
+            entry.kind == RELEASE_KIND and entry.key in changed_releases)]
+        # Epics first, so that recomputed initiatives pick up the recomputed epics.
+        stale_entries.sort(key=lambda entry: [
+                           EPIC_KIND, INITIATIVE_KIND, RELEASE_KIND].index(entry.kind))
+
+        for entry in stale_entries:
+            try:
+                # Only the swap holds the lock; cached roll-ups keep being served while the new ones are computed.
+                self.store(self.compute(entry.kind, entry.key))
+            except Exception as e:
+                print("Unable to refresh {} {}".format(entry.kind, entry.key))
+                print(e)
+
+        self.last_refresh = refresh_started
+        print("Refreshed {} of {} roll-ups from {} updated issues.".format(
+            len(stale_entries), len(self.entries), len(changed_keys)))
+
+    def apply_webhook_event(self, event):
+        """
+            Applies a jira webhook event to the cached epic and initiative roll-ups, re-encoding only the affected ones.
+            Release roll-ups are left to the scheduled refresh.
+            event - the decoded webhook payload.
+        """
+        unresolved_initiatives = []
+        with self.lock:
+            changed = self.rollup_index.apply_event(event)
+            for kind, key in changed:
+                entry = self.entries.get((kind, key))
+                if entry is None:
+                    continue
+                # Deleted epics and initiatives are dropped from the index; their roll-ups are dropped as well.
+                if (kind == EPIC_KIND and key not in self.rollup_index.epics) or (kind == INITIATIVE_KIND and key not in self.rollup_index.initiatives):
+                    del self.entries[(kind, key)]
+                    continue
+                if kind == EPIC_KIND:
+                    entry.member_keys = get_epic_member_keys(entry.rollup)
+                elif kind == INITIATIVE_KIND:
+                    entry.member_keys = get_initiative_member_keys(
+                        entry.rollup)
+                    if has_unresolved_epics(entry.rollup):
+                        unresolved_initiatives.append(key)
+                entry.payload = json.dumps(
+                    entry.rollup.dict()).encode("utf-8")
+                entry.computed_at = datetime.datetime.now()
+
+        # Initiatives linked to epics which are not cached yet (or moved in or out of initial estimation) are recomputed.
+        for key in unresolved_initiatives:
+            try:
+                self.store(self.compute(INITIATIVE_KIND, key))
+            except Exception as e:
+                print("Unable to refresh {} {}".format(INITIATIVE_KIND, key))
+                print(e)
+        return changed
+
+    def dict(self):
+        return {'last_refresh': self.last_refresh.isoformat(), 'project_count': len(self.project_configs), 'request_cache': self.jira.dict(), 'rollups': [entry.dict() for entry in list(self.entries.values())]}
+
+
+class RollupRequestHandler(BaseHTTPRequestHandler):
+    """
+        Answers GET /epic/{key}, /initiative/{key}, /release/{name} and /status from the roll-up cache, and accepts jira
+        issue webhooks on POST /webhook.
+    """
+
+    def do_GET(self):
+        path_parts = [unquote(part) for part in urlparse(
+            self.path).path.split("/") if part != ""]
+
+        try:
+            if path_parts == ["status"]:
+                self.send_payload(
+                    200, json.dumps(self.server.rollup_cache.dict()).encode("utf-8"))
+            elif len(path_parts) == 2 and path_parts[0] in [EPIC_KIND, INITIATIVE_KIND, RELEASE_KIND]:
+                entry = self.server.rollup_cache.get(
+                    path_parts[0], path_parts[1])
+                self.send_payload(200, entry.payload)
+            else:
+                self.send_payload(404, json.dumps(
+                    {'error': "Unknown path {}".format(self.path)}).encode("utf-8"))
+        except LookupError as e:
+            self.send_payload(404, json.dumps(
+                {'error': str(e)}).encode("utf-8"))
+        except Exception as e:
+            self.send_payload(500, json.dumps(
+                {'error': str(e)}).encode("utf-8"))
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/webhook":
+            self.send_payload(404, json.dumps(
+                {'error': "Unknown path {}".format(self.path)}).encode("utf-8"))
+            return
+
+        try:
+            content_length = int(self.headers.get("Content-Length", 0))
+            event = json.loads(self.rfile.read(content_length))
+            changed = self.server.rollup_cache.apply_webhook_event(event)
+            self.send_payload(200, json.dumps(
+                {'changed': ["{}/{}".format(kind, key) for kind, key in sorted(changed)]}).encode("utf-8"))
+        except Exception as e:
+            self.send_payload(500, json.dumps(
+                {'error': str(e)}).encode("utf-8"))
+
+    def send_payload(self, status, payload):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+### Methods ###
+
+def get_issue_member_keys(issues):
+    """
+        Gets the keys of the given UserStory objects, including their subtasks.
+        issues - list of UserStory objects.
+    """
+    member_keys = set()
+    for issue in issues:
+        member_keys.add(issue.issue.key)
+        for subtask in issue.subtasks:
+            member_keys.add(subtask.key)
+    return member_keys
+
+
+def get_epic_member_keys(epic):
+    """
+        Gets the keys of all the issues an epic roll-up is built from.
+        epic - the Epic object.
+    """
+    member_keys = get_issue_member_keys(epic.issues)
+    member_keys.add(epic.epic.key)
+    return member_keys
+
+
+def get_initiative_member_keys(initiative):
+    """
+        Gets the keys of all the issues an initiative roll-up is built from.
+        initiative - the Initiative object.
+    """
+    member_keys = set([initiative.initiative.key])
+    for epic in initiative.epics:
+        member_keys.update(get_epic_member_keys(epic))
+    return member_keys
+
+
+def has_unresolved_epics(initiative):
+    """
+        Whether the epics of an initiative roll-up no longer match the links (or status) of its initiative issue.
+        initiative - the Initiative object.
+    """
+    epic_keys = [epic.epic.key for epic in initiative.epics]
+    if initiative.initiative.fields.status.name == 'Initial Estimation':
+        return epic_keys != [initiative.initiative.key]
+    if not hasattr(initiative.initiative.fields, "issuelinks"):
+        return initiative.initiative.key in epic_keys
+    return initiative.initiative.key in epic_keys or any(
+        key not in epic_keys for key in initiativeTimeRollup.get_linked_epic_keys(initiative.initiative))
+
+
+def refresh_loop(rollup_cache, refresh_interval):
+    """
+        Refreshes the roll-up cache on a schedule; executed on a background thread.
+        rollup_cache - the cache to refresh.
+        refresh_interval - number of seconds to wait between refreshes.
+    """
+    while True:
+        time.sleep(refresh_interval)
+        try:
+            rollup_cache.refresh()
+        except Exception as e:
+            print("Unable to refresh roll-up cache.")
+            print(e)
+
+
+def parse_args(args_list):
+    """
+    Parse arguments for rollup-server.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--api_token", required=True)
+    parser.add_argument("--server", default=jiraClient.DEFAULT_SERVER)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--refresh_interval", type=int, default=300)
+    parser.add_argument("--warm_epics")
+    parser.add_argument("--warm_initiatives")
+    parser.add_argument("--warm_releases")
+    parser.add_argument("--force_toplevel_recalculate", action='store_true')
+    parser.add_argument("--update_ticket_estimates", action='store_true')
+    parser.add_argument("--replay_events_path")
+    parser.add_argument("--import_project_configs", action='store_true')
+    parser.add_argument("--import_project_configs_path")
+    parser.add_argument("--story_point_weight", type=float, default=5)
+    parser.add_argument("--story_point_weight_ceiling",
+                        type=float, default=25)
+
+    args = parser.parse_args(args=args_list)
+
+    return args
+
+
+### Main ###
+
+def execute(args_list):
+    args = parse_args(args_list)
+    print("Running JIRA Roll-up Server")
+    jira = jiraClient.connect(args.user, args.api_token, args.server)
+
+    rollup_cache = RollupCache(jira, args.story_point_weight, args.story_point_weight_ceiling,
+                               args.force_toplevel_recalculate, args.import_project_configs, args.import_project_configs_path, args.update_ticket_estimates)
+
+    warm_keys = [(EPIC_KIND, args.warm_epics), (INITIATIVE_KIND,
+                                                  args.warm_initiatives), (RELEASE_KIND, args.warm_releases)]
+    for kind, keys in warm_keys:
+        if keys is None:
+            continue
+        for key in keys.split(","):
+            try:
+                rollup_cache.get(kind, key)
+            except Exception as e:
+                print("Unable to warm {} {}".format(kind, key))
+                print(e)
+
+    if args.replay_events_path is not None:
+        for event in rollupWebhook.load_events(args.replay_events_path):
+            rollup_cache.apply_webhook_event(event)
+
+    refresh_thread = threading.Thread(
+        target=refresh_loop, args=(rollup_cache, args.refresh_interval), daemon=True)
+    refresh_thread.start()
+
+    server = ThreadingHTTPServer((args.host, args.port), RollupRequestHandler)
+    server.rollup_cache = rollup_cache
+    print("Serving roll-ups on http://{}:{}".format(args.host, args.port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down roll-up server.")
+    finally:
+        server.server_close()
@@ -0,0 +1,255 @@
+import argparse
+import datetime
+import gzip
+import json
+import os
+import sys
+
+
+### Constants ###
+
+EPIC_KIND = "epic"
+INITIATIVE_KIND = "initiative"
+MONTH_KIND = "month"
+
+# Snapshot values are stored as positional lists; these are the names of the positions per kind.
+SNAPSHOT_FIELDS = {
+    EPIC_KIND: ['summed_time', 'remaining_time', 'incomplete_estimated_count', 'incomplete_unestimated_count'],
+    INITIATIVE_KIND: ['summed_time', 'remaining_time', 'incomplete_estimated_count', 'incomplete_unestimated_count', 'estimation_confidence'],
+    MONTH_KIND: ['summed_time_summary', 'remaining_time_summary'],
+}
+
+# A full snapshot is written every BASE_INTERVAL snapshots, which bounds how many deltas are replayed to rebuild one.
+BASE_INTERVAL = 20
+
+
+### Data Structures ###
+
+class SnapshotStore:
+    """
+        Append-only, gzip compressed store of roll-up aggregates. Every snapshot only records the keys whose values changed
+        since the previous snapshot (and the keys that disappeared), with a periodic full snapshot.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def records(self):
+        """
+            Iterates over the raw snapshot records in the order they were appended.
+        """
+        if not os.path.exists(self.path):
+            return
+        with gzip.open(self.path, 'rt') as read_file:
+            for line in read_file:
+                if line.strip() != "":
+                    yield json.loads(line)
+
+    def states(self):
+        """
+            Iterates over (record, state) tuples, where state is the full key -> values mapping as of that snapshot.
+        """
+        state = {}
+        for record in self.records():
+            if record['base']:
+                state = {}
+            for key in record['removed']:
+                state.pop(key, None)
+            state.update(record['set'])
+            yield record, state
+
+    def state(self, snapshot_id=None):
+        """
+            Rebuilds the full state of a snapshot.
+            snapshot_id - the id of the snapshot; the latest snapshot when None.
+        """
+        found = None
+        for record, state in self.states():
+            if snapshot_id is None or record['id'] == snapshot_id:
+                found = (record, dict(state))
+            if snapshot_id is not None and record['id'] == snapshot_id:
+                break
+        if found is None:
+            raise LookupError("Unknown snapshot {}".format(snapshot_id))
+        return found
+
+    def append(self, values, label=None):
+        """
+            Appends a snapshot, storing only what changed since the previous one.
+            values - mapping of snapshot key (see snapshot_key) to the list of values.
+            label - optional label to identify the run.
+        """
+        previous_record = None
+        previous_state = {}
+        for record, state in self.states():
+            previous_record = record
+            previous_state = state
+
+        snapshot_id = 0 if previous_record is None else previous_record['id'] + 1
+        base = snapshot_id % BASE_INTERVAL == 0
+
+        if base:
+            changed = values
+            removed = []
+        else:
+            changed = {key: value for key, value in values.items(
+            ) if previous_state.get(key) != value}
+            removed = [key for key in previous_state if key not in values]
+
+        record = {'id': snapshot_id, 'timestamp': datetime.datetime.now().isoformat(), 'label': label,
+                  'base': base, 'set': changed, 'removed': removed}
+
+        with gzip.open(self.path, 'at') as output_file:
+            output_file.write(json.dumps(
+                record, separators=(",", ":")) + "\n")
+
+        print("Recorded snapshot {} with {} changed and {} removed keys.".format(
+            snapshot_id, len(changed), len(removed)))
+        return snapshot_id
+
+    def series(self, key):
+        """
+            Gets the values of a key across all snapshots it changed in, in a single pass over the store.
+            key - the snapshot key.
+        """
+        series = []
+        current = None
+        for record in self.records():
+            if record['base'] or key in record['removed']:
+                value = record['set'].get(key)
+            else:
+                value = record['set'].get(key, current)
+            if value != current:
+                series.append({'id': record['id'], 'timestamp': record['timestamp'],
+                               'label': record['label'], 'values': named_values(key, value)})
+            current = value
+        return series
+
+    def diff(self, from_id, to_id):
+        """
+            Compares two snapshots, returning the added, removed and changed keys with the per field differences.
+            from_id - the id of the older snapshot.
+            to_id - the id of the newer snapshot.
+        """
+        from_record, from_state = self.state(from_id)
+        to_record, to_state = self.state(to_id)
+
+        changed = {}
+        for key, value in to_state.items():
+            if key in from_state and from_state[key] != value:
+                changed[key] = {name: round(new - old, 2) for name, new, old in zip(
+                    SNAPSHOT_FIELDS[key.split(":")[0]], value, from_state[key]) if new != old}
+
+        return {'from': from_record['id'], 'to': to_record['id'],
+                'added': {key: named_values(key, to_state[key]) for key in to_state if key not in from_state},
+                'removed': [key for key in from_state if key not in to_state],
+                'changed': changed}
+
+
+### Methods ###
+
+def snapshot_key(kind, key):
+    return "{}:{}".format(kind, key)
+
+
+def named_values(key, value):
+    if value is None:
+        return None
+    return dict(zip(SNAPSHOT_FIELDS[key.split(":")[0]], value))
+
+
+def epic_values(epic):
+    return [round(epic.summed_time, 2), round(epic.remaining_time, 2), epic.incomplete_estimated_count, epic.incomplete_unestimated_count]
+
+
+def initiative_values(initiative):
+    return [round(initiative.summed_time, 2), round(initiative.remaining_time, 2), initiative.incomplete_estimated_count,
+            initiative.incomplete_unestimated_count, initiative.estimation_confidence]
+
+
+def month_values(month_workload):
+    return [round(sum(commitment.time for commitment in month_workload.summed_time), 2),
+            round(sum(commitment.time for commitment in month_workload.remaining_time), 2)]
+
+
+def snapshot_values(epics_container=None, initiatives_container=None, month_distributions=None):
+    """
+        Collects the aggregates of a run into the snapshot key -> values mapping.
+        epics_container - list of Epic objects.
+        initiatives_container - list of Initiative objects; their epics are recorded as well.
+        month_distributions - dictionary of MonthWorkload objects keyed by year-month.
+    """
+    values = {}
+    for epic in epics_container or []:
+        values[snapshot_key(EPIC_KIND, epic.epic.key)] = epic_values(epic)
+    for initiative in initiatives_container or []:
+        values[snapshot_key(INITIATIVE_KIND, initiative.initiative.key)] = initiative_values(
+            initiative)
+        for epic in initiative.epics:
+            if epic.epic.key != initiative.initiative.key:
+                values[snapshot_key(EPIC_KIND, epic.epic.key)
+                       ] = epic_values(epic)
+    for month_key in month_distributions or {}:
+        values[snapshot_key(MONTH_KIND, month_key)] = month_values(
+            month_distributions[month_key])
+    return values
+
+
+def record_snapshot(path, label=None, epics_container=None, initiatives_container=None, month_distributions=None):
+    """
+        Appends the aggregates of a run to the snapshot store at path.
+    """
+    return SnapshotStore(path).append(snapshot_values(epics_container, initiatives_container, month_distributions), label)
+
+
+def parse_args(args_list):
+    """
+    Parse arguments for rollup-snapshots.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshot_path", required=True)
+    parser.add_argument(
+        "--series", help="Snapshot key to get the series of, e.g. initiative:FRONT-1, epic:PROJ-2 or month:2020-3.")
+    parser.add_argument("--diff", nargs='*', type=int,
+                        help="Ids of the two snapshots to compare; the latest two when omitted.")
+
+    args = parser.parse_args(args=args_list)
+
+    if not os.path.exists(args.snapshot_path):
+        print("Snapshot store {} does not exist.".format(args.snapshot_path))
+        sys.exit(-2)
+
+    if args.diff is not None and len(args.diff) not in [0, 2]:
+        argparse.ArgumentError(
+            "User provided --diff, but not exactly two snapshot ids.")
+        sys.exit(-2)
+
+    return args
+
+
+### Main ###
+
+def execute(args_list):
+    args = parse_args(args_list)
+    store = SnapshotStore(args.snapshot_path)
+
+    if args.series is not None:
+        output = store.series(args.series)
+    elif args.diff is not None:
+        ids = args.diff if len(args.diff) == 2 else [
+            record['id'] for record in store.records()][-2:]
+        if len(ids) < 2:
+            print("Snapshot store {} holds fewer than two snapshots to compare.".format(
+                args.snapshot_path))
+            sys.exit(-2)
+        try:
+            output = store.diff(ids[0], ids[1])
+        except LookupError as error:
+            print(error)
+            sys.exit(-2)
+    else:
+        output = [{'id': record['id'], 'timestamp': record['timestamp'], 'label': record['label'], 'base': record['base'],
+                   'changed_count': len(record['set']), 'removed_count': len(record['removed'])} for record in store.records()]
+
+    print(json.dumps(output, indent=4, separators=(",", ": ")))
+    return output
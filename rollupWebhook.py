@@ -0,0 +1,334 @@
+import epicTimeRollup
+import initiativeTimeRollup
+import json
+import os
+from jira.resources import Issue
+
+
+### Constants ###
+
+ISSUE_CREATED_EVENT = "jira:issue_created"
+ISSUE_UPDATED_EVENT = "jira:issue_updated"
+ISSUE_DELETED_EVENT = "jira:issue_deleted"
+
+
+### Data Structures ###
+
+class RollupIndex:
+    """
+        In-memory parent index over computed roll-ups (subtask -> story -> epic -> initiative). Jira webhook events are
+        applied by re-estimating the changed issue and adjusting only the totals of its ancestors.
+    """
+
+    def __init__(self, project_configs, jira=None, update_ticket_estimates=False, force_toplevel_recalculate=False):
+        self.project_configs = project_configs
+        self.jira = jira
+        self.update_ticket_estimates = update_ticket_estimates
+        self.force_toplevel_recalculate = force_toplevel_recalculate
+        self.initiatives = {}
+        self.epics = {}
+        self.stories = {}
+        self.story_epics = {}
+        self.subtask_stories = {}
+        self.epic_initiatives = {}
+
+    def add_epic(self, epic):
+        """
+            Indexes an epic roll-up and its stories, replacing any previous roll-up of the same epic.
+            epic - the Epic object.
+        """
+        previous = self.epics.get(epic.epic.key)
+        if previous is not None:
+            for story in previous.issues:
+                self.remove_story_index(story)
+
+        self.epics[epic.epic.key] = epic
+        for story in epic.issues:
+            self.stories[story.issue.key] = story
+            self.story_epics[story.issue.key] = epic.epic.key
+            for subtask in story.subtasks:
+                self.subtask_stories[subtask.key] = story.issue.key
+
+    def add_initiative(self, initiative):
+        """
+            Indexes an initiative roll-up and the epics it is built from.
+            initiative - the Initiative object.
+        """
+        self.initiatives[initiative.initiative.key] = initiative
+        for epic in initiative.epics:
+            # Initiatives in initial estimation carry a placeholder epic built from the initiative itself.
+            if epic.epic.key == initiative.initiative.key:
+                continue
+            if self.epics.get(epic.epic.key) is not epic:
+                self.add_epic(epic)
+            self.epic_initiatives.setdefault(
+                epic.epic.key, set()).add(initiative.initiative.key)
+
+    def remove_story_index(self, story):
+        self.stories.pop(story.issue.key, None)
+        self.story_epics.pop(story.issue.key, None)
+        for subtask in story.subtasks:
+            self.subtask_stories.pop(subtask.key, None)
+
+    def apply_event(self, event):
+        """
+            Applies a jira webhook event to the indexed roll-ups. Returns the set of (kind, key) tuples whose roll-up changed,
+            where kind is either epic or initiative.
+            event - the decoded webhook payload.
+        """
+        if self.jira is not None:
+            issue = Issue(self.jira._options,
+                          self.jira._session, raw=event['issue'])
+        else:
+            issue = Issue({}, None, raw=event['issue'])
+        changed = set()
+        parent_key = issue.fields.parent.key if hasattr(
+            issue, "fields") and hasattr(issue.fields, "parent") else None
+
+        if event.get('webhookEvent') == ISSUE_DELETED_EVENT:
+            if issue.key in self.stories:
+                self.remove_story(self.stories[issue.key], changed)
+            elif issue.key in self.subtask_stories:
+                self.remove_subtask(issue.key, changed)
+            elif issue.key in self.epics:
+                self.remove_epic(issue.key, changed)
+            elif issue.key in self.initiatives:
+                self.remove_initiative(issue.key, changed)
+        elif issue.key in self.initiatives:
+            # Field changes on the roll-up roots themselves are never written back; this keeps our own write-backs
+            # from echoing into further write-backs.
+            self.initiatives[issue.key].initiative = issue
+            if hasattr(issue.fields, "issuelinks"):
+                self.sync_initiative_epics(self.initiatives[issue.key])
+            changed.add(("initiative", issue.key))
+            return changed
+        elif issue.key in self.epics:
+            self.epics[issue.key].epic = issue
+            self.add_changed_epic(issue.key, changed)
+            return changed
+        elif issue.key in self.stories or parent_key in self.epics:
+            self.apply_story(issue, parent_key, changed)
+        elif issue.key in self.subtask_stories or parent_key in self.stories:
+            self.apply_subtask(issue, parent_key, changed)
+        else:
+            print("Ignoring event for unindexed issue {}".format(issue.key))
+
+        if self.update_ticket_estimates and self.jira is not None:
+            self.push_estimates(changed)
+
+        return changed
+
+    def apply_story(self, issue, epic_key, changed):
+        """
+            Re-estimates a created or updated story and moves its contribution between epics if its parent changed.
+        """
+        story = self.stories.get(issue.key)
+
+        if story is not None and self.story_epics.get(issue.key) != epic_key:
+            self.remove_story(story, changed)
+            story = None
+
+        if epic_key not in self.epics:
+            return
+
+        if story is None:
+            story = epicTimeRollup.UserStory(issue, [], 0.0)
+            self.reestimate_story(story, issue, changed, epic_key)
+            self.epics[epic_key].issues.append(story)
+            self.stories[issue.key] = story
+            self.story_epics[issue.key] = epic_key
+        else:
+            self.reestimate_story(story, issue, changed)
+
+    def apply_subtask(self, issue, story_key, changed):
+        """
+            Updates the cached estimate of a created or updated subtask and re-estimates its story.
+        """
+        previous_story_key = self.subtask_stories.get(issue.key)
+        story_key = story_key if story_key is not None else previous_story_key
+        # A subtask moved to another story no longer counts towards its old story.
+        if previous_story_key is not None and previous_story_key != story_key:
+            self.remove_subtask(issue.key, changed)
+
+        story = self.stories.get(story_key)
+        if story is None:
+            return
+
+        project_constants = self.project_configs.get(
+            issue.fields.project.id)
+        if project_constants is None:
+            return
+
+        if all(subtask.key != issue.key for subtask in story.subtasks):
+            story.subtasks = story.subtasks + [issue]
+        self.subtask_stories[issue.key] = story_key
+        story.subtask_estimates[issue.key] = epicTimeRollup.get_subtask_estimate(
+            issue, project_constants)
+        self.reestimate_story(story, story.issue, changed)
+
+    def reestimate_story(self, story, issue, changed, epic_key=None):
+        """
+            Recalculates the estimate of a story and applies the difference to its epic and initiatives.
+        """
+        epic_key = epic_key if epic_key is not None else self.story_epics[story.issue.key]
+        project_constants = self.project_configs.get(
+            self.epics[epic_key].epic.fields.project.id)
+
+        if story.issue.key in self.story_epics:
+            self.apply_story_contribution(epic_key, story, -1)
+
+        if issue is not story.issue and hasattr(issue.fields, "subtasks"):
+            story.subtasks = issue.fields.subtasks
+        story.issue = issue
+        for subtask in story.subtasks:
+            self.subtask_stories[subtask.key] = issue.key
+            # Subtasks we have not seen an event for are treated as unestimated rather than fetched.
+            if self.jira is None and subtask.key not in story.subtask_estimates:
+                story.subtask_estimates[subtask.key] = None
+        story.subtask_estimates = {
+            subtask.key: story.subtask_estimates[subtask.key] for subtask in story.subtasks if subtask.key in story.subtask_estimates}
+        story.summed_time = 0.0
+
+        # Story level write-backs are left to the batch roll-ups; they would echo back as further story events.
+        epicTimeRollup.extract_issue_estimate(
+            self.jira, story, project_constants, False, self.force_toplevel_recalculate)
+
+        self.apply_story_contribution(epic_key, story, 1)
+        self.add_changed_epic(epic_key, changed)
+
+    def remove_story(self, story, changed):
+        """
+            Removes a story from its epic, subtracting its contribution.
+        """
+        epic_key = self.story_epics[story.issue.key]
+        epic = self.epics[epic_key]
+        epic.remove_issue(story)
+        for initiative_key in self.epic_initiatives.get(epic_key, []):
+            self.initiatives[initiative_key].apply_contribution(
+                epicTimeRollup.issue_contribution(story), -1)
+        self.remove_story_index(story)
+        self.add_changed_epic(epic_key, changed)
+
+    def remove_subtask(self, subtask_key, changed):
+        """
+            Removes a subtask from its story and re-estimates the story.
+        """
+        story = self.stories[self.subtask_stories.pop(subtask_key)]
+        story.subtasks = [
+            subtask for subtask in story.subtasks if subtask.key != subtask_key]
+        story.subtask_estimates.pop(subtask_key, None)
+        self.reestimate_story(story, story.issue, changed)
+
+    def remove_epic(self, epic_key, changed):
+        """
+            Removes a deleted epic, subtracting its totals from the initiatives it belonged to.
+        """
+        epic = self.epics.pop(epic_key)
+        for story in epic.issues:
+            self.remove_story_index(story)
+        for initiative_key in self.epic_initiatives.pop(epic_key, set()):
+            self.unlink_epic(self.initiatives[initiative_key], epic)
+            changed.add(("initiative", initiative_key))
+        changed.add(("epic", epic_key))
+
+    def remove_initiative(self, initiative_key, changed):
+        """
+            Removes a deleted initiative; its epics stay indexed.
+        """
+        self.initiatives.pop(initiative_key)
+        for initiative_keys in self.epic_initiatives.values():
+            initiative_keys.discard(initiative_key)
+        changed.add(("initiative", initiative_key))
+
+    def sync_initiative_epics(self, initiative):
+        """
+            Follows the epic links of an updated initiative. Unlinked epics are removed from it, and newly linked epics are
+            added when they are indexed; the others are left to the caller, which can fetch them.
+            initiative - the Initiative object, holding the updated initiative issue.
+        """
+        initiative_key = initiative.initiative.key
+        # Initiatives in initial estimation carry a placeholder epic and no epic totals.
+        if any(epic.epic.key == initiative_key for epic in initiative.epics):
+            return
+
+        linked_keys = initiativeTimeRollup.get_linked_epic_keys(
+            initiative.initiative)
+        for epic in [epic for epic in initiative.epics if epic.epic.key not in linked_keys]:
+            self.unlink_epic(initiative, epic)
+            self.epic_initiatives.get(
+                epic.epic.key, set()).discard(initiative_key)
+
+        for epic_key in linked_keys:
+            if epic_key in self.epics and all(epic.epic.key != epic_key for epic in initiative.epics):
+                epic = self.epics[epic_key]
+                initiative.epics.append(epic)
+                initiative.apply_contribution(epic_contribution(epic), 1)
+                self.epic_initiatives.setdefault(
+                    epic_key, set()).add(initiative_key)
+
+    def unlink_epic(self, initiative, epic):
+        initiative.epics = [
+            linked for linked in initiative.epics if linked is not epic]
+        initiative.apply_contribution(epic_contribution(epic), -1)
+
+    def apply_story_contribution(self, epic_key, story, sign):
+        contribution = epicTimeRollup.issue_contribution(story)
+        self.epics[epic_key].apply_contribution(contribution, sign)
+        for initiative_key in self.epic_initiatives.get(epic_key, []):
+            self.initiatives[initiative_key].apply_contribution(
+                contribution, sign)
+
+    def add_changed_epic(self, epic_key, changed):
+        changed.add(("epic", epic_key))
+        for initiative_key in self.epic_initiatives.get(epic_key, []):
+            changed.add(("initiative", initiative_key))
+
+    def push_estimates(self, changed):
+        """
+            Writes the estimates of the changed epics and initiatives back to jira. Deleted roll-ups are no longer
+            indexed and are skipped.
+        """
+        epicTimeRollup.update_ticket_estimates(
+            [self.epics[key] for kind, key in changed if kind == "epic" and key in self.epics], self.project_configs)
+        initiativeTimeRollup.update_initiative_estimates(
+            [self.initiatives[key] for kind, key in changed if kind == "initiative" and key in self.initiatives])
+
+
+### Methods ###
+
+def epic_contribution(epic):
+    """
+        Gets the totals of an epic in the form of an issue contribution, for adding or removing it from an initiative.
+        epic - the Epic object.
+    """
+    return (epic.summed_time, epic.remaining_time, epic.incomplete_estimated_count, epic.incomplete_unestimated_count)
+
+
+def load_events(events_path):
+    """
+        Loads recorded webhook payloads, either from a folder of .json files (replayed in file name order) or from a
+        single file holding one payload per line.
+        events_path - fully qualified path of the folder or file.
+    """
+    if os.path.isdir(events_path):
+        for file_name in sorted(os.listdir(events_path)):
+            if file_name.endswith(".json"):
+                with open(os.path.join(events_path, file_name), 'r') as read_file:
+                    yield json.loads(read_file.read())
+    else:
+        with open(events_path, 'r') as read_file:
+            for line in read_file:
+                if line.strip() != "":
+                    yield json.loads(line)
+
+
+def replay_events(rollup_index, events_path):
+    """
+        Replays recorded webhook payloads against a roll-up index. Returns the set of changed roll-ups.
+        rollup_index - the RollupIndex to apply the events to.
+        events_path - fully qualified path of the recorded events.
+    """
+    changed = set()
+    for event in load_events(events_path):
+        changed.update(rollup_index.apply_event(event))
+    return changed
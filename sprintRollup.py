@@ -0,0 +1,395 @@
+import argparse
+import exportManifest
+import epicTimeRollup
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import datetime
+import os
+import sys
+import jiraClient
+import jiraFields
+
+
+### Constants ###
+
+DONE_STATUS = "Done"
+SPRINT_STATES = "active,closed"
+SCRUM_BOARD_TYPE = "scrum"
+
+# Page sizes of the Agile API; boards and sprints are capped at 50 per page, sprint issues at 100.
+AGILE_PAGE_SIZE = 50
+SPRINT_ISSUE_PAGE_SIZE = 100
+# Number of sprints whose issues are fetched at once.
+MAX_WORKERS = 8
+SINCE_DAYS = 365
+
+AGILE_DATE_FORMAT = "%Y-%m-%d"
+JIRA_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+
+
+### Data Structures ###
+
+@dataclass
+class SprintRollup:
+    sprint: dict
+    issues: []
+    committed_points: float = 0.0
+    completed_points: float = 0.0
+    completed_count: int = 0
+
+    def calculate_points(self):
+        """
+            Committed points are the estimates of every issue in the sprint; completed points only those of the issues
+            done by the time the sprint closed (or so far, for the active sprint).
+        """
+        completed_before = parse_time(self.sprint.get('completeDate'))
+        self.committed_points = 0.0
+        self.completed_points = 0.0
+        self.completed_count = 0
+        for story in self.issues:
+            self.committed_points += story.summed_time
+            if is_completed(story.issue, completed_before):
+                self.completed_points += story.summed_time
+                self.completed_count += 1
+
+    def dict(self):
+        return {'id': self.sprint['id'], 'name': self.sprint.get('name'), 'state': self.sprint.get('state'),
+                'start_date': self.sprint.get('startDate'), 'end_date': self.sprint.get('endDate'), 'complete_date': self.sprint.get('completeDate'),
+                'issue_count': len(self.issues), 'completed_count': self.completed_count,
+                'committed_points': round(self.committed_points, 2), 'completed_points': round(self.completed_points, 2),
+                'issues': [story.dict() for story in self.issues]}
+
+
+@dataclass
+class BoardRollup:
+    board: dict
+    sprints: list = field(default_factory=list)
+
+    def closed_sprints(self):
+        return [sprint for sprint in self.sprints if sprint.sprint.get('state') == 'closed']
+
+    def dict(self):
+        committed_points = sum(sprint.committed_points for sprint in self.sprints)
+        completed_points = sum(sprint.completed_points for sprint in self.sprints)
+        closed_sprints = self.closed_sprints()
+        return {'id': self.board['id'], 'name': self.board.get('name'), 'project_key': self.board.get('location', {}).get('projectKey'),
+                'sprint_count': len(self.sprints), 'committed_points': round(committed_points, 2), 'completed_points': round(completed_points, 2),
+                'completion_ratio': round(completed_points / committed_points, 4) if committed_points != 0 else None,
+                'velocity': round(sum(sprint.completed_points for sprint in closed_sprints) / len(closed_sprints), 2) if len(closed_sprints) > 0 else None,
+                'sprints': [sprint.dict() for sprint in self.sprints]}
+
+
+### Methods ###
+
+def parse_time(value):
+    if value is None:
+        return None
+    return datetime.datetime.strptime(value, JIRA_TIME_FORMAT)
+
+
+def is_completed(issue, completed_before=None):
+    """
+        Whether an issue was done, and resolved no later than completed_before when it is given.
+        issue - the raw sprint issue.
+        completed_before - the time the sprint closed, or None for an active sprint.
+    """
+    if issue.fields.status.name != DONE_STATUS:
+        return False
+    resolved = parse_time(getattr(issue.fields, "resolutiondate", None))
+    return completed_before is None or resolved is None or resolved <= completed_before
+
+
+def agile_pages(jira, path, params=None):
+    """
+        Iterates over the values of a paginated Agile API listing, such as the boards or the sprints of a board.
+        jira - the jira connection.
+        path - the Agile API path.
+        params - the query parameters of the listing.
+    """
+    start_at = 0
+    while True:
+        page_params = dict(params or {})
+        page_params.update({'startAt': start_at, 'maxResults': AGILE_PAGE_SIZE})
+        page = jira._get_json(path, params=page_params, base=jira.AGILE_BASE_URL)
+        for value in page.get('values', []):
+            yield value
+
+        start_at += len(page.get('values', []))
+        if len(page.get('values', [])) == 0 or page.get('isLast', True):
+            break
+
+
+def get_boards(jira, board_ids=None, project_keys=None):
+    """
+        Gets the scrum boards to roll up: the given boards, the boards of the given projects, or every scrum board.
+        jira - the jira connection.
+        board_ids - list of board ids.
+        project_keys - list of project keys.
+    """
+    if board_ids is not None:
+        return [jira._get_json("board/{}".format(board_id), base=jira.AGILE_BASE_URL) for board_id in board_ids]
+
+    boards = []
+    for project_key in (project_keys if project_keys is not None else [None]):
+        params = {'type': SCRUM_BOARD_TYPE}
+        if project_key is not None:
+            params['projectKeyOrId'] = project_key
+        for board in agile_pages(jira, "board", params):
+            if board['id'] not in [seen['id'] for seen in boards]:
+                boards.append(board)
+    return boards
+
+
+def get_board_sprints(jira, board, sprint_states, since):
+    """
+        Gets the sprints of a board in the given states which ended on or after since. Active sprints are always kept.
+        jira - the jira connection.
+        board - the Agile API board.
+        sprint_states - comma separated sprint states.
+        since - the earliest end date of the sprints, as a datetime.
+    """
+    sprints = []
+    for sprint in agile_pages(jira, "board/{}/sprint".format(board['id']), {'state': sprint_states}):
+        ended = parse_time(sprint.get('completeDate') or sprint.get('endDate'))
+        if sprint.get('state') == 'active' or (ended is not None and ended.date() >= since.date()):
+            sprints.append(sprint)
+    return sprints
+
+
+def get_board_project_ids(jira, board):
+    """
+        Gets the ids of the projects whose issues a board shows, as resolved from its filter; the location project of
+        the board is always included.
+        jira - the jira connection.
+        board - the Agile API board.
+    """
+    project_ids = [str(project['id']) for project in agile_pages(
+        jira, "board/{}/project".format(board['id']))]
+    location_project_id = board.get('location', {}).get('projectId')
+    if location_project_id is not None and str(location_project_id) not in project_ids:
+        project_ids.append(str(location_project_id))
+    return project_ids
+
+
+def add_project_configs(jira, project_ids, project_configs, import_project_configs=False, import_project_configs_path=None):
+    """
+        Generates the configuration of every project not in project_configs yet. Returns the ids of the new projects.
+        jira - the jira connection.
+        project_ids - the project ids.
+        project_configs - dictionary of jira project configurations; missing projects are generated and added to it.
+        import_project_configs - whether project configurations should be loaded from file.
+        import_project_configs_path - fully qualified path of the folder containing the project configurations.
+    """
+    new_project_ids = []
+    for project_id in project_ids:
+        if project_id not in project_configs:
+            project_configs[project_id] = epicTimeRollup.generate_project_constants(
+                jira, jira.project(project_id), load_from_file=import_project_configs, configuration_folder_root=import_project_configs_path)
+            new_project_ids.append(project_id)
+    return new_project_ids
+
+
+def sprint_fields(project_configs):
+    """
+        Fields needed of the issues of a sprint, across the projects of the boards.
+        project_configs - dictionary of jira project configurations.
+    """
+    return jiraFields.fields_param(*[jiraFields.child_fields(project_constants).split(",") for project_constants in project_configs.values()],
+                                   jiraFields.BASE_FIELDS, ["subtasks", "resolutiondate"])
+
+
+def fetch_sprint_issues(jira, sprint, fields):
+    """
+        Fetches the issues of a sprint as raw JSON, page by page, with only the given fields.
+        jira - the jira connection.
+        sprint - the Agile API sprint.
+        fields - the fields to return.
+    """
+    raw_issues = []
+    while True:
+        page = jira._get_json("sprint/{}/issue".format(sprint['id']), params={
+            'startAt': len(raw_issues), 'maxResults': SPRINT_ISSUE_PAGE_SIZE, 'fields': fields}, base=jira.AGILE_BASE_URL)
+        raw_issues.extend(epicTimeRollup.RawIssue(raw, jira) for raw in page.get('issues', []))
+        if len(page.get('issues', [])) == 0 or len(raw_issues) >= page.get('total', 0):
+            break
+    return raw_issues
+
+
+def rollup_sprints(jira, sprints, project_configs, max_workers=MAX_WORKERS, force_toplevel_recalculate=False,
+                   import_project_configs=False, import_project_configs_path=None):
+    """
+        Fetches the issues of the sprints concurrently and calculates their committed and completed points, estimating
+        the issues as the epic roll-up does. Subtasks in a sprint are only counted through their stories, and their
+        estimates are taken from the sprint pages instead of being fetched one by one.
+        jira - the jira connection.
+        sprints - the list of Agile API sprints.
+        project_configs - dictionary of jira project configurations; missing projects are generated and added to it.
+        max_workers - the number of sprints fetched at once.
+        force_toplevel_recalculate - whether story level estimates should be recalculated from subtasks.
+        import_project_configs - whether project configurations should be loaded from file.
+        import_project_configs_path - fully qualified path of the folder containing the project configurations.
+    """
+    fields = sprint_fields(project_configs)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        sprint_issues = list(executor.map(
+            lambda sprint: fetch_sprint_issues(jira, sprint, fields), sprints))
+
+        new_project_ids = add_project_configs(jira, [raw_issue.raw['fields']['project']['id'] for raw_issues in sprint_issues for raw_issue in raw_issues],
+                                              project_configs, import_project_configs, import_project_configs_path)
+        # Sprints holding issues of projects the boards did not show may have been fetched without their estimate fields.
+        refetched = [index for index, raw_issues in enumerate(sprint_issues)
+                     if any(raw_issue.raw['fields']['project']['id'] in new_project_ids for raw_issue in raw_issues)]
+        extended_fields = sprint_fields(project_configs)
+        if len(refetched) > 0 and extended_fields != fields:
+            fields = extended_fields
+            for index, raw_issues in zip(refetched, executor.map(lambda index: fetch_sprint_issues(jira, sprints[index], fields), refetched)):
+                sprint_issues[index] = raw_issues
+
+    subtask_estimates = {}
+    for raw_issues in sprint_issues:
+        for raw_issue in raw_issues:
+            if raw_issue.raw['fields']['issuetype'].get('subtask', False):
+                estimate = epicTimeRollup.get_issue_estimator(
+                    project_configs[raw_issue.raw['fields']['project']['id']]).story_estimate(raw_issue.raw['fields'])
+                subtask_estimates[raw_issue.key] = float(estimate) if estimate is not None else None
+
+    sprint_rollups = []
+    for sprint, raw_issues in zip(sprints, sprint_issues):
+        sprint_rollup = SprintRollup(sprint, [])
+        for raw_issue in raw_issues:
+            if raw_issue.raw['fields']['issuetype'].get('subtask', False):
+                continue
+            subtasks = raw_issue.fields.subtasks if hasattr(raw_issue.fields, "subtasks") else []
+            story = epicTimeRollup.UserStory(raw_issue, subtasks, 0.0, {
+                subtask.key: subtask_estimates[subtask.key] for subtask in subtasks if subtask.key in subtask_estimates})
+            epicTimeRollup.extract_issue_estimate(
+                jira, story, project_configs[raw_issue.raw['fields']['project']['id']], force_toplevel_recalculate=force_toplevel_recalculate)
+            sprint_rollup.issues.append(story)
+        sprint_rollup.calculate_points()
+        sprint_rollups.append(sprint_rollup)
+    return sprint_rollups
+
+
+def rollup_boards(jira, boards, project_configs, sprint_states, since, max_workers=MAX_WORKERS, force_toplevel_recalculate=False,
+                  import_project_configs=False, import_project_configs_path=None):
+    """
+        Calculates the sprint roll-up of every board. Returns the list of BoardRollup objects.
+        jira - the jira connection.
+        boards - the list of Agile API boards.
+        project_configs - dictionary of jira project configurations; missing projects are generated and added to it.
+        sprint_states - comma separated sprint states.
+        since - the earliest end date of the sprints, as a datetime.
+        max_workers - the number of boards or sprints fetched at once.
+        force_toplevel_recalculate - whether story level estimates should be recalculated from subtasks.
+        import_project_configs - whether project configurations should be loaded from file.
+        import_project_configs_path - fully qualified path of the folder containing the project configurations.
+    """
+    # The estimate fields of every project the boards show are known up front, so that every sprint page is fetched
+    # with them.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        board_project_ids = list(executor.map(
+            lambda board: get_board_project_ids(jira, board), boards))
+        board_sprints = list(executor.map(
+            lambda board: get_board_sprints(jira, board, sprint_states, since), boards))
+
+    add_project_configs(jira, [project_id for project_ids in board_project_ids for project_id in project_ids],
+                        project_configs, import_project_configs, import_project_configs_path)
+
+    sprints = [sprint for sprints in board_sprints for sprint in sprints]
+    print("Rolling up {} sprints of {} boards.".format(len(sprints), len(boards)))
+    sprint_rollups = iter(rollup_sprints(jira, sprints, project_configs, max_workers, force_toplevel_recalculate,
+                                         import_project_configs, import_project_configs_path))
+
+    return [BoardRollup(board, [next(sprint_rollups) for sprint in sprints]) for board, sprints in zip(boards, board_sprints)]
+
+
+def export_sprints_json(root, board_rollups):
+    """
+        Exports the sprint roll-ups to json.
+        root - the root folder in which to place the output file.
+        board_rollups - the list of BoardRollup objects.
+    """
+    out_file_path = os.path.join(root, "Sprint_estimates.json")
+
+    print("Writing file {}".format(out_file_path))
+    exportManifest.write_json(out_file_path, [board_rollup.dict() for board_rollup in board_rollups])
+
+    print("Finished writing to file.")
+
+
+def parse_args(args_list):
+    """
+    Parse arguments for sprint-rollup.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--api_token", required=True)
+    parser.add_argument("--server", default=jiraClient.DEFAULT_SERVER)
+    parser.add_argument("--boards")
+    parser.add_argument("--projects")
+    parser.add_argument("--since", help="Earliest end date of the sprints, as YYYY-MM-DD; a year ago by default.")
+    parser.add_argument("--sprint_states", default=SPRINT_STATES)
+    parser.add_argument("--max_workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--force_toplevel_recalculate", action='store_true')
+    parser.add_argument("--export_estimates", action='store_true')
+    parser.add_argument("--export_estimates_path")
+    parser.add_argument("--import_project_configs", action='store_true')
+    parser.add_argument("--import_project_configs_path")
+
+    args = parser.parse_args(args=args_list)
+
+    if args.since is not None:
+        try:
+            args.since = datetime.datetime.strptime(args.since, AGILE_DATE_FORMAT)
+        except ValueError:
+            argparse.ArgumentError(
+                "User provided --since {}, which is not a YYYY-MM-DD date.".format(args.since))
+            sys.exit(-2)
+    else:
+        args.since = datetime.datetime.today() - datetime.timedelta(days=SINCE_DAYS)
+
+    if args.export_estimates == True:
+        if args.export_estimates_path is None:
+            argparse.ArgumentError(
+                "User provided --export_estimates, but no value for --export_estimates_path .")
+            sys.exit(-2)
+
+    if args.import_project_configs == True:
+        if args.import_project_configs_path is None:
+            argparse.ArgumentError(
+                "User provided --import_project_configs, but no value for --import_project_configs_path .")
+            sys.exit(-2)
+
+    return args
+
+
+### Main ###
+
+def execute(args_list, jira=None):
+    args = parse_args(args_list)
+    print("Running JIRA Tabulations for Sprints")
+    owns_client = jira is None
+    if owns_client:
+        jira = jiraClient.connect(args.user, args.api_token, args.server)
+
+    boards = get_boards(jira, args.boards.split(",") if args.boards is not None else None,
+                        args.projects.split(",") if args.projects is not None else None)
+
+    project_configs = {}
+    board_rollups = rollup_boards(jira, boards, project_configs, args.sprint_states, args.since, args.max_workers,
+                                  args.force_toplevel_recalculate, args.import_project_configs, args.import_project_configs_path)
+
+    print("{:<30} {:<30} {:>10} {:>10}".format(
+        "board", "sprint", "committed", "completed"))
+    for board_rollup in board_rollups:
+        for sprint_rollup in board_rollup.sprints:
+            print("{:<30} {:<30} {:>10} {:>10}".format(str(board_rollup.board.get('name'))[:30], str(sprint_rollup.sprint.get('name'))[:30],
+                                                       round(sprint_rollup.committed_points, 2), round(sprint_rollup.completed_points, 2)))
+
+    if args.export_estimates:
+        export_sprints_json(args.export_estimates_path, board_rollups)
+
+    if owns_client:
+        jira.print_cache_report()
+
+    return board_rollups
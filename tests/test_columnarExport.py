@@ -0,0 +1,81 @@
+import csv
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import columnarExport
+import initiativeTimeRollup
+from jira.resources import Issue
+from test_rollupWebhook import EPIC_TYPE_ID, STORY_TYPE_ID, TASK_TYPE_ID, build_epic, raw_issue
+
+
+### Tests ###
+
+class ColumnarExportTest(unittest.TestCase):
+    """
+        Flattens an initiative, its epics and their issues into tables, written in small batches.
+    """
+
+    def setUp(self):
+        self.epics = [build_epic("P-1", [(raw_issue("P-10", TASK_TYPE_ID, 3.0, "P-1"), []),
+                                         (raw_issue("P-11", STORY_TYPE_ID, None,
+                                                    "P-1", ["P-12", "P-13"]), [2.0, 1.0]),
+                                         (raw_issue("P-14", STORY_TYPE_ID, 8.0, "P-1", status="Done"), [])]),
+                      build_epic("P-2", [(raw_issue("P-20", TASK_TYPE_ID, None, "P-2"), [])])]
+        self.initiative = initiativeTimeRollup.Initiative(Issue({}, None, raw_issue(
+            "FRONT-1", EPIC_TYPE_ID, linked_epics=["P-1", "P-2"])), self.epics, 0.0, 0.0, 0, 0, 0.0, 5, 25)
+        self.initiative.calculate_estimate_counts()
+
+    def export(self, columnar_format, batch_size):
+        root = tempfile.mkdtemp()
+        columnar_export = columnarExport.ColumnarExport(
+            root, columnar_format, batch_size)
+        columnar_export.add_initiatives([self.initiative])
+        columnar_export.close()
+        return root
+
+    def test_csv_tables(self):
+        root = self.export(columnarExport.CSV_FORMAT, 2)
+
+        with open(os.path.join(root, "issues.csv"), "rb") as read_file:
+            content = read_file.read()
+        self.assertTrue(content.startswith(
+            b"key,epic_key,release,project_key,issue_type,status,summary,estimate,done,subtask_count\r\n"))
+        self.assertNotIn(b"\r\r\n", content)
+        with open(os.path.join(root, "issues.csv"), "r", newline='') as read_file:
+            self.assertEqual([row[0:2] + row[7:] for row in csv.reader(read_file)][1:],
+                             [["P-10", "P-1", "3.0", "False", "0"], ["P-11", "P-1", "3.0", "False", "2"],
+                              ["P-14", "P-1", "8.0", "True", "0"], ["P-20", "P-2", "0.0", "False", "0"]])
+        with open(os.path.join(root, "epics.csv"), "r", newline='') as read_file:
+            rows = list(csv.reader(read_file))
+        # Counts are written as integers, although the roll-ups count in floats.
+        self.assertEqual([row[0:2] + row[5:10] for row in rows[1:]], [["P-1", "FRONT-1", "14.0", "6.0", "3", "2", "0"],
+                                                                      ["P-2", "FRONT-1", "0.0", "0.0", "1", "0", "1"]])
+        with open(os.path.join(root, "initiatives.csv"), "r", newline='') as read_file:
+            rows = list(csv.reader(read_file))
+        self.assertEqual(rows[1][0:1] + rows[1][4:9], ["FRONT-1", "14.0", "6.0", "2", "2", "1"])
+
+    @unittest.skipIf(columnarExport.pyarrow is None, "pyarrow is not installed")
+    def test_parquet_tables_match_csv_tables(self):
+        csv_root = self.export(columnarExport.CSV_FORMAT, 2)
+        parquet_root = self.export(columnarExport.PARQUET_FORMAT, 2)
+
+        for table_name in [columnarExport.ISSUES_TABLE, columnarExport.EPICS_TABLE, columnarExport.INITIATIVES_TABLE]:
+            parquet_file = columnarExport.pyarrow.parquet.ParquetFile(
+                os.path.join(parquet_root, "{}.parquet".format(table_name)))
+            table = parquet_file.read()
+            self.assertEqual(table.column_names, [column for column, column_type in columnarExport.TABLE_COLUMNS[table_name]])
+            self.assertEqual(parquet_file.num_row_groups, (table.num_rows + 1) // 2)
+            with open(os.path.join(csv_root, "{}.csv".format(table_name)), "r", newline='') as read_file:
+                csv_rows = list(csv.reader(read_file))[1:]
+            parquet_rows = [["" if value is None else str(value) for value in row.values()]
+                            for row in table.to_pylist()]
+            self.assertEqual(parquet_rows, csv_rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
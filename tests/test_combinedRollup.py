@@ -0,0 +1,144 @@
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import combinedRollup
+import epicTimeRollup
+import initiativeTimeRollup
+import jiraFields
+import releaseTimeRollup
+from jira.resources import Issue
+from test_rollupWebhook import EPIC_TYPE_ID, STORY_TYPE_ID, SUBTASK_TYPE_ID, TASK_TYPE_ID, project_constants, raw_issue
+
+
+### Constants ###
+
+BASE_ARGS = ["--user", "u", "--api_token", "t"]
+
+
+### Data Structures ###
+
+class PlanJira:
+    """
+        Answers the issue fetches and the child, release and key searches of the roll-ups from raw issues, and records
+        every search.
+    """
+
+    def __init__(self, issues, children, releases):
+        self.issues = issues
+        self.children = children
+        self.releases = releases
+        self.searches = []
+
+    def issue(self, key, fields=None):
+        return Issue({}, None, self.issues[key])
+
+    def search_issues(self, query_string, startAt=0, maxResults=50, fields=None):
+        self.searches.append(query_string)
+        if query_string.startswith("key in"):
+            keys = query_string[len("key in ("):-1].split(",")
+            matches = [raw for raws in self.releases.values() for raw in raws if raw['key'] in keys]
+        elif query_string.startswith("fixVersion="):
+            matches = self.releases[query_string.split("=")[1]]
+        else:
+            matches = self.children[query_string.split("=")[1]]
+        return [Issue({}, None, raw) for raw in matches]
+
+    def project(self, project_id):
+        return types.SimpleNamespace(id=project_id, key="P")
+
+    def print_cache_report(self):
+        pass
+
+
+### Methods ###
+
+def scheduled(raw, start_date, due_date):
+    raw['fields'][jiraFields.START_DATE_KEY] = start_date
+    raw['fields']['duedate'] = due_date
+    raw['fields'][jiraFields.INITIAL_TIME_KEY] = None
+    return raw
+
+
+def read_exports(root):
+    exports = {}
+    for folder, folder_names, file_names in os.walk(root):
+        for file_name in file_names:
+            if not file_name.startswith("."):
+                with open(os.path.join(folder, file_name), "rb") as read_file:
+                    exports[os.path.relpath(os.path.join(folder, file_name), root)] = read_file.read()
+    return exports
+
+
+### Tests ###
+
+class CombinedRollupTest(unittest.TestCase):
+    """
+        Runs the epic, initiative and release roll-ups separately and combined, against the same issues.
+    """
+
+    def setUp(self):
+        issues = {}
+        children = {}
+        for index in range(1, 6):
+            key = "P-{}".format(index)
+            issues[key] = scheduled(raw_issue(key, EPIC_TYPE_ID), "2020-0{}-01".format(index), "2031-0{}-28".format(index))
+            children[key] = []
+            for child in range(index * 3):
+                child_key = "{}-{}".format(key, child)
+                type_id = [STORY_TYPE_ID, TASK_TYPE_ID][child % 2]
+                subtasks = ["{}-{}".format(child_key, subtask) for subtask in range(child % 3)] if type_id == STORY_TYPE_ID else []
+                for subtask_key in subtasks:
+                    issues[subtask_key] = raw_issue(subtask_key, SUBTASK_TYPE_ID, 1.5, child_key)
+                children[key].append(raw_issue(child_key, type_id, [None, 2.0, 3.0][child % 3], key, subtasks,
+                                               "Done" if child % 4 == 0 else "To Do"))
+        for key, linked_epics in [("FRONT-1", ["P-1", "P-2", "P-3"]), ("FRONT-2", ["P-3", "P-4"])]:
+            issues[key] = scheduled(raw_issue(key, EPIC_TYPE_ID, linked_epics=linked_epics, status="In Progress"), "2020-01-01", "2032-12-31")
+        issues["FRONT-3"] = scheduled(raw_issue("FRONT-3", EPIC_TYPE_ID, status="Initial Estimation", linked_epics=[]), None, None)
+        issues["FRONT-3"]['fields'][jiraFields.INITIAL_TIME_KEY] = 8.0
+        # The release holds issues of fetched epics, and one issue of an epic no roll-up fetches.
+        releases = {"R1": [children["P-2"][1], children["P-4"][2], children["P-5"][0], raw_issue("P-9-1", TASK_TYPE_ID, 2.0, "P-9")]}
+        self.make_jira = lambda: PlanJira(issues, children, releases)
+
+    def test_combined_exports_match_separate_exports(self):
+        separate_root = tempfile.mkdtemp()
+        combined_root = tempfile.mkdtemp()
+        for folder in ["epics", "initiatives", "releases"]:
+            os.mkdir(os.path.join(separate_root, folder))
+        separate_jira = self.make_jira()
+        combined_jira = self.make_jira()
+
+        with mock.patch.object(epicTimeRollup, "generate_project_constants", lambda jira, project, **kwargs: project_constants()):
+            epicTimeRollup.execute(BASE_ARGS + ["--epics", "P-5,P-1", "--export_estimates", "--export_estimates_path",
+                                                os.path.join(separate_root, "epics")], separate_jira)
+            initiativeTimeRollup.execute(BASE_ARGS + ["--initiatives", "FRONT-1,FRONT-2,FRONT-3", "--create_calendar_schedule", "--export_estimates",
+                                                      "--export_estimates_path", os.path.join(separate_root, "initiatives")], separate_jira)
+            releaseTimeRollup.execute(BASE_ARGS + ["--releases", "R1", "--export_estimates", "--export_estimates_path",
+                                                   os.path.join(separate_root, "releases")], separate_jira)
+            combined = combinedRollup.execute(BASE_ARGS + ["--epics", "P-5,P-1", "--initiatives", "FRONT-1,FRONT-2,FRONT-3", "--releases", "R1",
+                                                           "--create_calendar_schedule", "--export_estimates", "--export_estimates_path", combined_root], combined_jira)
+
+        separate_exports = read_exports(separate_root)
+        self.assertIn(os.path.join("initiatives", "Calendar_estimates.json"), separate_exports)
+        self.assertEqual(read_exports(combined_root), separate_exports)
+        self.assertEqual([epic.epic.key for epic in combined.epics], ["P-5", "P-1"])
+        # Every epic is searched once, and the release only searches for the issue no epic fetched.
+        self.assertEqual(combined_jira.searches, ["parent=P-5", "parent=P-1", "parent=P-2", "parent=P-3", "parent=P-4",
+                                                  "fixVersion=R1", "key in (P-9-1)"])
+        self.assertLess(len(combined_jira.searches), len(separate_jira.searches))
+
+    def test_plan_resolves_initiatives_to_their_epics(self):
+        plan = combinedRollup.plan_rollups(self.make_jira(), ["P-5", "P-3"], ["FRONT-1", "FRONT-2", "FRONT-3"], False, [])
+
+        self.assertEqual(plan.all_epic_keys(), ["P-5", "P-3", "P-1", "P-2", "P-4"])
+        self.assertNotIn("FRONT-3", plan.initiative_epic_keys)
+
+
+if __name__ == "__main__":
+    unittest.main()
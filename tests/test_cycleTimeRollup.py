@@ -0,0 +1,187 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cycleTimeRollup
+import jiraClient
+from jira.client import ResultList
+from jira.resources import Issue
+from test_rollupWebhook import EPIC_TYPE_ID, ESTIMATION_KEY, PROJECT_ID, STORY_TYPE_ID, project_constants, raw_issue
+
+
+### Constants ###
+
+UPDATED = "2020-02-01T00:00:00.000+0000"
+
+
+### Data Structures ###
+
+class ChangelogJira:
+    """
+        Answers the child and changelog searches of the cycle-time roll-up from raw issues, in pages capped below the
+        requested size, and records what was searched.
+    """
+
+    def __init__(self, issues, page_cap=100, changelog_pages=None):
+        self.issues = issues
+        self.page_cap = page_cap
+        self.changelog_pages = changelog_pages or {}
+        self.searches = []
+
+    def search_issues(self, query_string, startAt=0, maxResults=50, fields=None, expand=None):
+        self.searches.append((query_string, startAt, expand))
+        if query_string.startswith("parent in"):
+            matches = [raw for raw in self.issues if raw['fields']['parent']['key'] in query_string]
+        else:
+            keys = query_string[len("key in ("):-1].split(",")
+            matches = [raw for raw in self.issues if raw['key'] in keys]
+        return ResultList([Issue({}, None, raw) for raw in matches[startAt:startAt + min(maxResults, self.page_cap)]], _total=len(matches))
+
+    def _get_json(self, path, params=None):
+        return self.changelog_pages[path]
+
+
+### Methods ###
+
+def history(created, *items):
+    return {'created': created, 'items': [{'field': field, 'fieldId': field_id, 'fromString': from_string, 'toString': to_string}
+                                          for field, field_id, from_string, to_string in items]}
+
+
+def changelog_issue(key, estimate, status, histories, total=None, updated=UPDATED):
+    raw = raw_issue(key, STORY_TYPE_ID, estimate, "P-1", status=status)
+    raw['fields']['created'] = "2020-01-01T00:00:00.000+0000"
+    raw['fields']['updated'] = updated
+    raw['changelog'] = {'total': total if total is not None else len(histories), 'histories': histories}
+    return raw
+
+
+### Tests ###
+
+class SummarizeChangelogTest(unittest.TestCase):
+    """
+        Summarizes the changelogs of single issues.
+    """
+
+    def test_histories_are_summarized_in_time_order(self):
+        raw = changelog_issue("P-2", 5.0, "Done", [
+            history("2020-01-05T00:00:00.000+0000", ('status', None, 'To Do', 'In Progress'),
+                    ('Story point estimate', ESTIMATION_KEY, '3', '5')),
+            history("2020-01-03T00:00:00.000+0000",
+                    (ESTIMATION_KEY, ESTIMATION_KEY, None, '3')),
+            history("2020-01-09T00:00:00.000+0000", ('status', None, 'In Progress', 'Done'))])
+
+        issue_cycle = cycleTimeRollup.summarize_changelog(
+            None, Issue({}, None, raw), project_constants())
+
+        self.assertEqual(issue_cycle.started, "2020-01-05T00:00:00.000+0000")
+        self.assertEqual(issue_cycle.completed, "2020-01-09T00:00:00.000+0000")
+        self.assertEqual(issue_cycle.cycle_days(), 4.0)
+        # The first estimate set on an unestimated issue is its initial estimate, not a change.
+        self.assertEqual((issue_cycle.initial_estimate, issue_cycle.final_estimate,
+                          issue_cycle.estimate_changes), (3.0, 5.0, 1))
+        self.assertEqual(issue_cycle.estimate_drift(), 2.0)
+
+    def test_reopened_issue_is_not_completed(self):
+        raw = changelog_issue("P-2", None, "In Progress", [
+            history("2020-01-02T00:00:00.000+0000", ('status', None, 'To Do', 'Done')),
+            history("2020-01-04T00:00:00.000+0000", ('status', None, 'Done', 'In Progress'))])
+
+        issue_cycle = cycleTimeRollup.summarize_changelog(
+            None, Issue({}, None, raw), project_constants())
+
+        self.assertEqual(issue_cycle.started, "2020-01-02T00:00:00.000+0000")
+        self.assertIsNone(issue_cycle.completed)
+        self.assertIsNone(issue_cycle.cycle_days())
+
+    def test_remaining_changelog_pages_are_fetched(self):
+        raw = changelog_issue("P-2", 2.0, "Done", [
+            history("2020-01-02T00:00:00.000+0000", ('status', None, 'To Do', 'In Progress'))], total=3)
+        jira = ChangelogJira([], changelog_pages={"issue/P-2/changelog": {'values': [
+            history("2020-01-03T00:00:00.000+0000", ('status', None, 'In Progress', 'Review')),
+            history("2020-01-06T00:00:00.000+0000", ('status', None, 'Review', 'Done'))], 'isLast': True}})
+
+        issue_cycle = cycleTimeRollup.summarize_changelog(
+            jira, Issue({}, None, raw), project_constants())
+
+        self.assertEqual(issue_cycle.completed, "2020-01-06T00:00:00.000+0000")
+        self.assertEqual(issue_cycle.cycle_days(), 4.0)
+
+
+class SearchPagesTest(unittest.TestCase):
+    """
+        Pages through the results of a search.
+    """
+
+    def test_capped_pages_are_followed_to_the_total(self):
+        issues = [changelog_issue("P-{}".format(index), None, "To Do", [])
+                  for index in range(2, cycleTimeRollup.SEARCH_PAGE_SIZE + 32)]
+        jira = ChangelogJira(issues, page_cap=50)
+
+        found = list(cycleTimeRollup.search_pages(
+            jira, "parent in (P-1) ORDER BY key ASC", "parent,updated"))
+
+        self.assertEqual([issue.key for issue in found], [raw['key'] for raw in issues])
+        self.assertEqual([start_at for query_string, start_at, expand in jira.searches], [0, 50, 100])
+
+    def test_pages_bypass_the_request_memo(self):
+        jira = jiraClient.CachingJira(ChangelogJira(
+            [changelog_issue("P-2", None, "To Do", [])]))
+
+        list(cycleTimeRollup.search_pages(jira, "parent in (P-1) ORDER BY key ASC", "parent,updated"))
+
+        self.assertEqual(jira.responses, {})
+        self.assertEqual(len(jira.jira.searches), 1)
+
+
+class RollupCycleTimesTest(unittest.TestCase):
+    """
+        Rolls up the cycle times of an epic against a changelog cache kept between runs.
+    """
+
+    def setUp(self):
+        self.epic_issue = Issue({}, None, raw_issue("P-1", EPIC_TYPE_ID))
+        self.project_configs = {PROJECT_ID: project_constants()}
+
+    def test_only_updated_issues_are_fetched_again(self):
+        cache_path = os.path.join(tempfile.mkdtemp(), "cycles.json")
+        issues = [changelog_issue("P-2", 3.0, "Done", [history("2020-01-02T00:00:00.000+0000", ('status', None, 'To Do', 'Done'))]),
+                  changelog_issue("P-3", None, "To Do", [])]
+        cycle_cache = cycleTimeRollup.load_cycle_cache(cache_path)
+        cycleTimeRollup.rollup_cycle_times(ChangelogJira(
+            issues), [self.epic_issue], self.project_configs, cycle_cache)
+        cycleTimeRollup.save_cycle_cache(cache_path, cycle_cache)
+
+        issues[1] = changelog_issue("P-3", 1.0, "In Progress", [history("2020-02-02T00:00:00.000+0000", ('status', None, 'To Do', 'In Progress'))],
+                                    updated="2020-02-02T00:00:00.000+0000")
+        jira = ChangelogJira(issues)
+        epic_cycles = cycleTimeRollup.rollup_cycle_times(
+            jira, [self.epic_issue], self.project_configs, cycleTimeRollup.load_cycle_cache(cache_path))
+
+        self.assertEqual([query_string for query_string, start_at, expand in jira.searches if expand == "changelog"], ["key in (P-3)"])
+        self.assertEqual([issue.dict() for issue in epic_cycles[0].issues], [
+            cycle_cache["P-2"].dict(), cycleTimeRollup.summarize_changelog(None, Issue({}, None, issues[1]), project_constants()).dict()])
+
+    def test_cache_of_another_version_is_ignored(self):
+        cache_path = os.path.join(tempfile.mkdtemp(), "cycles.json")
+        cycle_cache = {}
+        cycleTimeRollup.rollup_cycle_times(ChangelogJira(
+            [changelog_issue("P-2", 3.0, "To Do", [])]), [self.epic_issue], self.project_configs, cycle_cache)
+        cycleTimeRollup.save_cycle_cache(cache_path, cycle_cache)
+        self.assertEqual(list(cycleTimeRollup.load_cycle_cache(cache_path)), ["P-2"])
+
+        with open(cache_path, "r") as read_file:
+            content = read_file.read()
+        with open(cache_path, "w") as output_file:
+            output_file.write(content.replace('"version":{}'.format(
+                cycleTimeRollup.CYCLE_CACHE_VERSION), '"version":0'))
+
+        self.assertEqual(cycleTimeRollup.load_cycle_cache(cache_path), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import datetime
+import os
+import sys
+import unittest
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import deliveryForecast
+import initiativeTimeRollup
+import jiraFields
+from jira.resources import Issue
+from test_rollupWebhook import EPIC_TYPE_ID, STORY_TYPE_ID, TASK_TYPE_ID, build_epic, raw_issue
+
+
+### Constants ###
+
+TODAY = datetime.datetime(2026, 1, 15)
+
+
+### Methods ###
+
+def scheduled_initiative(estimation_confidence):
+    """
+        Builds an initiative of two epics due within the next months, with some of their issues unestimated.
+    """
+    epics = [build_epic("P-1", [(raw_issue("P-10", TASK_TYPE_ID, 3.0, "P-1"), []),
+                                (raw_issue("P-11", STORY_TYPE_ID, 5.0, "P-1"), []),
+                                (raw_issue("P-12", TASK_TYPE_ID, None, "P-1"), [])]),
+             build_epic("P-2", [(raw_issue("P-20", TASK_TYPE_ID, None, "P-2"), []),
+                                (raw_issue("P-21", TASK_TYPE_ID, None, "P-2"), [])])]
+    for epic, start_date, due_date in zip(epics, ["2026-01-01", "2026-02-01"], ["2026-02-28", "2026-04-15"]):
+        setattr(epic.epic.fields, jiraFields.START_DATE_KEY, start_date)
+        epic.epic.fields.duedate = due_date
+    raw = raw_issue("FRONT-1", EPIC_TYPE_ID, linked_epics=["P-1", "P-2"])
+    raw['fields'][jiraFields.START_DATE_KEY] = "2026-01-01"
+    raw['fields']['duedate'] = "2026-04-30"
+    initiative = initiativeTimeRollup.Initiative(
+        Issue({}, None, raw), epics, 0.0, 0.0, 0, 0, 0.0, 5, 25)
+    initiative.calculate_estimate_counts()
+    initiative.estimation_confidence = estimation_confidence
+    return initiative
+
+
+### Tests ###
+
+class SampleRemainingTimeTest(unittest.TestCase):
+    """
+        Samples the remaining time of scheduled epics.
+    """
+
+    def test_unestimated_issues_are_sampled_at_the_average_size(self):
+        epic_schedules, skipped_epics = initiativeTimeRollup.calculate_epic_schedules(
+            [scheduled_initiative(50.0)], TODAY)
+
+        samples, expected_times = deliveryForecast.sample_remaining_time(
+            epic_schedules, 20000, 5, numpy.random.RandomState(1))
+
+        self.assertEqual(skipped_epics, [])
+        self.assertEqual(samples.shape, (20000, 2))
+        # P-1 averages 4 per estimated issue; P-2 has no estimated issue, so its issues are sized at the weight.
+        self.assertEqual(list(expected_times), [12.0, 10.0])
+        self.assertAlmostEqual(samples[:, 1].mean(), 10.0, delta=0.2)
+        self.assertTrue((samples >= 0).all())
+
+    def test_noise_narrows_with_confidence(self):
+        spreads = []
+        for estimation_confidence in [0.0, 95.0]:
+            epic_schedules, skipped_epics = initiativeTimeRollup.calculate_epic_schedules(
+                [scheduled_initiative(estimation_confidence)], TODAY)
+            samples, expected_times = deliveryForecast.sample_remaining_time(
+                epic_schedules, 20000, 5, numpy.random.RandomState(1))
+            spreads.append(numpy.percentile(samples[:, 0], 85) - numpy.percentile(samples[:, 0], 15))
+
+        self.assertLess(spreads[1], spreads[0] / 2)
+
+    def test_initial_estimation_is_not_counted_twice(self):
+        raw = raw_issue("FRONT-2", EPIC_TYPE_ID)
+        raw['fields']['status'] = {'name': 'Initial Estimation'}
+        raw['fields'][jiraFields.INITIAL_TIME_KEY] = 40.0
+        initiative = initiativeTimeRollup.calculate_initial_estimation(
+            Issue({}, None, raw), jiraFields.INITIAL_TIME_KEY, 5, 25)
+        today = datetime.datetime(2026, 1, 1)
+        schedules = [initiativeTimeRollup.EpicSchedule(
+            initiative, initiative.epics[0], today, today, today, [])]
+
+        samples, expected_times = deliveryForecast.sample_remaining_time(
+            schedules, 20000, 5, numpy.random.RandomState(1))
+
+        self.assertEqual(list(expected_times), [40.0])
+        # The log-normal noise has a median of 1, and nothing is sampled for unestimated issues.
+        self.assertAlmostEqual(numpy.median(samples[:, 0]), 40.0, delta=1.0)
+
+
+class ForecastDeliveryTest(unittest.TestCase):
+    """
+        Forecasts the delivery of an initiative on top of its capacity calendar.
+    """
+
+    def setUp(self):
+        self.epic_schedules, skipped_epics = initiativeTimeRollup.calculate_epic_schedules(
+            [scheduled_initiative(50.0)], TODAY)
+
+    def test_months_follow_the_calendar(self):
+        forecast = deliveryForecast.forecast_delivery(
+            self.epic_schedules, 5000, [50, 85], 5, TODAY, 7)
+        month_distributions = initiativeTimeRollup.calculate_capacity_calendar(
+            self.epic_schedules)
+
+        self.assertEqual(list(forecast['months']), list(month_distributions))
+        for month_key, month_forecast in forecast['months'].items():
+            self.assertAlmostEqual(month_forecast['point_estimate'], sum(
+                commitment.time for commitment in month_distributions[month_key].remaining_time), delta=0.02)
+            self.assertLessEqual(month_forecast['p50'], month_forecast['p85'])
+
+    def test_seeded_forecast_is_reproducible(self):
+        forecast = deliveryForecast.forecast_delivery(
+            self.epic_schedules, 5000, [50, 85], 5, TODAY, 7)
+
+        self.assertEqual(forecast, deliveryForecast.forecast_delivery(
+            self.epic_schedules, 5000, [50, 85], 5, TODAY, 7))
+        completion_dates = forecast['initiatives']['FRONT-1']['completion_dates']
+        self.assertLessEqual(completion_dates['p50'], completion_dates['p85'])
+        self.assertGreater(completion_dates['p50'], TODAY.strftime("%Y-%m-%d"))
+
+    def test_nothing_scheduled(self):
+        self.assertEqual(deliveryForecast.forecast_delivery([], 5000, [50], 5, TODAY, 7), {
+                         'scenarios': 5000, 'months': {}, 'initiatives': {}})
+
+
+if __name__ == "__main__":
+    unittest.main()
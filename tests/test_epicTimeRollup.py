@@ -0,0 +1,147 @@
+import copy
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import epicTimeRollup
+from jira.resources import Issue
+from test_rollupWebhook import EPIC_TYPE_ID, PROJECT_ID, STORY_TYPE_ID, SUBTASK_TYPE_ID, TASK_TYPE_ID, project_constants, raw_issue
+
+
+### Constants ###
+
+OTHER_PROJECT_ID = "2"
+
+
+### Data Structures ###
+
+class FetchingJira:
+    """
+        Answers the issue fetches and child issue searches of a roll-up from raw issues, as jira resources or as raw
+        JSON pages; issues which are not known fail to fetch.
+    """
+    _options = {}
+    _session = None
+
+    def __init__(self, epics, children):
+        self.epics = epics
+        self.children = children
+
+    def issue(self, key, fields=None):
+        return Issue({}, None, self.epics[key])
+
+    def search_issues(self, query_string, startAt=0, maxResults=False, fields=None, json_result=False):
+        children = self.children.get(query_string.split("=")[1], [])
+        if json_result:
+            # Raw searches are single pages.
+            return {'startAt': startAt, 'total': len(children), 'issues': copy.deepcopy(children[startAt:startAt + maxResults])}
+        return [Issue({}, None, raw) for raw in children]
+
+
+### Methods ###
+
+def other_project_issue(raw):
+    raw['fields']['project'] = {'id': OTHER_PROJECT_ID, 'key': 'Q'}
+    return raw
+
+
+### Tests ###
+
+class StreamEpicsTest(unittest.TestCase):
+    """
+        Rolls up the same epics staged and streamed, and compares the exports.
+    """
+
+    def setUp(self):
+        epics = {}
+        children = {}
+        for index in range(1, 13):
+            key = "P-{}".format(index * 100)
+            epics[key] = raw_issue(key, EPIC_TYPE_ID)
+            children[key] = [raw_issue("P-{}".format(index * 100 + child), STORY_TYPE_ID if child % 2 else TASK_TYPE_ID, float(child) if child % 3 else None, key,
+                                       status="Done" if child % 4 == 0 else "To Do") for child in range(1, index % 5 + 1)]
+        for index in range(1, 4):
+            key = "Q-{}".format(index)
+            epics[key] = other_project_issue(raw_issue(key, EPIC_TYPE_ID))
+            children[key] = [other_project_issue(
+                raw_issue("Q-{}".format(index * 10), TASK_TYPE_ID, 2.0 * index, key))]
+        self.jira = FetchingJira(epics, children)
+        self.epics = ["P-100", "Q-1", "P-200", "P-404"] + \
+            [key for key in epics if key not in ("P-100", "Q-1", "P-200")]
+
+    def project_configs(self):
+        return {PROJECT_ID: project_constants(), OTHER_PROJECT_ID: project_constants()}
+
+    def test_streamed_export_matches_staged_export(self):
+        staged_path = tempfile.mkdtemp()
+        streamed_path = tempfile.mkdtemp()
+
+        epics_container = epicTimeRollup.rollup_epics(
+            self.jira, self.epics, self.project_configs())
+        epicTimeRollup.export_epics_json(staged_path, epics_container)
+        streamed_epics = []
+        epic_count = epicTimeRollup.stream_epics(self.jira, self.epics, self.project_configs(), streamed_path, queue_size=2,
+                                                 on_epic=lambda epic_container: streamed_epics.append(epic_container.epic.key))
+
+        self.assertEqual(epic_count, len(epics_container))
+        self.assertEqual(streamed_epics, [
+                         epic_container.epic.key for epic_container in epics_container])
+        self.assertEqual(sorted(os.listdir(staged_path)),
+                         sorted(os.listdir(streamed_path)))
+        for file_name in ["P_estimates.json", "Q_estimates.json"]:
+            with open(os.path.join(staged_path, file_name), 'rb') as staged_file, open(os.path.join(streamed_path, file_name), 'rb') as streamed_file:
+                self.assertEqual(staged_file.read(), streamed_file.read())
+
+    def test_export_failure_is_raised(self):
+        # The export folder is a file, so the exporter fails on its first epic.
+        export_path = os.path.join(tempfile.mkdtemp(), "estimates")
+        with open(export_path, "w") as output_file:
+            output_file.write("")
+
+        with self.assertRaises(Exception):
+            epicTimeRollup.stream_epics(
+                self.jira, self.epics, self.project_configs(), export_path, queue_size=1)
+
+
+class RawIssuesTest(unittest.TestCase):
+    """
+        Rolls up the same epics from jira resources and from raw JSON pages, and compares the roll-ups.
+    """
+
+    def setUp(self):
+        epics = {}
+        children = {}
+        for index in range(1, 6):
+            key = "P-{}".format(index)
+            epics[key] = raw_issue(key, EPIC_TYPE_ID)
+            children[key] = []
+            for child in range(index * 60):
+                child_key = "{}-{}".format(key, child)
+                type_id = [STORY_TYPE_ID, TASK_TYPE_ID, "14"][child % 3]
+                subtasks = ["{}-{}".format(child_key, subtask) for subtask in range(child % 4)] if type_id == STORY_TYPE_ID else []
+                for subtask_key in subtasks:
+                    epics[subtask_key] = raw_issue(subtask_key, SUBTASK_TYPE_ID, [None, 1.0, 2.5][len(subtask_key) % 3], child_key)
+                children[key].append(raw_issue(child_key, type_id, [None, 0.0, 3.0, 5.5][child % 4], key, subtasks,
+                                               "Done" if child % 5 == 0 else "To Do"))
+        self.jira = FetchingJira(epics, children)
+        self.epics = list(children)
+
+    def test_raw_rollups_match_resource_rollups(self):
+        for force_toplevel_recalculate in [False, True]:
+            epics_container = epicTimeRollup.rollup_epics(
+                self.jira, self.epics, {PROJECT_ID: project_constants()}, force_toplevel_recalculate=force_toplevel_recalculate)
+            raw_epics_container = epicTimeRollup.rollup_epics(
+                self.jira, self.epics, {PROJECT_ID: project_constants()}, force_toplevel_recalculate=force_toplevel_recalculate, raw_issues=True)
+
+            self.assertEqual(sum(len(epic.issues) for epic in raw_epics_container), 900)
+            self.assertEqual(json.dumps([epic.dict() for epic in raw_epics_container]),
+                             json.dumps([epic.dict() for epic in epics_container]))
+
+
+if __name__ == "__main__":
+    unittest.main()
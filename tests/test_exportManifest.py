@@ -0,0 +1,116 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import exportManifest
+
+
+### Tests ###
+
+class ExportManifestTest(unittest.TestCase):
+    """
+        Exports files into a folder twice, as two runs would, and checks what the manifest rewrote and removed.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def export_path(self, file_name):
+        return os.path.join(self.root, file_name)
+
+    def test_unchanged_files_are_not_rewritten(self):
+        first_run = exportManifest.ExportManifest(self.root)
+        self.assertTrue(first_run.write("A_estimates.json", "[1]"))
+        self.assertTrue(first_run.write("B_estimates.json", "[2]"))
+        os.utime(self.export_path("A_estimates.json"), (0, 0))
+
+        second_run = exportManifest.ExportManifest(self.root)
+        self.assertFalse(second_run.write("A_estimates.json", "[1]"))
+        self.assertTrue(second_run.write("B_estimates.json", "[3]"))
+
+        self.assertEqual(os.path.getmtime(self.export_path("A_estimates.json")), 0)
+        with open(self.export_path("B_estimates.json"), "r") as read_file:
+            self.assertEqual(read_file.read(), "[3]")
+        self.assertEqual((second_run.changed, second_run.unchanged), (["B_estimates.json"], ["A_estimates.json"]))
+        with open(self.export_path(exportManifest.MANIFEST_NAME), "r") as read_file:
+            self.assertEqual(json.loads(read_file.read())['changed'], ["B_estimates.json"])
+
+    def test_files_exported_before_the_manifest_are_hashed(self):
+        with open(self.export_path("A_estimates.json"), "w") as output_file:
+            output_file.write("[1]")
+
+        manifest = exportManifest.ExportManifest(self.root)
+
+        self.assertFalse(manifest.write("A_estimates.json", "[1]"))
+        self.assertTrue(manifest.write("A_estimates.json", "[2]"))
+
+    def test_stale_files_are_removed(self):
+        first_run = exportManifest.ExportManifest(self.root)
+        first_run.write("A_estimates.json", "[1]")
+        first_run.write("B_estimates.json", "[2]")
+        with open(self.export_path("notes.txt"), "w") as output_file:
+            output_file.write("not an export")
+
+        second_run = exportManifest.ExportManifest(self.root)
+        second_run.write("A_estimates.json", "[1]")
+        second_run.remove_stale()
+
+        self.assertEqual(sorted(os.listdir(self.root)), sorted(
+            ["A_estimates.json", "notes.txt", exportManifest.MANIFEST_NAME]))
+        self.assertEqual(second_run.removed, ["B_estimates.json"])
+        self.assertEqual(list(exportManifest.ExportManifest(self.root).files), ["A_estimates.json"])
+
+    def test_hashing_writer_replaces_changed_files_only(self):
+        out_file_path = self.export_path("A_estimates.json")
+        for lines, changed in [(["[", "1", "]"], True), (["[", "1", "]"], False), (["[", "2", "]"], True)]:
+            hashing_writer = exportManifest.HashingWriter(out_file_path)
+            for line in lines:
+                hashing_writer.write(line)
+            self.assertEqual(hashing_writer.close(), changed)
+            with open(out_file_path, "rb") as read_file:
+                self.assertEqual(read_file.read(), "".join(lines).encode("utf-8"))
+        self.assertFalse(os.path.exists(out_file_path + ".tmp"))
+
+
+class EncodeJsonTest(unittest.TestCase):
+    """
+        Compares the export encoding, orjson when it is installed, with json.dumps.
+    """
+
+    def assert_encoded_as_json(self, payload):
+        self.assertEqual(exportManifest.encode_json(payload),
+                         json.dumps(payload, indent=4, separators=(",", ": ")))
+
+    def test_nested_payload(self):
+        self.assert_encoded_as_json({'key': 'FRONT-1', 'summed_time': 12.5, 'remaining_time': 0.0, 'count': 3, 'done': False,
+                                     'epics': [{'key': 'P-1', 'issues': [], 'children': {}, 'estimates': [1.0, None, 2.25, [3, [4.5]]]}],
+                                     'empty': [], 'nothing': None})
+        self.assert_encoded_as_json([])
+        self.assert_encoded_as_json("summary")
+
+    def test_strings(self):
+        self.assert_encoded_as_json({'summary': "Café — \U0001F680 日本",
+                                     'control': "tab\tnew\nline\x00\x1f", 'delete': "del\x7fete", 'quotes': "\"\\/"})
+
+    def test_non_string_keys(self):
+        self.assert_encoded_as_json(
+            {1: 'one', 2.5: 'two and a half', True: 'true', None: 'none', 'key': {3: [4]}})
+
+    def test_extreme_floats(self):
+        for value in [1e-4, 9.99e-05, 1e-05, 1.5e-07, 5e-324, -1e-05, 9999999999999998.0, 1e16, -1.2345e16, 1e22, 1.7976931348623157e308, -0.0]:
+            self.assert_encoded_as_json({'value': value, 'values': [1.0, value]})
+        self.assert_encoded_as_json({1e-05: 'small key', 1e16: 'large key'})
+
+    def test_non_finite_floats(self):
+        for value in [float('nan'), float('inf'), float('-inf')]:
+            self.assert_encoded_as_json({'value': value, 'null': None})
+            self.assert_encoded_as_json([[value]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import itertools
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import estimationConfidence
+import initiativeTimeRollup
+from jira.resources import Issue
+from test_rollupWebhook import EPIC_TYPE_ID, raw_issue
+
+
+### Data Structures ###
+
+class SearchPage(list):
+    """
+        Page of a jira search, with the total number of results of the search.
+    """
+
+    def __init__(self, issues, total):
+        super().__init__(issues)
+        self.total = total
+
+
+class CappedSearchJira:
+    """
+        Answers searches with pages capped below the requested size, as jira does for large pages.
+    """
+
+    def __init__(self, issues, page_cap):
+        self.issues = issues
+        self.page_cap = page_cap
+        self.searches = []
+
+    def search_issues(self, query_string, startAt=0, maxResults=50, fields=None):
+        self.searches.append(startAt)
+        return SearchPage(self.issues[startAt:startAt + min(maxResults, self.page_cap)], len(self.issues))
+
+
+### Tests ###
+
+class DiscoverInitiativesTest(unittest.TestCase):
+    """
+        Pages through the initiatives of a search.
+    """
+
+    def test_capped_pages_are_followed_to_the_total(self):
+        issues = [Issue({}, None, raw_issue("FRONT-{}".format(index), EPIC_TYPE_ID))
+                  for index in range(initiativeTimeRollup.SEARCH_PAGE_SIZE + 30)]
+        jira = CappedSearchJira(issues, 40)
+
+        discovered = list(initiativeTimeRollup.discover_initiatives(
+            jira, initiativeTimeRollup.AUTO_INITIATIVES_QUERY))
+
+        self.assertEqual([issue.key for issue in discovered], [
+                         issue.key for issue in issues])
+        self.assertEqual(jira.searches, [0, 40, 80, 120])
+
+    def test_empty_search(self):
+        jira = CappedSearchJira([], 40)
+
+        self.assertEqual(list(initiativeTimeRollup.discover_initiatives(
+            jira, initiativeTimeRollup.AUTO_INITIATIVES_QUERY)), [])
+        self.assertEqual(jira.searches, [0])
+
+
+class SweepEstimationConfidenceTest(unittest.TestCase):
+    """
+        Compares the vectorized confidence sweep with the confidence of every initiative calculated one pair at a time.
+    """
+
+    def test_sweep_matches_scalar_confidence(self):
+        initiatives_container = []
+        for index, (estimated, unestimated, remaining) in enumerate(itertools.product([0, 1, 3, 20], [0, 2, 7], [0.0, 4.0, 5.5, 13.5, 25.5, 40.5, 60.0, 900.0])):
+            initiatives_container.append(initiativeTimeRollup.Initiative(
+                Issue({}, None, raw_issue("FRONT-{}".format(index), EPIC_TYPE_ID)), [], 0.0, remaining, estimated, unestimated, 0.0, 5, 25))
+        weights = [1, 3, 5, 8, 13]
+        ceilings = [5, 10, 25, 40]
+
+        sweep_rows = initiativeTimeRollup.sweep_estimation_confidence(
+            initiatives_container, weights, ceilings)
+
+        self.assertEqual([row['key'] for row in sweep_rows], [
+                         initiative.initiative.key for initiative in initiatives_container])
+        for initiative, sweep_row in zip(initiatives_container, sweep_rows):
+            self.assertEqual([(entry['story_point_weight'], entry['story_point_weight_ceiling']) for entry in sweep_row['confidence']],
+                             list(itertools.product(weights, ceilings)))
+            for entry in sweep_row['confidence']:
+                self.assertEqual(entry['estimation_confidence'], estimationConfidence.estimation_confidence(
+                    initiative.incomplete_estimated_count, initiative.incomplete_unestimated_count, initiative.remaining_time,
+                    entry['story_point_weight'], entry['story_point_weight_ceiling']))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import epicTimeRollup
+import initiativeTimeRollup
+import issueStore
+import jiraFields
+from jira.resources import Issue
+from test_rollupWebhook import EPIC_TYPE_ID, PROJECT_ID, STORY_TYPE_ID, TASK_TYPE_ID, build_epic, project_constants, raw_issue
+
+
+### Tests ###
+
+class IssueStoreTest(unittest.TestCase):
+    """
+        Materializes roll-ups into a store and compares the SQL aggregates with the roll-ups calculated in python.
+    """
+
+    def setUp(self):
+        self.epic = build_epic("P-1", [(raw_issue("P-10", TASK_TYPE_ID, 3.0, "P-1"), []),
+                                       (raw_issue("P-11", STORY_TYPE_ID, None,
+                                                  "P-1", ["P-12", "P-13"]), [2.0, 1.0]),
+                                       (raw_issue("P-14", STORY_TYPE_ID, 8.0,
+                                                  "P-1", status="Done"), []),
+                                       (raw_issue("P-15", TASK_TYPE_ID, None, "P-1"), [])])
+        self.project_configs = {PROJECT_ID: project_constants()}
+        self.store = issueStore.IssueStore(
+            os.path.join(tempfile.mkdtemp(), "issues.db"))
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_epic_rollup_from_raw_estimates(self):
+        self.store.add_epics([self.epic], self.project_configs)
+
+        rollup = self.store.epic_rollups()[0]
+        self.assertEqual((rollup['time'], rollup['remaining_time'], rollup['incomplete_estimated_count'], rollup['incomplete_unestimated_count']),
+                         (self.epic.summed_time, self.epic.remaining_time, self.epic.incomplete_estimated_count, self.epic.incomplete_unestimated_count))
+
+    def test_recalculated_story_written_back(self):
+        raw = raw_issue("P-21", STORY_TYPE_ID, 5.0, "P-2", ["P-22"])
+        story = epicTimeRollup.UserStory(Issue({}, None, raw), [Issue(
+            {}, None, {'key': "P-22"})], 0.0, {"P-22": None})
+        story.issue.update = lambda fields: None
+        epic = epicTimeRollup.Epic(
+            Issue({}, None, raw_issue("P-2", EPIC_TYPE_ID)), [], 0.0, 0.0, 0.0, 0.0)
+        epic.add_issues(None, self.project_configs, True, True, [story])
+        self.store.add_epics([epic], self.project_configs, True, True)
+
+        self.assertEqual(epic.summed_time, 5.0)
+        self.assertEqual(self.store.epic_rollups()[0]['time'], 5.0)
+
+    def test_apply_epic_rollups(self):
+        self.store.add_epics([self.epic], self.project_configs)
+        totals = (self.epic.summed_time, self.epic.remaining_time,
+                  self.epic.incomplete_estimated_count, self.epic.incomplete_unestimated_count)
+        self.epic.summed_time = 0.0
+
+        self.store.apply_epic_rollups([self.epic])
+        self.assertEqual((self.epic.summed_time, self.epic.remaining_time,
+                          self.epic.incomplete_estimated_count, self.epic.incomplete_unestimated_count), totals)
+        self.assertEqual([type(total) for total in totals], [type(self.epic.summed_time), type(self.epic.remaining_time), type(
+            self.epic.incomplete_estimated_count), type(self.epic.incomplete_unestimated_count)])
+
+    def test_readded_epic_drops_stale_issues(self):
+        self.store.add_epics([self.epic], self.project_configs)
+        self.store.add_epics([build_epic(
+            "P-1", [(raw_issue("P-11", STORY_TYPE_ID, None, "P-1", ["P-12"]), [2.0])])], self.project_configs)
+
+        self.assertEqual(self.store.query("SELECT key FROM issues WHERE parent_key IS NOT NULL ORDER BY key"), [
+                         {'key': "P-11"}, {'key': "P-12"}])
+        self.assertEqual(self.store.epic_rollups()[0]['time'], 2.0)
+
+    def test_initiative_rollups(self):
+        initiative = initiativeTimeRollup.Initiative(Issue({}, None, raw_issue("FRONT-1", EPIC_TYPE_ID, linked_epics=["P-1"])),
+                                                     [self.epic], 0.0, 0.0, 0, 0, 0.0, 5, 25)
+        initiative.calculate_estimate_counts()
+        initial_raw = raw_issue("FRONT-2", EPIC_TYPE_ID, linked_epics=[])
+        initial_raw['fields']['status'] = {'name': 'Initial Estimation'}
+        initial_raw['fields'][jiraFields.INITIAL_TIME_KEY] = 13.0
+        initial = initiativeTimeRollup.calculate_initial_estimation(
+            Issue({}, None, initial_raw), jiraFields.INITIAL_TIME_KEY, 5, 25)
+        self.store.add_epics([self.epic], self.project_configs)
+        self.store.add_initiatives([initiative, initial])
+
+        rollups = {rollup['key']: rollup for rollup in self.store.initiative_rollups(5, 25)}
+        for expected in [initiative, initial]:
+            rollup = rollups[expected.initiative.key]
+            self.assertEqual((rollup['summed_time'], rollup['remaining_time'], rollup['incomplete_estimated_count'],
+                              rollup['incomplete_unestimated_count'], rollup['estimation_confidence']),
+                             (expected.summed_time, expected.remaining_time, expected.incomplete_estimated_count,
+                              expected.incomplete_unestimated_count, expected.estimation_confidence))
+
+
+if __name__ == "__main__":
+    unittest.main()
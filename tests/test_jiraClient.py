@@ -0,0 +1,115 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import jiraClient
+
+
+### Data Structures ###
+
+class CountingJira:
+    """
+        Counts the requests which reach the connection; issue requests block until released, so that concurrent
+        requests overlap.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def issue(self, key, fields=None):
+        with self.lock:
+            self.requests.append(("issue", key, fields))
+        self.release.wait()
+        if key == "P-404":
+            raise LookupError("Issue does not exist")
+        return {'key': key, 'fields': fields}
+
+    def search_issues(self, query_string, **kwargs):
+        with self.lock:
+            self.requests.append(("search_issues", query_string))
+        return [query_string]
+
+    def server_info(self):
+        return {'version': "cloud"}
+
+
+### Tests ###
+
+class CachingJiraTest(unittest.TestCase):
+    """
+        Memoizes and coalesces the read-only requests of a run.
+    """
+
+    def setUp(self):
+        self.connection = CountingJira()
+        self.jira = jiraClient.CachingJira(self.connection)
+
+    def test_identical_requests_are_memoized(self):
+        first = self.jira.issue("P-1", fields="summary")
+
+        self.assertIs(self.jira.issue("P-1", fields="summary"), first)
+        self.assertIsNot(self.jira.issue("P-1", fields="status"), first)
+        self.assertEqual(self.jira.search_issues("parent=P-1", maxResults=False), ["parent=P-1"])
+        self.assertEqual(self.jira.search_issues("parent=P-1", maxResults=False), ["parent=P-1"])
+        self.assertEqual(self.connection.requests, [("issue", "P-1", "summary"), ("issue", "P-1", "status"),
+                                                    ("search_issues", "parent=P-1")])
+        self.assertEqual(self.jira.dict()['issue'], {'requests': 3, 'hits': 1, 'coalesced': 0, 'fetched': 2, 'hit_rate': 0.3333})
+
+    def test_unhashable_requests_are_not_memoized(self):
+        self.jira.search_issues("parent=P-1", fields=["summary"])
+        self.jira.search_issues("parent=P-1", fields=["summary"])
+
+        self.assertEqual(len(self.connection.requests), 2)
+        self.assertEqual(self.jira.responses, {})
+
+    def test_concurrent_requests_are_coalesced(self):
+        self.connection.release.clear()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(self.jira.issue, "P-1") for index in range(8)]
+            while len(self.connection.requests) == 0 or self.jira.stats['issue']['coalesced'] < 7:
+                time.sleep(0.01)
+            self.connection.release.set()
+            responses = [future.result() for future in futures]
+
+        self.assertEqual(len(self.connection.requests), 1)
+        self.assertTrue(all(response is responses[0] for response in responses))
+        self.assertEqual(self.jira.stats['issue'], {'hits': 0, 'misses': 1, 'coalesced': 7})
+
+    def test_failed_requests_are_raised_to_every_waiter_and_not_memoized(self):
+        self.connection.release.clear()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(self.jira.issue, "P-404") for index in range(4)]
+            while self.jira.stats['issue']['coalesced'] < 3:
+                time.sleep(0.01)
+            self.connection.release.set()
+            for future in futures:
+                with self.assertRaises(LookupError):
+                    future.result()
+
+        with self.assertRaises(LookupError):
+            self.jira.issue("P-404")
+        self.assertEqual(len(self.connection.requests), 2)
+        self.assertEqual(self.jira.in_flight, {})
+
+    def test_cleared_cache_is_fetched_again(self):
+        self.jira.issue("P-1")
+        self.jira.clear_cache()
+        self.jira.issue("P-1")
+
+        self.assertEqual(len(self.connection.requests), 2)
+
+    def test_other_methods_are_delegated(self):
+        self.assertEqual(self.jira.server_info(), {'version': "cloud"})
+
+
+if __name__ == "__main__":
+    unittest.main()
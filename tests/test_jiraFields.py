@@ -0,0 +1,112 @@
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import epicTimeRollup
+import jiraFields
+from test_epicTimeRollup import FetchingJira
+from test_rollupWebhook import EPIC_TYPE_ID, PROJECT_ID, STORY_TYPE_ID, SUBTASK_TYPE_ID, TASK_TYPE_ID, raw_issue
+
+
+### Constants ###
+
+EPIC_ESTIMATION_KEY = "customfield_5"
+STORY_ESTIMATION_KEY = "customfield_1"
+TASK_ESTIMATION_KEY = "customfield_2"
+
+
+### Data Structures ###
+
+class RecordingJira(FetchingJira):
+    """
+        Records the fields every request of a roll-up asks for.
+    """
+
+    def __init__(self, epics, children):
+        super().__init__(epics, children)
+        self.requests = []
+
+    def project(self, project_id):
+        self.requests.append(("project", project_id))
+        return types.SimpleNamespace(id=project_id, key="P")
+
+    def issue(self, key, fields=None):
+        self.requests.append(("issue", key, fields))
+        return super().issue(key, fields)
+
+    def search_issues(self, query_string, maxResults=False, fields=None):
+        self.requests.append(("search_issues", query_string, fields))
+        return super().search_issues(query_string, maxResults=maxResults, fields=fields)
+
+
+### Methods ###
+
+def write_project_config(root):
+    project_constants = epicTimeRollup.ProjectConstants()
+    project_constants.key = "P"
+    project_constants.epic = epicTimeRollup.IssueBundle(EPIC_TYPE_ID, EPIC_ESTIMATION_KEY)
+    project_constants.story = epicTimeRollup.IssueBundle(STORY_TYPE_ID, STORY_ESTIMATION_KEY)
+    project_constants.task = epicTimeRollup.IssueBundle(TASK_TYPE_ID, TASK_ESTIMATION_KEY)
+    project_constants.subtask = epicTimeRollup.IssueBundle(SUBTASK_TYPE_ID, STORY_ESTIMATION_KEY)
+    project_constants.bug = epicTimeRollup.IssueBundle("14", STORY_ESTIMATION_KEY)
+    with open(os.path.join(root, "P_config.json"), "w") as output_file:
+        output_file.write(json.dumps(project_constants.dict()))
+
+
+### Tests ###
+
+class FieldsParamTest(unittest.TestCase):
+    """
+        Builds the fields parameter of requests.
+    """
+
+    def test_duplicates_and_unset_keys_are_dropped(self):
+        self.assertEqual(jiraFields.fields_param(["project", "summary"], [None, "summary", "customfield_1"], []),
+                         "project,summary,customfield_1")
+
+    def test_missing_issue_kinds_have_no_estimation_key(self):
+        project_constants = epicTimeRollup.ProjectConstants()
+        project_constants.story = epicTimeRollup.IssueBundle(STORY_TYPE_ID, STORY_ESTIMATION_KEY)
+
+        self.assertEqual(jiraFields.estimation_keys(project_constants, "epic", "story", "task"), [STORY_ESTIMATION_KEY])
+        self.assertEqual(jiraFields.child_fields(project_constants), "project,summary,status,issuetype,customfield_1,subtasks")
+
+
+class EpicRollupFieldsTest(unittest.TestCase):
+    """
+        Rolls up epics of a project configured from file, and checks that only the fields the roll-up reads are fetched.
+    """
+
+    def test_requests_are_projected(self):
+        config_root = tempfile.mkdtemp()
+        write_project_config(config_root)
+        epics = {"P-1": raw_issue("P-1", EPIC_TYPE_ID), "P-2": raw_issue("P-2", EPIC_TYPE_ID),
+                 "P-12": raw_issue("P-12", SUBTASK_TYPE_ID, parent="P-11")}
+        epics["P-12"]['fields'][STORY_ESTIMATION_KEY] = 2.0
+        children = {"P-1": [raw_issue("P-10", TASK_TYPE_ID, None, "P-1"), raw_issue("P-11", STORY_TYPE_ID, None, "P-1", ["P-12"])]}
+        children["P-1"][0]['fields'][TASK_ESTIMATION_KEY] = 3.0
+        jira = RecordingJira(epics, children)
+
+        epics_container = epicTimeRollup.rollup_epics(
+            jira, ["P-1", "P-2"], {}, import_project_configs=True, import_project_configs_path=config_root)
+
+        self.assertEqual([epic.summed_time for epic in epics_container], [5.0, 0.0])
+        self.assertEqual(jira.requests, [
+            # The project of the first epic is unknown, so it is refetched with the estimation key of its project.
+            ("issue", "P-1", "project,summary,status,issuetype,customfield_11600,duedate"),
+            ("project", PROJECT_ID),
+            ("issue", "P-1", "project,summary,status,issuetype,customfield_5,customfield_11600,duedate"),
+            ("issue", "P-2", "project,summary,status,issuetype,customfield_5,customfield_11600,duedate"),
+            ("search_issues", "parent=P-1", "project,summary,status,issuetype,customfield_1,customfield_2,subtasks"),
+            ("issue", "P-12", "customfield_1,issuetype"),
+            ("search_issues", "parent=P-2", "project,summary,status,issuetype,customfield_1,customfield_2,subtasks")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import jiraClient
+import multiSiteRollup
+from test_rollupWebhook import STORY_TYPE_ID, TASK_TYPE_ID, build_epic, raw_issue
+
+
+### Data Structures ###
+
+class SiteJira:
+    """
+        Stands in for the client of a site.
+    """
+
+    def __init__(self, server):
+        self.server = server
+
+    def print_cache_report(self):
+        pass
+
+
+class SiteCommand:
+    """
+        Stands in for a roll-up command; every site rolls up a single epic, and the site of the failing server exits as
+        a command does on bad arguments. Records the arguments of every site.
+    """
+
+    def __init__(self, failing_server=None):
+        self.failing_server = failing_server
+        self.lock = threading.Lock()
+        self.args = {}
+        self.running = 0
+        self.max_running = 0
+
+    def execute(self, args_list, jira):
+        with self.lock:
+            self.args[jira.server] = args_list
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        # Held open so that concurrent sites overlap.
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        if jira.server == self.failing_server:
+            sys.exit(-2)
+        return [build_epic("P-1", [(raw_issue("P-10", TASK_TYPE_ID, 3.0, "P-1"), []),
+                                   (raw_issue("P-11", STORY_TYPE_ID, 2.0, "P-1", status="Done"), [])])]
+
+
+### Tests ###
+
+class MultiSiteRollupTest(unittest.TestCase):
+    """
+        Rolls up several sites concurrently and merges their totals.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.sites_path = os.path.join(self.root, "sites.json")
+        with open(self.sites_path, "w") as output_file:
+            output_file.write(json.dumps([
+                {'name': "main", 'server': "https://main.example", 'user': "u", 'api_token': "secret", 'max_connections': 4,
+                 'requests_per_second': 5, 'args': ["--epics", "P-1"]},
+                {'name': "partner", 'server': "https://partner.example",
+                    'user': "u", 'api_token_env': "PARTNER_TOKEN"},
+                {'name': "broken", 'server': "https://broken.example", 'user': "u", 'api_token': "secret"}]))
+        self.connections = []
+
+    def connect(self, user, api_token, server=jiraClient.DEFAULT_SERVER, max_connections=None, requests_per_second=None):
+        self.connections.append(
+            (server, api_token, max_connections, requests_per_second))
+        return SiteJira(server)
+
+    def test_load_sites(self):
+        with mock.patch.dict(os.environ, {'PARTNER_TOKEN': "from env"}):
+            sites = multiSiteRollup.load_sites(self.sites_path)
+
+        self.assertEqual([(site.name, site.api_token, site.max_connections, site.args) for site in sites],
+                         [("main", "secret", 4, ["--epics", "P-1"]), ("partner", "from env", None, []), ("broken", "secret", None, [])])
+        self.assertNotIn('api_token', sites[0].dict())
+
+    def test_sites_are_rolled_up_concurrently_and_merged(self):
+        command = SiteCommand("https://broken.example")
+        with mock.patch.dict(os.environ, {'PARTNER_TOKEN': "from env"}):
+            sites = multiSiteRollup.load_sites(self.sites_path)
+        with mock.patch.object(jiraClient, "connect", self.connect):
+            site_results = multiSiteRollup.rollup_sites(
+                command, sites, ["--force_toplevel_recalculate"], self.root)
+
+        self.assertEqual(command.max_running, 3)
+        self.assertEqual(sorted(self.connections), [("https://broken.example", "secret", None, None), ("https://main.example", "secret", 4, 5),
+                                                    ("https://partner.example", "from env", None, None)])
+        self.assertEqual(command.args["https://main.example"], ["--user", "u", "--api_token", "secret", "--server", "https://main.example", "--epics", "P-1",
+                                                                "--force_toplevel_recalculate", "--export_estimates", "--export_estimates_path", os.path.join(self.root, "main")])
+        self.assertTrue(os.path.isdir(os.path.join(self.root, "partner")))
+
+        report = multiSiteRollup.combined_report(
+            "epicTimeRollup", site_results)
+        self.assertEqual([site_json['name'] for site_json in report['sites']], [
+                         "main", "partner", "broken"])
+        self.assertEqual((report['summed_time'], report['remaining_time'], report['failed_sites']), (10.0, 6.0, ["broken"]))
+        self.assertEqual((report['sites'][2]['status'], report['sites'][2]['rollups']), ('failed', []))
+
+    def test_sites_are_limited(self):
+        command = SiteCommand()
+        with mock.patch.dict(os.environ, {'PARTNER_TOKEN': "from env"}):
+            sites = multiSiteRollup.load_sites(self.sites_path)
+        with mock.patch.object(jiraClient, "connect", self.connect):
+            site_results = multiSiteRollup.rollup_sites(
+                command, sites, [], max_sites=1)
+
+        self.assertEqual(command.max_running, 1)
+        self.assertEqual([site_result.error for site_result in site_results], [None, None, None])
+        self.assertNotIn("--export_estimates", command.args["https://main.example"])
+
+
+class RateLimiterTest(unittest.TestCase):
+    """
+        Spaces out the requests of several threads sharing a limiter.
+    """
+
+    def test_requests_are_spaced_out(self):
+        rate_limiter = jiraClient.RateLimiter(50)
+        started = time.monotonic()
+        threads = [threading.Thread(target=rate_limiter.acquire)
+                   for index in range(11)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+
+
+if __name__ == "__main__":
+    unittest.main()
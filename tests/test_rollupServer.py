@@ -0,0 +1,54 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import jiraClient
+import rollupServer
+from test_epicTimeRollup import FetchingJira
+from test_rollupWebhook import EPIC_TYPE_ID, PROJECT_ID, TASK_TYPE_ID, project_constants, raw_issue
+
+
+### Tests ###
+
+class RollupCacheTest(unittest.TestCase):
+    """
+        Computes roll-ups through the request memo of a long-running server.
+    """
+
+    def setUp(self):
+        epics = {"FRONT-1": raw_issue("FRONT-1", EPIC_TYPE_ID, linked_epics=["P-1"]),
+                 "P-1": raw_issue("P-1", EPIC_TYPE_ID),
+                 "P-2": raw_issue("P-2", EPIC_TYPE_ID)}
+        children = {"P-1": [raw_issue("P-10", TASK_TYPE_ID, 3.0, "P-1")],
+                    "P-2": [raw_issue("P-20", TASK_TYPE_ID, 5.0, "P-2")]}
+        self.connection = FetchingJira(epics, children)
+        self.rollup_cache = rollupServer.RollupCache(
+            jiraClient.CachingJira(self.connection), 5, 25)
+        self.rollup_cache.project_configs[PROJECT_ID] = project_constants()
+
+    def test_recomputed_initiative_sees_new_links(self):
+        entry = self.rollup_cache.get(rollupServer.INITIATIVE_KIND, "FRONT-1")
+        self.assertEqual((entry.rollup.summed_time, entry.member_keys),
+                         (3.0, {"FRONT-1", "P-1", "P-10"}))
+
+        self.connection.epics["FRONT-1"] = raw_issue(
+            "FRONT-1", EPIC_TYPE_ID, linked_epics=["P-1", "P-2"])
+        entry = self.rollup_cache.store(self.rollup_cache.compute(
+            rollupServer.INITIATIVE_KIND, "FRONT-1"))
+
+        self.assertEqual(entry.rollup.summed_time, 8.0)
+        self.assertEqual([epic.epic.key for epic in entry.rollup.epics], ["P-1", "P-2"])
+        self.assertEqual(self.rollup_cache.rollup_index.epic_initiatives["P-2"], {"FRONT-1"})
+
+    def test_memo_only_lives_for_one_computation(self):
+        self.rollup_cache.get(rollupServer.EPIC_KIND, "P-1")
+        self.rollup_cache.get(rollupServer.EPIC_KIND, "P-2")
+
+        self.assertEqual(len(self.rollup_cache.jira.responses), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
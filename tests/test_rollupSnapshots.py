@@ -0,0 +1,84 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rollupSnapshots
+from test_rollupWebhook import STORY_TYPE_ID, TASK_TYPE_ID, build_epic, raw_issue
+
+
+### Methods ###
+
+def run_values(run):
+    """
+        Values of a run of a changing roll-up: epic A is re-estimated every third run, epic B drops out every fifth run.
+    """
+    values = {rollupSnapshots.snapshot_key(rollupSnapshots.EPIC_KIND, "A"): [float(run // 3), 1.0, 2, 3]}
+    if run % 5 != 0:
+        values[rollupSnapshots.snapshot_key(rollupSnapshots.EPIC_KIND, "B")] = [1.0, 1.0, 1, 1]
+    return values
+
+
+### Tests ###
+
+class SnapshotStoreTest(unittest.TestCase):
+    """
+        Appends the snapshots of several runs and rebuilds them from their deltas.
+    """
+
+    def setUp(self):
+        self.store = rollupSnapshots.SnapshotStore(
+            os.path.join(tempfile.mkdtemp(), "snapshots.jsonl.gz"))
+        self.runs = rollupSnapshots.BASE_INTERVAL + 5
+        for run in range(self.runs):
+            self.assertEqual(self.store.append(run_values(run), "run {}".format(run)), run)
+
+    def test_states_replay_to_every_run(self):
+        for run in range(self.runs):
+            record, state = self.store.state(run)
+            self.assertEqual((record['label'], state), ("run {}".format(run), run_values(run)))
+        self.assertEqual(self.store.state()[1], run_values(self.runs - 1))
+        with self.assertRaises(LookupError):
+            self.store.state(self.runs)
+
+    def test_only_changes_are_recorded(self):
+        records = list(self.store.records())
+
+        self.assertEqual([record['id'] for record in records if record['base']], [0, rollupSnapshots.BASE_INTERVAL])
+        # Run 4 neither re-estimates A nor drops B.
+        self.assertEqual((records[4]['set'], records[4]['removed']), ({}, []))
+        self.assertEqual((records[5]['set'], records[5]['removed']), ({}, ["epic:B"]))
+        self.assertEqual(records[6]['set'], {"epic:A": [2.0, 1.0, 2, 3], "epic:B": [1.0, 1.0, 1, 1]})
+
+    def test_series(self):
+        series = self.store.series("epic:B")
+
+        self.assertEqual([entry['id'] for entry in series][:4], [1, 5, 6, 10])
+        self.assertEqual([entry['values'] for entry in series][:2], [
+            {'summed_time': 1.0, 'remaining_time': 1.0, 'incomplete_estimated_count': 1, 'incomplete_unestimated_count': 1}, None])
+        self.assertEqual([entry['id'] for entry in self.store.series("epic:A")], list(range(0, self.runs, 3)))
+
+    def test_diff(self):
+        self.assertEqual(self.store.diff(3, 10), {'from': 3, 'to': 10, 'added': {}, 'removed': ["epic:B"],
+                                                  'changed': {"epic:A": {'summed_time': 2.0}}})
+        self.assertEqual(self.store.diff(5, 6)['added'], {"epic:B": {
+            'summed_time': 1.0, 'remaining_time': 1.0, 'incomplete_estimated_count': 1, 'incomplete_unestimated_count': 1}})
+
+
+class SnapshotValuesTest(unittest.TestCase):
+    """
+        Collects the snapshot values of roll-ups.
+    """
+
+    def test_epic_values(self):
+        epic = build_epic("P-1", [(raw_issue("P-10", TASK_TYPE_ID, 3.333, "P-1"), []),
+                                  (raw_issue("P-11", STORY_TYPE_ID, None, "P-1"), [])])
+
+        self.assertEqual(rollupSnapshots.snapshot_values(epics_container=[epic]), {"epic:P-1": [3.33, 3.33, 1.0, 1.0]})
+
+
+if __name__ == "__main__":
+    unittest.main()
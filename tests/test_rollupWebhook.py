@@ -0,0 +1,182 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import epicTimeRollup
+import initiativeTimeRollup
+import rollupWebhook
+from jira.resources import Issue
+
+
+### Constants ###
+
+PROJECT_ID = "1"
+STORY_TYPE_ID = "10"
+TASK_TYPE_ID = "11"
+EPIC_TYPE_ID = "12"
+SUBTASK_TYPE_ID = "13"
+ESTIMATION_KEY = "customfield_1"
+
+
+### Data Structures ###
+
+class StubJira:
+    """
+        Stands in for the jira connection the events are decoded with; write-backs are recorded by the tests.
+    """
+    _options = {}
+    _session = None
+
+
+### Methods ###
+
+def project_constants():
+    constants = epicTimeRollup.ProjectConstants()
+    constants.key = "P"
+    constants.epic = epicTimeRollup.IssueBundle(EPIC_TYPE_ID, ESTIMATION_KEY)
+    constants.story = epicTimeRollup.IssueBundle(STORY_TYPE_ID, ESTIMATION_KEY)
+    constants.task = epicTimeRollup.IssueBundle(TASK_TYPE_ID, ESTIMATION_KEY)
+    constants.subtask = epicTimeRollup.IssueBundle(
+        SUBTASK_TYPE_ID, ESTIMATION_KEY)
+    constants.bug = epicTimeRollup.IssueBundle("14", ESTIMATION_KEY)
+    return constants
+
+
+def raw_issue(key, type_id, estimate=None, parent=None, subtasks=(), status="To Do", linked_epics=None):
+    fields = {'project': {'id': PROJECT_ID, 'key': 'P'}, 'issuetype': {'id': type_id}, 'status': {'name': status},
+              'summary': key, ESTIMATION_KEY: estimate, 'subtasks': [{'key': subtask} for subtask in subtasks]}
+    if parent is not None:
+        fields['parent'] = {'key': parent}
+    if linked_epics is not None:
+        fields['issuelinks'] = [{'inwardIssue': {'key': epic}}
+                                for epic in linked_epics]
+    return {'key': key, 'fields': fields}
+
+
+def event(webhook_event, raw):
+    return {'webhookEvent': webhook_event, 'issue': raw}
+
+
+def build_epic(key, stories):
+    epic = epicTimeRollup.Epic(
+        Issue({}, None, raw_issue(key, EPIC_TYPE_ID)), [], 0.0, 0.0, 0, 0)
+    epic.add_issues(None, {PROJECT_ID: project_constants()}, False, False, [epicTimeRollup.UserStory(
+        Issue({}, None, raw), [Issue({}, None, {'key': subtask['key']}) for subtask in raw['fields']['subtasks']], 0.0,
+        {subtask['key']: estimate for subtask, estimate in zip(raw['fields']['subtasks'], subtask_estimates)}) for raw, subtask_estimates in stories])
+    return epic
+
+
+### Tests ###
+
+class ReplayEventsTest(unittest.TestCase):
+    """
+        Replays recorded webhook payloads against an index over roll-ups built from the same issues, and compares the
+        totals with a roll-up recalculated from scratch.
+    """
+
+    def setUp(self):
+        self.epic_a = build_epic("P-1", [(raw_issue("P-10", TASK_TYPE_ID, 3.0, "P-1"), []),
+                                         (raw_issue("P-11", STORY_TYPE_ID, None, "P-1", ["P-12", "P-13"]), [2.0, 1.0])])
+        self.epic_b = build_epic(
+            "P-2", [(raw_issue("P-20", TASK_TYPE_ID, 5.0, "P-2"), [])])
+        self.epic_c = build_epic(
+            "P-3", [(raw_issue("P-30", TASK_TYPE_ID, 8.0, "P-3"), [])])
+        self.initiative = initiativeTimeRollup.Initiative(Issue({}, None, raw_issue("FRONT-1", EPIC_TYPE_ID, linked_epics=["P-1", "P-2"])),
+                                                          [self.epic_a, self.epic_b], 0.0, 0.0, 0, 0, 0.0, 5, 25)
+        self.initiative.calculate_estimate_counts()
+
+        self.rollup_index = rollupWebhook.RollupIndex(
+            {PROJECT_ID: project_constants()})
+        self.rollup_index.add_initiative(self.initiative)
+        self.rollup_index.add_epic(self.epic_c)
+
+        self.events_path = os.path.join(tempfile.mkdtemp(), "events.jsonl")
+
+    def replay(self, events):
+        with open(self.events_path, "w") as output_file:
+            for replayed_event in events:
+                output_file.write(json.dumps(replayed_event) + "\n")
+        return rollupWebhook.replay_events(self.rollup_index, self.events_path)
+
+    def assert_initiative_consistent(self):
+        totals = (self.initiative.summed_time, self.initiative.remaining_time,
+                  self.initiative.incomplete_estimated_count, self.initiative.incomplete_unestimated_count)
+        self.initiative.calculate_estimate_counts()
+        self.assertEqual(totals, (self.initiative.summed_time, self.initiative.remaining_time,
+                                  self.initiative.incomplete_estimated_count, self.initiative.incomplete_unestimated_count))
+
+    def test_story_updates(self):
+        changed = self.replay([event(rollupWebhook.ISSUE_UPDATED_EVENT, raw_issue("P-10", TASK_TYPE_ID, 6.0, "P-1")),
+                               event(rollupWebhook.ISSUE_CREATED_EVENT, raw_issue("P-14", TASK_TYPE_ID, 1.0, "P-1"))])
+
+        self.assertEqual(changed, {("epic", "P-1"), ("initiative", "FRONT-1")})
+        self.assertEqual(self.epic_a.summed_time, 10.0)
+        self.assertEqual(self.initiative.summed_time, 15.0)
+        self.assert_initiative_consistent()
+
+    def test_subtask_moved_to_another_story(self):
+        self.replay([event(rollupWebhook.ISSUE_CREATED_EVENT, raw_issue("P-21", STORY_TYPE_ID, None, "P-2")),
+                     event(rollupWebhook.ISSUE_UPDATED_EVENT, raw_issue("P-12", SUBTASK_TYPE_ID, 2.0, "P-21"))])
+
+        self.assertEqual(self.epic_a.summed_time, 4.0)
+        self.assertEqual(self.epic_b.summed_time, 7.0)
+        self.assertEqual(
+            self.rollup_index.subtask_stories["P-12"], "P-21")
+        self.assert_initiative_consistent()
+
+    def test_deleted_epic_and_initiative(self):
+        changed = self.replay(
+            [event(rollupWebhook.ISSUE_DELETED_EVENT, raw_issue("P-2", EPIC_TYPE_ID))])
+
+        self.assertEqual(changed, {("epic", "P-2"), ("initiative", "FRONT-1")})
+        self.assertNotIn("P-2", self.rollup_index.epics)
+        self.assertNotIn("P-20", self.rollup_index.stories)
+        self.assertEqual(self.initiative.summed_time, 6.0)
+        self.assert_initiative_consistent()
+
+        self.replay(
+            [event(rollupWebhook.ISSUE_DELETED_EVENT, raw_issue("FRONT-1", EPIC_TYPE_ID))])
+        self.assertNotIn("FRONT-1", self.rollup_index.initiatives)
+        self.assertEqual(
+            self.replay([event(rollupWebhook.ISSUE_UPDATED_EVENT, raw_issue("P-10", TASK_TYPE_ID, 4.0, "P-1"))]), {("epic", "P-1")})
+
+    def test_deleted_epic_with_write_back(self):
+        self.rollup_index.jira = StubJira()
+        self.rollup_index.update_ticket_estimates = True
+        updates = []
+        self.initiative.initiative.update = lambda fields: updates.append(
+            fields)
+
+        changed = self.replay(
+            [event(rollupWebhook.ISSUE_DELETED_EVENT, raw_issue("P-2", EPIC_TYPE_ID))])
+
+        self.assertEqual(changed, {("epic", "P-2"), ("initiative", "FRONT-1")})
+        self.assertIn({initiativeTimeRollup.REMAINING_TIME_KEY: 6.0}, updates)
+
+        updates.clear()
+        self.replay(
+            [event(rollupWebhook.ISSUE_DELETED_EVENT, raw_issue("FRONT-1", EPIC_TYPE_ID))])
+        self.assertEqual(updates, [])
+
+    def test_initiative_links_changed(self):
+        self.replay([event(rollupWebhook.ISSUE_UPDATED_EVENT, raw_issue(
+            "FRONT-1", EPIC_TYPE_ID, linked_epics=["P-1", "P-3"]))])
+
+        self.assertEqual([epic.epic.key for epic in self.initiative.epics], [
+                         "P-1", "P-3"])
+        self.assertEqual(self.initiative.summed_time, 14.0)
+        self.assert_initiative_consistent()
+
+        # Events of the unlinked epic no longer reach the initiative.
+        changed = self.replay(
+            [event(rollupWebhook.ISSUE_UPDATED_EVENT, raw_issue("P-20", TASK_TYPE_ID, 1.0, "P-2"))])
+        self.assertEqual(changed, {("epic", "P-2")})
+        self.assertEqual(self.initiative.summed_time, 14.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+import copy
+import json
+import os
+import sys
+import tempfile
+import threading
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import epicTimeRollup
+import sprintRollup
+from jira.resources import Issue
+from test_rollupWebhook import ESTIMATION_KEY, PROJECT_ID, STORY_TYPE_ID, SUBTASK_TYPE_ID, TASK_TYPE_ID, project_constants, raw_issue
+
+
+### Constants ###
+
+BOARD_ID = 9
+OTHER_PROJECT_ID = "2"
+OTHER_ESTIMATION_KEY = "customfield_2"
+
+
+### Data Structures ###
+
+class AgileJira:
+    """
+        Answers the Agile API listings of a single board from raw sprints and sprint issues, page by page, and drops
+        the fields the requests did not ask for. Records every request.
+    """
+    AGILE_BASE_URL = "agile"
+
+    def __init__(self, board_project_ids, sprints, sprint_issues, subtasks=None):
+        self.board_project_ids = board_project_ids
+        self.sprints = sprints
+        self.sprint_issues = sprint_issues
+        self.subtasks = subtasks or {}
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def project(self, project_id):
+        return types.SimpleNamespace(id=project_id, key="P")
+
+    def issue(self, key, fields=None):
+        with self.lock:
+            self.requests.append(("issue", key))
+        return Issue({}, None, self.subtasks[key])
+
+    def _get_json(self, path, params=None, base=None):
+        params = params or {}
+        with self.lock:
+            self.requests.append((path, params.get('startAt'), params.get('fields')))
+        if path == "board":
+            return {'values': [{'id': BOARD_ID, 'name': "Board", 'location': {'projectId': int(PROJECT_ID), 'projectKey': "P"}}], 'isLast': True}
+        if path == "board/{}/project".format(BOARD_ID):
+            return {'values': [{'id': project_id} for project_id in self.board_project_ids], 'isLast': True}
+        if path == "board/{}/sprint".format(BOARD_ID):
+            page = self.sprints[params['startAt']:params['startAt'] + params['maxResults']]
+            return {'values': page, 'isLast': params['startAt'] + len(page) >= len(self.sprints)}
+        issues = self.sprint_issues[int(path.split("/")[1])]
+        page = copy.deepcopy(issues[params['startAt']:params['startAt'] + params['maxResults']])
+        fields = params['fields'].split(",")
+        for raw in page:
+            for key in [ESTIMATION_KEY, OTHER_ESTIMATION_KEY, "resolutiondate"]:
+                if key not in fields:
+                    raw['fields'].pop(key, None)
+        return {'issues': page, 'total': len(issues)}
+
+    def print_cache_report(self):
+        pass
+
+
+### Methods ###
+
+def sprint_issue(key, type_id, estimate=None, subtasks=(), resolved=None, project_id=PROJECT_ID):
+    raw = raw_issue(key, type_id, estimate, subtasks=subtasks, status="Done" if resolved is not None else "To Do")
+    raw['fields']['issuetype']['subtask'] = type_id == SUBTASK_TYPE_ID
+    raw['fields']['resolutiondate'] = resolved
+    raw['fields']['project'] = {'id': project_id, 'key': 'P'}
+    if project_id == OTHER_PROJECT_ID:
+        raw['fields'][OTHER_ESTIMATION_KEY] = raw['fields'].pop(ESTIMATION_KEY)
+    return raw
+
+
+def other_project_constants():
+    constants = project_constants()
+    for issue_kind in ["epic", "story", "task", "subtask", "bug"]:
+        constants.__dict__[issue_kind] = epicTimeRollup.IssueBundle(
+            getattr(constants, issue_kind).type_id, OTHER_ESTIMATION_KEY)
+    return constants
+
+
+def generate_project_constants(jira, project, **kwargs):
+    return other_project_constants() if project.id == OTHER_PROJECT_ID else project_constants()
+
+
+### Tests ###
+
+class SprintRollupTest(unittest.TestCase):
+    """
+        Rolls up the sprints of a board, and exports their committed and completed points.
+    """
+
+    def setUp(self):
+        # Closed sprints which ended before the roll-up window, on a page of their own.
+        sprints = [{'id': 100 + index, 'name': "Old {}".format(index), 'state': "closed",
+                    'endDate': "2020-01-01T00:00:00.000+0000"} for index in range(sprintRollup.AGILE_PAGE_SIZE)]
+        sprints += [{'id': 1, 'name': "Closed", 'state': "closed", 'completeDate': "2026-03-15T00:00:00.000+0000"},
+                    {'id': 2, 'name': "Active", 'state': "active"}]
+        late = sprint_issue("P-3", TASK_TYPE_ID, 5.0, resolved="2026-05-01T10:00:00.000+0000")
+        sprint_issues = {
+            1: [sprint_issue("P-1", TASK_TYPE_ID, 3.0, resolved="2026-03-01T10:00:00.000+0000"),
+                sprint_issue("P-2", STORY_TYPE_ID, subtasks=["P-2-1", "P-2-2"]),
+                sprint_issue("P-2-1", SUBTASK_TYPE_ID, 2.0),
+                late],
+            2: [late] + [sprint_issue("P-{}".format(index), TASK_TYPE_ID, 1.0) for index in range(10, 260)]}
+        # Only subtasks missing from the sprint pages are fetched.
+        subtasks = {"P-2-2": raw_issue("P-2-2", SUBTASK_TYPE_ID, 7.0, "P-2")}
+        self.jira = AgileJira([PROJECT_ID], sprints, sprint_issues, subtasks)
+
+    def test_sprint_points(self):
+        export_path = tempfile.mkdtemp()
+        with mock.patch.object(epicTimeRollup, "generate_project_constants", generate_project_constants):
+            board_rollups = sprintRollup.execute(["--user", "u", "--api_token", "t", "--since", "2026-01-01", "--max_workers", "2",
+                                                  "--export_estimates", "--export_estimates_path", export_path], self.jira)
+
+        with open(os.path.join(export_path, "Sprint_estimates.json")) as read_file:
+            board_json = json.load(read_file)[0]
+        self.assertEqual([board_rollup.board['id'] for board_rollup in board_rollups], [BOARD_ID])
+        self.assertEqual({key: value for key, value in board_json.items() if key != 'sprints'},
+                         {'id': BOARD_ID, 'name': "Board", 'project_key': "P", 'sprint_count': 2, 'committed_points': 272.0,
+                          'completed_points': 8.0, 'completion_ratio': 0.0294, 'velocity': 3.0})
+        # The late issue counts as completed in the active sprint only; the subtask is counted through its story.
+        self.assertEqual([(sprint_json['name'], sprint_json['issue_count'], sprint_json['completed_count'], sprint_json['committed_points'],
+                           sprint_json['completed_points']) for sprint_json in board_json['sprints']],
+                         [("Closed", 3, 1, 17.0, 3.0), ("Active", 251, 1, 255.0, 5.0)])
+        self.assertEqual([issue_json['time'] for issue_json in board_json['sprints'][0]['issues']], [3.0, 9.0, 5.0])
+
+    def test_requests(self):
+        with mock.patch.object(epicTimeRollup, "generate_project_constants", generate_project_constants):
+            sprintRollup.rollup_boards(self.jira, sprintRollup.get_boards(self.jira), {}, sprintRollup.SPRINT_STATES,
+                                       sprintRollup.parse_time("2026-01-01T00:00:00.000+0000"), max_workers=2)
+
+        self.assertEqual([request[:2] for request in self.jira.requests if request[0] == "board/{}/sprint".format(BOARD_ID)],
+                         [("board/{}/sprint".format(BOARD_ID), 0), ("board/{}/sprint".format(BOARD_ID), sprintRollup.AGILE_PAGE_SIZE)])
+        sprint_requests = sorted(request for request in self.jira.requests if request[0].startswith("sprint/"))
+        self.assertEqual([request[:2] for request in sprint_requests],
+                         [("sprint/1/issue", 0), ("sprint/2/issue", 0), ("sprint/2/issue", 100), ("sprint/2/issue", 200)])
+        for request in sprint_requests:
+            self.assertIn(ESTIMATION_KEY, request[2].split(","))
+            self.assertIn("resolutiondate", request[2].split(","))
+        self.assertEqual([request for request in self.jira.requests if request[0] == "issue"], [("issue", "P-2-2")])
+
+
+class SprintProjectsTest(unittest.TestCase):
+    """
+        Rolls up sprints holding issues of a project the board does not show.
+    """
+
+    def test_sprints_with_new_projects_are_refetched(self):
+        sprints = [{'id': 1, 'name': "First", 'state': "active"}, {'id': 2, 'name': "Second", 'state': "active"}]
+        sprint_issues = {1: [sprint_issue("P-1", TASK_TYPE_ID, 3.0)],
+                         2: [sprint_issue("P-2", TASK_TYPE_ID, 1.0), sprint_issue("Q-1", TASK_TYPE_ID, 6.0, project_id=OTHER_PROJECT_ID)]}
+        jira = AgileJira([PROJECT_ID], sprints, sprint_issues)
+        project_configs = {}
+
+        with mock.patch.object(epicTimeRollup, "generate_project_constants", generate_project_constants):
+            board_rollups = sprintRollup.rollup_boards(jira, sprintRollup.get_boards(jira), project_configs, "active",
+                                                       sprintRollup.parse_time("2026-01-01T00:00:00.000+0000"))
+
+        self.assertEqual(sorted(project_configs), [PROJECT_ID, OTHER_PROJECT_ID])
+        self.assertEqual([sprint_rollup.committed_points for sprint_rollup in board_rollups[0].sprints], [3.0, 7.0])
+        self.assertEqual(sorted(request[0] for request in jira.requests if request[0].startswith("sprint/")),
+                         ["sprint/1/issue", "sprint/2/issue", "sprint/2/issue"])
+
+
+if __name__ == "__main__":
+    unittest.main()